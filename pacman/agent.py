@@ -1,13 +1,19 @@
 # # Import necessary modules and classes
-import pygame, os
-from pygame.locals import *
-from queue import Queue
+import os, struct
+from fifo_queue import Queue
 from constants import *
 from vector import Vector2D
-from sprites import SpriteSheet
-from entity import Entity
+from assets import asset_cache, GENERAL_SPRITES, SPRITE_SIZE, SPRITE_OFFSET
+from entity import Entity, ENTITY_STATE, ENTITY_VALUES
+from game_state import queue_codes, restore_queue, pack_flags, unpack_flags
+
+# The entity state, then score, lives, alive, idle, idle timer, distance travelled, survival time,
+# collected items, queue timer, animation state and increment, then the length and two slots of the queue
+AGENT_STATE = struct.Struct(ENTITY_STATE.format + 'ib??dddHdbbBbb')
 
 class Agent(Entity):
+    STATE = AGENT_STATE
+
     def __init__(self, tile, neural_network):
         super().__init__(tile) 
 
@@ -18,7 +24,8 @@ class Agent(Entity):
         self.idle_timer = 0
         self.distance_travelled = 0
         self.survival_time = 0
-        self.collected_items = []
+        self.collected_tiles = bytearray(NUM_TILES)
+        self.num_collected_items = 0
         self.neural_network = neural_network
 
         self.ghost = {}
@@ -29,28 +36,63 @@ class Agent(Entity):
         self.queue_timer = 0
         self.max_queue_time = 0.5
         
-        # Sprites and game state attributes
-        self.load_sprites()  
+        # Sprites are loaded on the first draw, so nothing is loaded when nothing is drawn
+        self.sprites = None
+        self.animation_state = 0
         self.phase = None
         self.increment = 1
 
     def load_sprites(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
-        self.animation_state = 0
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprites = {}
         self.sprites['idle'] = sprite_sheet.get_image(86, 120, 16, 16)
         self.sprites['moving_1'] = sprite_sheet.get_image(103, 120, 16, 16)
         self.sprites['moving_2'] = sprite_sheet.get_image(103, 103, 16, 16)
+        # Every animation frame facing every direction at the drawn size, shared through the asset cache
+        self.directional_sprites = asset_cache.directional(self.sprites)
+        self.life_sprite = asset_cache.transformed(self.sprites['moving_1'], size=SPRITE_SIZE)
 
     def reset(self):
+        '''Resets the agent to its initial state, so it can play another game'''
+        self.reset_position()
         self.score = 0
         self.lives = self.starting_lives
         self.alive = True
         self.survival_time = 0
         self.distance_travelled = 0
-        self.is_idle = False
-        self.idle_timer = 0
-        self.directions_queu.clear()
+        self.collected_tiles[:] = bytes(NUM_TILES)
+        self.num_collected_items = 0
+        self.set_speed(75)
+        self.queue_timer = 0
+        self.timer, self.animation_timer = 0, 0
+        self.animation_state, self.increment = 0, 1
+        self.sprite_toggle = False
+        self.is_visible = True
+
+    def state_values(self) -> tuple:
+        '''Returns the values of AGENT_STATE'''
+        return super().state_values() + (self.score, self.lives, self.alive, self.is_idle, self.idle_timer,
+                                         self.distance_travelled, self.survival_time, self.num_collected_items,
+                                         self.queue_timer, self.animation_state, self.increment,
+                                         *queue_codes(self.directions_queue))
+
+    def restore_state_values(self, values: tuple, tiles) -> None:
+        '''Restores the values returned by state_values'''
+        super().restore_state_values(values, tiles)
+        (self.score, self.lives, self.alive, self.is_idle, self.idle_timer, self.distance_travelled,
+         self.survival_time, self.num_collected_items, self.queue_timer, self.animation_state, self.increment,
+         *queue) = values[ENTITY_VALUES:]
+        restore_queue(self.directions_queue, *queue)
+
+    def pack_state(self) -> bytes:
+        '''Returns the state of the agent packed into bytes'''
+        return super().pack_state() + pack_flags(self.collected_tiles)
+
+    def unpack_state(self, buffer, offset: int, tiles) -> int:
+        '''Restores the state packed by pack_state and returns the offset after it'''
+        collected_tiles, offset = unpack_flags(buffer, super().unpack_state(buffer, offset, tiles))
+        self.collected_tiles[:] = collected_tiles.tobytes()
+        return offset
 
     def reset_position(self):
         super().reset()
@@ -74,7 +116,8 @@ class Agent(Entity):
 
     def move(self, action, delta_time: float):
         '''Moves the Agent'''
-        self.position += self.directions[self.current_direction] * self.speed * delta_time
+        self.previous_position.update(self.position)
+        self.position.add_scaled(self.directions[self.current_direction], self.speed * delta_time)
         self.queue_timer += delta_time
         
         direction = action
@@ -122,45 +165,33 @@ class Agent(Entity):
             self.directions_queue.remove_tail()
             self.clear_queue_timer = 0
 
-    def render(self, screen: pygame.Surface, show_lives: bool = True, show_special_items: bool = False):
-        '''Renders the pacman on the screen'''
-        position = self.position - Vector2D(4, 4)
-        
+    def render(self, screen: 'pygame.Surface', show_lives: bool = True, show_special_items: bool = False):
+        '''Renders the agent on the screen'''
+        screen.blits(self.get_blits(show_lives, show_special_items))
+
+    def get_blits(self, show_lives: bool = True, show_special_items: bool = False) -> list:
+        '''Returns the (sprite, position) pairs that draw the agent, to be drawn with Surface.blits'''
+        if self.sprites is None:
+            self.load_sprites()
+        blits = []
         if self.alive:
-            sprite_key = self.get_sprite_key()
-            sprite = self.sprites.get(sprite_key)
-            
+            sprite = self.directional_sprites.get((self.get_sprite_key(), self.current_direction))
             if sprite:
-                if self.current_direction == LEFT:
-                    sprite = pygame.transform.flip(sprite, True, False)
-                elif self.current_direction == UP:
-                    sprite = pygame.transform.rotate(sprite, 90)
-                elif self.current_direction == DOWN:
-                    sprite = pygame.transform.rotate(sprite, -90)
-                
-                sprite = pygame.transform.scale(sprite, (24, 24))
-                screen.blit(sprite, position.as_tuple())
+                blits.append((sprite, (self.position.x - SPRITE_OFFSET, self.position.y - SPRITE_OFFSET)))
         if show_lives:
-            self.render_lives(screen)
-        
+            blits.extend(self.get_life_blits())
         if show_special_items:
-            self.render_special_items(screen)
-
-    def render_lives(self, screen: pygame.Surface):
-        '''Renders the lives on the screen'''
-        for i in range(self.lives):
-            position = Vector2D(8 + i * 32, 550)
-            sprite = self.sprites.get('moving_1')
-            sprite = pygame.transform.scale(sprite, (24, 24))
-            screen.blit(sprite, position.as_tuple())
-
-    def render_special_items(self, screen: pygame.Surface):
-        '''Renders the special items on the screen'''
-        for i, item in enumerate(self.special_items):
-            position = Vector2D(410 - i * 32, 550)
-            sprite = item.get_sprite()
-            sprite = pygame.transform.scale(sprite, (24, 24))
-            screen.blit(sprite, position.as_tuple())
+            blits.extend(self.get_special_item_blits())
+        return blits
+
+    def get_life_blits(self) -> list:
+        '''Returns the (sprite, position) pairs that draw the lives'''
+        return [(self.life_sprite, (8 + i * 32, 550)) for i in range(self.lives)]
+
+    def get_special_item_blits(self) -> list:
+        '''Returns the (sprite, position) pairs that draw the special items'''
+        return [(asset_cache.transformed(item.get_sprite(), size=SPRITE_SIZE), (410 - i * 32, 550))
+                for i, item in enumerate(self.special_items)]
 
     def get_sprite_key(self):
         '''Returns the sprite key'''
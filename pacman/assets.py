@@ -0,0 +1,100 @@
+import os
+from constants import *
+
+# Assets are found next to this file, so the game can be started from any directory
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Assets')
+SPRITES_DIR = os.path.join(ASSETS_DIR, 'sprites')
+LEVELS_DIR = os.path.join(ASSETS_DIR, 'levels')
+FONTS_DIR = os.path.join(ASSETS_DIR, 'Fonts')
+
+GENERAL_SPRITES = 'Pac-Man-General-Sprites.png'
+TILE_SPRITES = 'Pac-Man-Tile-Sprites.png'
+MAZE_SPRITES = 'Maze-Parts.png'
+FONT = 'PressStart2P-Regular.ttf'
+
+# Entities are drawn at this size, shifted up and left by the offset so they are centred on their tile
+SPRITE_SIZE = (24, 24)
+SPRITE_OFFSET = 4
+# How a sprite facing right is flipped and rotated to face each direction
+DIRECTION_TRANSFORMS = {
+    UP : (False, 90),
+    DOWN : (False, -90),
+    LEFT : (True, 0),
+    RIGHT : (False, 0),
+    None : (False, 0),
+}
+
+def level_path(level_file: str) -> str:
+    '''Returns the path of a level file'''
+    return os.path.join(LEVELS_DIR, level_file)
+
+class AssetCache(object):
+    '''
+    Decodes every sprite sheet and opens every font once per process. Entities, items and
+    tiles get the shared sheets and fonts, and the sheets hand out shared images, so
+    setting up a generation does not touch the disk.
+    '''
+    def __init__(self):
+        """
+        Initialize an AssetCache object.
+        """
+        self.sprite_sheets = {}
+        self.fonts = {}
+        self.transformed_images = {}
+
+    def sprite_sheet(self, file_name: str) -> 'SpriteSheet':
+        '''Returns the sprite sheet in the sprites directory, loading it on first use'''
+        sprite_sheet = self.sprite_sheets.get(file_name)
+        if sprite_sheet is None:
+            # pygame is only imported once something is drawn
+            from sprites import SpriteSheet
+            sprite_sheet = self.sprite_sheets[file_name] = SpriteSheet(os.path.join(SPRITES_DIR, file_name))
+        return sprite_sheet
+
+    def font(self, size: int, file_name: str = FONT) -> 'pygame.font.Font':
+        '''Returns the font in the fonts directory at the given size, opening it on first use'''
+        key = (file_name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            import pygame
+            font = self.fonts[key] = pygame.font.Font(os.path.join(FONTS_DIR, file_name), size)
+        return font
+
+    def transformed(self, image: 'pygame.Surface', flip_x: bool = False, angle: int = 0, size: tuple = None) -> 'pygame.Surface':
+        '''
+        Returns the image flipped, rotated and scaled in that order, transforming it on first use
+
+        Args:
+            image (pygame.Surface): A shared image from a sprite sheet
+            flip_x (bool, optional): Whether to flip the image horizontally. Defaults to False.
+            angle (int, optional): The angle to rotate the image by in degrees. Defaults to 0.
+            size (tuple, optional): The size to scale the image to. Defaults to None, which keeps its size.
+        '''
+        key = (image, flip_x, angle, size)
+        transformed_image = self.transformed_images.get(key)
+        if transformed_image is None:
+            import pygame
+            transformed_image = image
+            if flip_x:
+                transformed_image = pygame.transform.flip(transformed_image, True, False)
+            if angle:
+                transformed_image = pygame.transform.rotate(transformed_image, angle)
+            if size is not None:
+                transformed_image = pygame.transform.scale(transformed_image, size)
+            self.transformed_images[key] = transformed_image
+        return transformed_image
+
+    def directional(self, sprites: dict, size: tuple = SPRITE_SIZE) -> dict:
+        '''Returns every sprite turned to face every direction and scaled, keyed by (sprite key, direction)'''
+        return {(key, direction): self.transformed(sprite, flip_x, angle, size)
+                for key, sprite in sprites.items()
+                for direction, (flip_x, angle) in DIRECTION_TRANSFORMS.items()}
+
+    def clear(self) -> None:
+        '''Forgets every loaded asset, they are loaded again on next use'''
+        self.sprite_sheets.clear()
+        self.fonts.clear()
+        self.transformed_images.clear()
+
+# Shared by everything in the process
+asset_cache = AssetCache()
@@ -0,0 +1,431 @@
+import struct
+import numpy as np
+from constants import *
+from maze import tile_index
+from collisions import MAX_SWEEP_DISTANCE
+from ghost import Blinky, Pinky, Inky, Clyde
+from features import DEFAULT_FEATURES
+from game_state import pack_flags, unpack_flags
+from streams import stream_key, stream_values
+
+# Directions and phases are stored as indexes into DIRECTIONS and GHOST_PHASES,
+# NO_DIRECTION indexes the last row of DIRECTION_VECTORS which does not move
+NO_DIRECTION = -1
+DIRECTION_VECTORS = np.array([(0, -1), (0, 1), (-1, 0), (1, 0), (0, 0)], dtype=np.float64)
+OPPOSITE_DIRECTIONS = np.array([1, 0, 3, 2, NO_DIRECTION])
+
+SCATTER_INDEX, CHASE_INDEX, FRIGHTENED_INDEX, EATEN_INDEX, LEAVE_GHOST_HOUSE_INDEX = range(len(GHOST_PHASES))
+PATH_INDEX = TILE_TYPES.index(PATH)
+GHOST_HOUSE_INDEX = TILE_TYPES.index(GHOST_HOUSE)
+
+GHOST_CLASSES = (Blinky, Pinky, Inky, Clyde)
+
+AGENT_SPEED = 75
+GHOST_SPEED = 75
+FRIGHTENED_SPEED = 50
+EATEN_SPEED = 150
+COLLISION_RADIUS = TILE_WIDTH // 2
+MAX_QUEUE_TIME = 0.5
+MAX_IDLE_TIME = 5
+FRIGHTENED_TIME = 7
+EATEN_TIME = 3
+GHOST_POINTS = 200
+
+# The arrays of a snapshot and the smallest type that holds their values, the pellets are packed into bits
+STATE_ARRAYS = (
+    ('agent_tile', np.int16), ('agent_next_tile', np.int16),
+    ('agent_position', np.float64), ('agent_previous_position', np.float64),
+    ('agent_direction', np.int8), ('directions_queue', np.int8), ('queue_length', np.int8),
+    ('queue_timer', np.float64), ('idle_timer', np.float64), ('is_idle', np.bool_),
+    ('score', np.int32), ('lives', np.int8), ('alive', np.bool_),
+    ('ghost_tile', np.int16), ('ghost_next_tile', np.int16),
+    ('ghost_position', np.float64), ('ghost_previous_position', np.float64),
+    ('ghost_direction', np.int8), ('ghost_phase', np.int8),
+    ('ghost_speed', np.float64), ('ghost_elapsed_time', np.float64), ('ghost_draws', np.uint32),
+)
+# The tick of the simulation and the key of the frightened target streams
+SIMULATION_STATE = struct.Struct('<IQ')
+
+class BatchSimulation(object):
+    '''
+    Simulates a whole population of agents, each with its own four ghosts, as a struct of arrays.
+    Positions, directions, tiles, phases, timers, lives, scores and pellets of every agent and
+    ghost live in NumPy arrays and every tick advances all of them with vectorized operations.
+    '''
+    def __init__(self, tiles, num_agents: int, seed: int = None, features=DEFAULT_FEATURES, pacman_spawn=None,
+                 ghost_spawns=None):
+        """
+        Initialize a BatchSimulation object.
+
+        Args:
+            tiles (TileCollection): The maze to simulate
+            num_agents (int): The number of agents in the population
+            seed (int, optional): Seed of the frightened ghost targets. The ghosts of every agent draw from
+                their own stream of it, so an agent's episode does not depend on the rest of the population.
+            features (FeatureSet, optional): The features the agents observe. Defaults to DEFAULT_FEATURES.
+            pacman_spawn (Tile, optional): The tile every agent starts on. Defaults to the spawn of the level.
+            ghost_spawns (List[Tile], optional): The start tiles of Blinky, Pinky, Inky and Clyde. Defaults to
+                the spawns of the level.
+        """
+        self.num_agents = num_agents
+        self.features = features
+        self.observations = features.allocate(num_agents)
+        self.compile_tiles(tiles)
+        self.stream_key = stream_key(seed)
+
+        self.agent_start = (pacman_spawn or tiles.pacman_spawn).index
+        self.ghost_starts = np.array([tile.index for tile in ghost_spawns or tiles.ghost_spawns])
+        self.scatter_targets = np.array([tile_index(*ghost.SCATTER_TARGET) for ghost in GHOST_CLASSES])
+        self.eaten_targets = np.array([tile_index(*ghost.EATEN_TARGET) for ghost in GHOST_CLASSES])
+        self.leave_targets = np.array([tile_index(*ghost.LEAVE_GHOST_HOUSE_TARGET) for ghost in GHOST_CLASSES])
+        self.reset()
+
+    def compile_tiles(self, tiles) -> None:
+        '''Reads the arrays of the compiled maze, all indexed by tile index'''
+        maze = self.maze = tiles.maze
+        self.tile_positions = maze.tile_positions
+        self.tile_types = maze.tile_types
+        self.neighbors = maze.neighbors
+        self.portal_destinations = maze.portal_destinations
+        self.item_points = maze.item_points
+        self.power_pellet_tiles = maze.power_pellet_tiles
+        self.pellet_tiles = maze.pellet_tiles
+        self.agent_passable = maze.passable[0]
+        self.ghost_passable = maze.passable[1:]
+        self.distances = maze.distances
+        self.rays = maze.rays
+        self.agent_decision_points = maze.junctions[None].is_decision_point
+
+    def restart(self, num_agents: int, seed: int = None) -> None:
+        '''
+        Starts a new episode on the same maze
+
+        Args:
+            num_agents (int): The number of agents in the population
+            seed (int, optional): Seed of the frightened ghost targets
+        '''
+        if num_agents != self.num_agents:
+            self.num_agents = num_agents
+            self.observations = self.features.allocate(num_agents)
+        self.stream_key = stream_key(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        '''Puts every agent and ghost at the start of an episode'''
+        num_agents, num_ghosts = self.num_agents, len(GHOST_CLASSES)
+        self.ticks = 0
+
+        self.agent_tile = np.full(num_agents, self.agent_start, dtype=np.int64)
+        self.agent_next_tile = self.agent_tile.copy()
+        self.agent_position = self.tile_positions[self.agent_tile].copy()
+        self.agent_previous_position = self.agent_position.copy()
+        self.agent_direction = np.full(num_agents, NO_DIRECTION, dtype=np.int64)
+        self.directions_queue = np.full((num_agents, 2), NO_DIRECTION, dtype=np.int64)
+        self.queue_length = np.zeros(num_agents, dtype=np.int64)
+        self.queue_timer = np.zeros(num_agents, dtype=np.float64)
+        self.idle_timer = np.zeros(num_agents, dtype=np.float64)
+        self.is_idle = np.zeros(num_agents, dtype=bool)
+        self.score = np.zeros(num_agents, dtype=np.int64)
+        self.lives = np.full(num_agents, 3, dtype=np.int64)
+        self.alive = np.ones(num_agents, dtype=bool)
+        self.pellets = np.tile(self.pellet_tiles, (num_agents, 1))
+
+        self.ghost_tile = np.tile(self.ghost_starts, (num_agents, 1))
+        self.ghost_next_tile = self.ghost_tile.copy()
+        self.ghost_position = self.tile_positions[self.ghost_tile].copy()
+        self.ghost_previous_position = self.ghost_position.copy()
+        self.ghost_direction = np.full((num_agents, num_ghosts), NO_DIRECTION, dtype=np.int64)
+        self.ghost_phase = np.full((num_agents, num_ghosts), LEAVE_GHOST_HOUSE_INDEX, dtype=np.int64)
+        self.ghost_speed = np.full((num_agents, num_ghosts), GHOST_SPEED, dtype=np.float64)
+        self.ghost_elapsed_time = np.zeros((num_agents, num_ghosts), dtype=np.float64)
+        # The number of frightened targets the ghosts of each agent drew from their stream
+        self.ghost_draws = np.zeros(num_agents, dtype=np.int64)
+
+    def pack_state(self) -> bytes:
+        '''Returns the state of every agent and ghost packed into bytes'''
+        parts = [SIMULATION_STATE.pack(self.ticks, self.stream_key)]
+        parts.extend(getattr(self, name).astype(dtype, copy=False).tobytes() for name, dtype in STATE_ARRAYS)
+        parts.append(pack_flags(self.pellets))
+        return b''.join(parts)
+
+    def unpack_state(self, buffer, offset: int) -> int:
+        '''
+        Restores the state packed by pack_state into the arrays and returns the offset after it
+
+        Args:
+            buffer (bytes): The packed state, of a simulation with as many agents
+            offset (int): Where the state starts in the buffer
+        '''
+        self.ticks, self.stream_key = SIMULATION_STATE.unpack_from(buffer, offset)
+        offset += SIMULATION_STATE.size
+        for name, dtype in STATE_ARRAYS:
+            array = getattr(self, name)
+            array[...] = np.frombuffer(buffer, dtype=dtype, count=array.size, offset=offset).reshape(array.shape)
+            offset += array.size * np.dtype(dtype).itemsize
+        pellets, offset = unpack_flags(buffer, offset, self.pellets.size)
+        self.pellets[...] = pellets.reshape(self.pellets.shape)
+        return offset
+
+    def has_reached_next_tile(self, position, tile, next_tile) -> np.ndarray:
+        '''Returns whether each entity has reached or passed its next tile'''
+        next_position = self.tile_positions[next_tile]
+        position_to_target = next_position - position
+        tile_to_target = next_position - self.tile_positions[tile]
+        return (position_to_target * tile_to_target).sum(axis=-1) <= 0
+
+    def at_decision_points(self) -> np.ndarray:
+        '''Returns whether each agent is stopped or heading for a junction, corner or dead end'''
+        return (self.agent_direction == NO_DIRECTION) | self.agent_decision_points[self.agent_next_tile]
+
+    def observe(self, phase: str) -> np.ndarray:
+        '''
+        Returns the observations of every agent, written into the same buffer every tick
+
+        Args:
+            phase (str): The current game phase
+        '''
+        return self.features.observe_batch(self, phase, self.observations)
+
+    def step(self, actions: np.ndarray, phase: str, delta_time: float) -> None:
+        '''
+        Advances every alive agent and its ghosts by one tick
+
+        Args:
+            actions (np.ndarray): The direction index chosen by every agent, NO_DIRECTION for none
+            phase (str): The current game phase
+            delta_time (float): The timestep in seconds
+        '''
+        active = self.alive.copy()
+        self.alive &= self.lives > 0
+        self.move_agents(actions, active, delta_time)
+        self.move_ghosts(active, delta_time)
+        self.check_collisions(active)
+        self.update_ghosts_phase(active, phase, delta_time)
+        self.alive &= ~(active & self.is_idle)
+        self.ticks += 1
+
+    def move_agents(self, actions: np.ndarray, active: np.ndarray, delta_time: float) -> None:
+        '''Moves the agents, mirroring Agent.move'''
+        direction, queue, queue_length = self.agent_direction, self.directions_queue, self.queue_length
+        np.copyto(self.agent_previous_position, self.agent_position)
+        self.agent_position[active] += DIRECTION_VECTORS[direction[active]] * AGENT_SPEED * delta_time
+        self.queue_timer[active] += delta_time
+
+        # Reversing is immediate, any other direction is queued for the next tile
+        has_action = active & (actions != NO_DIRECTION)
+        reverse = has_action & (direction == OPPOSITE_DIRECTIONS[actions])
+        direction[reverse] = actions[reverse]
+        queue_length[reverse] = 0
+        self.agent_tile[reverse], self.agent_next_tile[reverse] = self.agent_next_tile[reverse], self.agent_tile[reverse]
+
+        insert = has_action & ~reverse
+        first = insert & (queue_length == 0) & (actions != direction)
+        second = insert & (queue_length == 1) & (actions != queue[:, 0])
+        queue[first, 0] = actions[first]
+        queue[second, 1] = actions[second]
+        queue_length[first] = 1
+        queue_length[second] = 2
+        self.queue_timer[first | second] = 0
+
+        reached = active & self.has_reached_next_tile(self.agent_position, self.agent_tile, self.agent_next_tile)
+        self.enter_portals(reached, self.agent_position, self.agent_next_tile)
+        tile = self.agent_tile
+        tile[reached] = self.agent_next_tile[reached]
+
+        queued = reached & (queue_length > 0)
+        peek = np.where(queued, queue[:, 0], 0)
+        dequeue = queued & self.agent_passable[tile, peek]
+        next_direction = np.where(dequeue, peek, direction)
+        queue[dequeue, 0] = queue[dequeue, 1]
+        queue_length[dequeue] -= 1
+
+        can_move = (next_direction != NO_DIRECTION) & self.agent_passable[tile, np.maximum(next_direction, 0)]
+        moving = reached & can_move
+        blocked = reached & ~can_move
+        self.agent_next_tile[moving] = self.neighbors[tile[moving], next_direction[moving]]
+        self.agent_next_tile[blocked] = tile[blocked]
+        direction[moving] = next_direction[moving]
+        direction[blocked] = NO_DIRECTION
+        queue_length[blocked] = 0
+        self.agent_position[reached] = self.tile_positions[tile[reached]]
+
+        stopped = active & (direction == NO_DIRECTION)
+        self.idle_timer[stopped] += delta_time
+        toggle = stopped & (self.idle_timer >= MAX_IDLE_TIME)
+        self.idle_timer[toggle] = 0
+        self.is_idle[toggle] = ~self.is_idle[toggle]
+        travelling = active & ~stopped
+        self.is_idle[travelling] = False
+        self.idle_timer[travelling] = 0
+
+        expired = active & (self.queue_timer >= MAX_QUEUE_TIME) & (queue_length > 0)
+        queue_length[expired] -= 1
+
+    def enter_portals(self, reached: np.ndarray, position: np.ndarray, next_tile: np.ndarray) -> None:
+        '''Moves the entities that reached a portal to its destination, mirroring Entity.check_for_portal'''
+        portal = reached & (self.portal_destinations[next_tile] >= 0)
+        next_tile[portal] = self.portal_destinations[next_tile[portal]]
+        position[portal] = self.tile_positions[next_tile[portal]]
+
+    def find_ghost_targets(self, active: np.ndarray) -> np.ndarray:
+        '''Returns the target tile of every ghost, mirroring the find_target methods'''
+        phase = self.ghost_phase
+        targets = np.where(phase == SCATTER_INDEX, self.scatter_targets, self.leave_targets)
+        targets = np.where(phase == CHASE_INDEX, self.agent_tile[:, None], targets)
+        targets = np.where(phase == EATEN_INDEX, self.eaten_targets, targets)
+        frightened = active[:, None] & (phase == FRIGHTENED_INDEX)
+        if frightened.any():
+            # Like the ghosts of the object backend, every frightened ghost of an active agent draws the
+            # next value of its agent's stream, Blinky first
+            agents, ghosts = np.nonzero(frightened)
+            counters = self.ghost_draws[agents] + np.cumsum(frightened, axis=1)[agents, ghosts] - 1
+            values = stream_values(self.stream_key, counters)
+            targets[agents, ghosts] = (values % np.uint64(len(self.tile_types))).astype(np.int64)
+            self.ghost_draws += frightened.sum(axis=1)
+        return targets
+
+    def move_ghosts(self, active: np.ndarray, delta_time: float) -> None:
+        '''Moves the ghosts, mirroring Ghost.move'''
+        targets = self.find_ghost_targets(active).reshape(-1)
+        active = np.repeat(active, len(GHOST_CLASSES))
+        position = self.ghost_position.reshape(-1, 2)
+        tile, next_tile = self.ghost_tile.reshape(-1), self.ghost_next_tile.reshape(-1)
+        direction, phase = self.ghost_direction.reshape(-1), self.ghost_phase.reshape(-1)
+
+        np.copyto(self.ghost_previous_position, self.ghost_position)
+        position[active] += DIRECTION_VECTORS[direction[active]] * (self.ghost_speed.reshape(-1)[active, None] * delta_time)
+        reached = active & self.has_reached_next_tile(position, tile, next_tile)
+        if not reached.any():
+            return
+        self.enter_portals(reached, position, next_tile)
+        tile[reached] = next_tile[reached]
+
+        rows = np.flatnonzero(reached)
+        arrived, arrived_direction = tile[rows], direction[rows]
+        possible = self.ghost_passable[phase[rows], arrived]
+        possible &= np.arange(len(DIRECTIONS)) != OPPOSITE_DIRECTIONS[arrived_direction][:, None]
+        # In corridors and corners there is only one way to go, distances are only looked up at junctions
+        next_direction = np.where(possible.any(axis=1), possible.argmax(axis=1), NO_DIRECTION)
+        choosing = np.flatnonzero(possible.sum(axis=1) > 1)
+        if len(choosing):
+            choosing_rows = rows[choosing]
+            # Ghost phases follow the agent's entry in the maze's phase order
+            distances = self.distances.distances(self.neighbors[arrived[choosing]], targets[choosing_rows][:, None],
+                                                 phase[choosing_rows][:, None] + 1)
+            next_direction[choosing] = np.where(possible[choosing], distances, np.inf).argmin(axis=1)
+
+        direction[rows] = next_direction
+        next_tile[rows] = np.where(next_direction == NO_DIRECTION, arrived,
+                                   self.neighbors[arrived, np.maximum(next_direction, 0)])
+
+    def check_collisions(self, active: np.ndarray) -> None:
+        '''Resolves agent-ghost collisions and collects the pellets the agents touch'''
+        # GameController.check_collisions checks the ghosts before almost every item, so a deadly
+        # ghost ends the agent's checks and a power pellet lets the agent eat a ghost it touches
+        died = self.check_ghost_collisions(active)
+        powered = self.collect_pellets(active & ~died)
+        if powered.any():
+            self.check_ghost_collisions(powered)
+
+    def collect_pellets(self, active: np.ndarray) -> np.ndarray:
+        '''Collects the pellets the agents touch and returns which agents ate a power pellet'''
+        agents = np.arange(self.num_agents)
+        powered = np.zeros(self.num_agents, dtype=bool)
+        # An agent is always between its tile and its next tile, so only those items can be in reach
+        for candidate in (self.agent_tile, self.agent_next_tile):
+            offsets = self.tile_positions[candidate] - self.agent_position
+            hit = active & self.pellets[agents, candidate] & ((offsets ** 2).sum(axis=1) <= COLLISION_RADIUS ** 2)
+            self.pellets[agents[hit], candidate[hit]] = False
+            self.score[hit] += self.item_points[candidate[hit]]
+            powered |= hit & self.power_pellet_tiles[candidate]
+
+        frighten = powered[:, None] & (self.ghost_phase != EATEN_INDEX) & (self.ghost_phase != LEAVE_GHOST_HOUSE_INDEX)
+        self.ghost_phase[frighten] = FRIGHTENED_INDEX
+        self.ghost_speed[frighten] = FRIGHTENED_SPEED
+        self.ghost_elapsed_time[frighten] = 0
+        return powered
+
+    def check_ghost_collisions(self, active: np.ndarray) -> np.ndarray:
+        '''Lets the agents eat the frightened ghosts they touched and returns which agents died'''
+        touching = active[:, None] & (self.closest_approach_squared() <= COLLISION_RADIUS ** 2)
+        deadly = touching & ((self.ghost_phase == CHASE_INDEX) | (self.ghost_phase == SCATTER_INDEX))
+        # Ghosts are resolved in order, the first deadly one ends the agent's checks
+        reached_in_order = (np.cumsum(deadly, axis=1) - deadly) == 0
+        eaten = touching & (self.ghost_phase == FRIGHTENED_INDEX) & reached_in_order
+        self.ghost_phase[eaten] = EATEN_INDEX
+        self.ghost_speed[eaten] = EATEN_SPEED
+        self.ghost_elapsed_time[eaten] = 0
+        self.score += GHOST_POINTS * eaten.sum(axis=1)
+
+        died = deadly.any(axis=1)
+        if died.any():
+            self.lives[died] -= 1
+            self.reset_positions(died)
+        return died
+
+    @staticmethod
+    def sweep_starts(previous_position: np.ndarray, position: np.ndarray) -> np.ndarray:
+        '''Returns where the sweep of every entity starts this tick, portal jumps are not swept'''
+        teleported = ((position - previous_position) ** 2).sum(axis=-1) > MAX_SWEEP_DISTANCE ** 2
+        return np.where(teleported[..., None], position, previous_position)
+
+    def closest_approach_squared(self) -> np.ndarray:
+        '''
+        Returns the smallest squared distance between every agent and each of its ghosts
+        while both moved linearly over the tick, see collisions.closest_approach_squared
+        '''
+        agent_start = self.sweep_starts(self.agent_previous_position, self.agent_position)[:, None, :]
+        ghost_start = self.sweep_starts(self.ghost_previous_position, self.ghost_position)
+        relative = ghost_start - agent_start
+        delta = (self.ghost_position - self.agent_position[:, None, :]) - relative
+        length_squared = (delta ** 2).sum(axis=2)
+        projection = -(relative * delta).sum(axis=2)
+        t = np.clip(np.divide(projection, length_squared, out=np.zeros_like(projection), where=length_squared > 0), 0, 1)
+        closest = relative + t[..., None] * delta
+        return (closest ** 2).sum(axis=2)
+
+    def reset_positions(self, agents: np.ndarray) -> None:
+        '''Puts the given agents and their ghosts back on their starting tiles'''
+        self.agent_tile[agents] = self.agent_next_tile[agents] = self.agent_start
+        self.agent_position[agents] = self.agent_previous_position[agents] = self.tile_positions[self.agent_start]
+        self.agent_direction[agents] = NO_DIRECTION
+        self.queue_length[agents] = 0
+        self.is_idle[agents] = False
+        self.idle_timer[agents] = 0
+
+        self.ghost_tile[agents] = self.ghost_next_tile[agents] = self.ghost_starts
+        self.ghost_position[agents] = self.ghost_previous_position[agents] = self.tile_positions[self.ghost_starts]
+        self.ghost_direction[agents] = NO_DIRECTION
+        self.ghost_phase[agents] = LEAVE_GHOST_HOUSE_INDEX
+        self.ghost_elapsed_time[agents] = 0
+
+    def update_ghosts_phase(self, active: np.ndarray, phase: str, delta_time: float) -> None:
+        '''Updates the phase of the ghosts, mirroring GameController.update_ghosts_phase'''
+        ghost_phase, elapsed_time, speed = self.ghost_phase, self.ghost_elapsed_time, self.ghost_speed
+        active = active[:, None]
+        tile_types = self.tile_types[self.ghost_tile]
+
+        frightened = active & (ghost_phase == FRIGHTENED_INDEX)
+        elapsed_time[frightened] += delta_time
+        recovered = frightened & (elapsed_time >= FRIGHTENED_TIME)
+
+        resting = active & (ghost_phase == EATEN_INDEX) & (tile_types == GHOST_HOUSE_INDEX)
+        elapsed_time[resting] += delta_time
+        revived = resting & (elapsed_time >= EATEN_TIME)
+
+        left_house = active & (ghost_phase == LEAVE_GHOST_HOUSE_INDEX) & (tile_types == PATH_INDEX)
+
+        ghost_phase[recovered] = CHASE_INDEX
+        ghost_phase[revived] = LEAVE_GHOST_HOUSE_INDEX
+        ghost_phase[left_house] = SCATTER_INDEX
+        changed = recovered | revived | left_house
+        elapsed_time[changed] = 0
+        speed[changed] = GHOST_SPEED
+
+        if phase == CHASE:
+            follow = active & (ghost_phase == SCATTER_INDEX)
+            ghost_phase[follow] = CHASE_INDEX
+        else:
+            follow = active & (ghost_phase == CHASE_INDEX)
+            ghost_phase[follow] = SCATTER_INDEX
+        speed[follow] = GHOST_SPEED
@@ -0,0 +1,114 @@
+import os, gzip, pickle, queue, random, threading
+import neat
+from neat_utils import CHECKPOINT_PREFIX, LATEST_CHECKPOINT, checkpoint_generation
+
+def write_atomically(path: str, data: bytes) -> None:
+    '''Writes the data under a temporary name and renames it, so the path never holds a partial file'''
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+class AsyncCheckpointer(neat.Checkpointer):
+    '''
+    Saves the population like neat.Checkpointer, into files it restores, without stalling training.
+
+    The population is pickled when its generation ends, since the next generation changes it,
+    and a background thread compresses and writes the checkpoint, points the latest file at it
+    and deletes the checkpoints that are no longer kept. A checkpoint that is still being
+    written when the process is killed is lost, but never left behind half written.
+    '''
+    def __init__(self, directory: str, generation_interval: int = 1, time_interval_seconds: float = None,
+                 keep_last: int = 5, keep_every: int = None, compress_level: int = 5):
+        """
+        Initialize an AsyncCheckpointer object.
+
+        Args:
+            directory (str): The directory of the checkpoints, created if needed
+            generation_interval (int, optional): Generations between checkpoints. Defaults to 1.
+            time_interval_seconds (float, optional): Seconds between checkpoints. Defaults to None.
+            keep_last (int, optional): The number of newest checkpoints to keep, None keeps every checkpoint.
+                Defaults to 5.
+            keep_every (int, optional): Also keeps the checkpoint of every generation that is a multiple of
+                this. Defaults to None.
+            compress_level (int, optional): The gzip compression level. Defaults to 5.
+        """
+        if keep_last is not None and keep_last < 1:
+            raise ValueError(f'At least the newest checkpoint has to be kept, got keep_last={keep_last}')
+        super().__init__(generation_interval, time_interval_seconds, os.path.join(directory, CHECKPOINT_PREFIX))
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_every = keep_every
+        self.compress_level = compress_level
+        os.makedirs(directory, exist_ok=True)
+
+        # At most two pickled populations wait for the writer before the training waits for it
+        self.pending = queue.Queue(maxsize=2)
+        self.error = None
+        self.writer = threading.Thread(target=self.write_checkpoints, name='checkpoint-writer', daemon=True)
+        self.writer.start()
+
+    def __getstate__(self):
+        # The species set pickled into every checkpoint holds its reporters, this one among them
+        state = self.__dict__.copy()
+        state.update(pending=None, writer=None, error=None)
+        return state
+
+    def save_checkpoint(self, config, population, species_set, generation):
+        '''Pickles the population and queues it to be written'''
+        self.raise_error()
+        data = pickle.dumps((generation, config, population, species_set, random.getstate()),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        print(f'Saving checkpoint to {self.filename_prefix}{generation}')
+        self.pending.put((generation, data))
+
+    def write_checkpoints(self) -> None:
+        '''Writes the queued checkpoints until close is called, runs in the writer thread'''
+        while True:
+            checkpoint = self.pending.get()
+            try:
+                if checkpoint is None:
+                    return
+                self.write_checkpoint(*checkpoint)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.pending.task_done()
+
+    def write_checkpoint(self, generation: int, data: bytes) -> None:
+        '''Writes a pickled population, makes it the latest checkpoint and deletes the ones no longer kept'''
+        filename = f'{CHECKPOINT_PREFIX}{generation}'
+        write_atomically(os.path.join(self.directory, filename), gzip.compress(data, self.compress_level))
+        write_atomically(os.path.join(self.directory, LATEST_CHECKPOINT), filename.encode())
+        self.remove_old_checkpoints()
+
+    def remove_old_checkpoints(self) -> None:
+        '''Deletes every checkpoint but the keep_last newest ones and the multiples of keep_every'''
+        if self.keep_last is None:
+            return
+        generations = [checkpoint_generation(filename) for filename in os.listdir(self.directory)]
+        generations = sorted(generation for generation in generations if generation is not None)
+        for generation in generations[:-self.keep_last]:
+            if self.keep_every and generation % self.keep_every == 0:
+                continue
+            os.remove(os.path.join(self.directory, f'{CHECKPOINT_PREFIX}{generation}'))
+
+    def raise_error(self) -> None:
+        '''Raises the error the writer thread ran into, if any'''
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError('Writing a checkpoint failed') from error
+
+    def flush(self) -> None:
+        '''Waits until every queued checkpoint is written'''
+        self.pending.join()
+        self.raise_error()
+
+    def close(self) -> None:
+        '''Writes the queued checkpoints and stops the writer thread'''
+        if self.writer is not None and self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        self.raise_error()
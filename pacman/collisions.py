@@ -0,0 +1,81 @@
+from typing import Iterator
+from constants import *
+
+# Nothing moves this far in a tick except through a portal, those jumps are not swept
+MAX_SWEEP_DISTANCE = SCREEN_WIDTH / 2
+
+def sweep_start(previous_position, position):
+    '''
+    Returns where the entity's sweep starts this tick
+
+    Args:
+        previous_position (Vector2D): The position of the entity before it moved this tick
+        position (Vector2D): The position of the entity after it moved this tick
+    '''
+    delta_x, delta_y = position.x - previous_position.x, position.y - previous_position.y
+    if delta_x * delta_x + delta_y * delta_y > MAX_SWEEP_DISTANCE * MAX_SWEEP_DISTANCE:
+        return position
+    return previous_position
+
+def closest_approach_squared(start_a, end_a, start_b, end_b) -> float:
+    '''
+    Returns the smallest squared distance between two points that move linearly
+    from their start to their end position over the same tick. The points are
+    anything with x and y, like a Vector2D
+    '''
+    relative_x, relative_y = start_b.x - start_a.x, start_b.y - start_a.y
+    delta_x = (end_b.x - end_a.x) - relative_x
+    delta_y = (end_b.y - end_a.y) - relative_y
+    length_squared = delta_x * delta_x + delta_y * delta_y
+    t = 0.0
+    if length_squared > 0:
+        t = min(max(-(relative_x * delta_x + relative_y * delta_y) / length_squared, 0.0), 1.0)
+    closest_x, closest_y = relative_x + t * delta_x, relative_y + t * delta_y
+    return closest_x * closest_x + closest_y * closest_y
+
+class CollisionSystem(object):
+    '''
+    Finds what an agent or pacman collided with during a tick.
+
+    Items are only looked up on the tiles the entity is between. Ghosts are first filtered
+    by how many tiles they are away from the entity and the remaining ones are tested by
+    sweeping both entities over the tick, so a fast ghost cannot pass through the entity
+    when delta_time is large.
+    '''
+    def items_in_reach(self, entity) -> Iterator:
+        '''Yields the tiles whose item the entity touches'''
+        # An entity is always between its tile and its next tile, so only their items can be in reach
+        for tile in (entity.tile, entity.next_tile):
+            item = tile.item
+            if item is None:
+                continue
+            delta_x, delta_y = entity.position.x - item.position.x, entity.position.y - item.position.y
+            if delta_x * delta_x + delta_y * delta_y <= item.collision_radius * item.collision_radius:
+                yield tile
+            if entity.next_tile is entity.tile:
+                break
+
+    def ghosts_in_reach(self, entity, ghosts, delta_time: float) -> Iterator:
+        '''
+        Yields the ghosts that touched the entity during the tick, in order
+
+        Args:
+            entity (Entity): The agent or pacman
+            ghosts: The ghosts that can collide with the entity
+            delta_time (float): The timestep of the tick in seconds
+        '''
+        column_index, row_index = entity.tile.index % NUM_COLS, entity.tile.index // NUM_COLS
+        entity_end = entity.position
+        entity_start = sweep_start(entity.previous_position, entity.position)
+        for ghost in ghosts:
+            # Broad phase: entities sit at most a tile away from their tile, so anything
+            # further than both moves this tick plus the radius cannot be touching
+            reach = 2 + int(((entity.speed + ghost.speed) * delta_time + ghost.collision_radius) // TILE_WIDTH)
+            ghost_index = ghost.tile.index
+            if abs(ghost_index % NUM_COLS - column_index) > reach or abs(ghost_index // NUM_COLS - row_index) > reach:
+                continue
+
+            ghost_start = sweep_start(ghost.previous_position, ghost.position)
+            distance_squared = closest_approach_squared(entity_start, entity_end, ghost_start, ghost.position)
+            if distance_squared <= ghost.collision_radius * ghost.collision_radius:
+                yield ghost
@@ -0,0 +1,144 @@
+import math
+from collections import OrderedDict
+from neat import activations, aggregations
+from neat.graphs import feed_forward_layers
+from neat_utils import genome_hash
+
+class CompiledNetwork(object):
+    '''
+    A feed forward network compiled to a straight-line Python function.
+
+    Keeps the same input_nodes, output_nodes and node_evals as neat-python's
+    FeedForwardNetwork, which is all BatchNetwork reads. The activate function, with the
+    weights as literals, is generated when it is first called, so networks that are only
+    evaluated in a BatchNetwork never pay for it.
+    '''
+    def __init__(self, input_nodes, output_nodes, node_evals):
+        """
+        Initialize a CompiledNetwork object.
+
+        Args:
+            input_nodes (List[int]): The keys of the input nodes
+            output_nodes (List[int]): The keys of the output nodes
+            node_evals (list): (node, activation, aggregation, bias, response, links) in evaluation order
+        """
+        self.input_nodes = input_nodes
+        self.output_nodes = output_nodes
+        self.node_evals = node_evals
+        self.source = None
+        self.function = None
+
+    def activate(self, inputs) -> list:
+        '''Returns the outputs of the network for the inputs, like FeedForwardNetwork.activate'''
+        if self.function is None:
+            namespace = {}
+            self.source = generate_source(self.input_nodes, self.output_nodes, self.node_evals, namespace)
+            exec(compile(self.source, '<compiled network>', 'exec'), namespace)
+            self.function = namespace['activate']
+        return self.function(inputs)
+
+    def __getstate__(self):
+        # The generated function cannot be pickled, it is generated again when needed
+        state = self.__dict__.copy()
+        state.update(source=None, function=None)
+        return state
+
+def literal(value: float) -> str:
+    '''Returns a Python expression of the float, repr gives names like inf that are not defined'''
+    return repr(value) if math.isfinite(value) else f"float('{value!r}')"
+
+def generate_source(input_nodes, output_nodes, node_evals, namespace: dict) -> str:
+    '''
+    Returns the source of an activate function that evaluates the nodes in order
+
+    Args:
+        input_nodes (List[int]): The keys of the input nodes
+        output_nodes (List[int]): The keys of the output nodes
+        node_evals (list): The nodes to evaluate
+        namespace (dict): Filled with the functions the source calls, it is executed with these globals
+    '''
+    names = {}
+    def name(function, kind: str) -> str:
+        if function not in names:
+            names[function] = f'{kind}_{len(names)}'
+            namespace[names[function]] = function
+        return names[function]
+
+    variables = {key: f'i{index}' for index, key in enumerate(input_nodes)}
+    used_inputs = {source for node_eval in node_evals for source, weight in node_eval[5]} & set(input_nodes)
+    lines = [
+        'def activate(inputs):',
+        f'    if len(inputs) != {len(input_nodes)}:',
+        f'        raise RuntimeError("Expected {len(input_nodes)} inputs, got {{0:n}}".format(len(inputs)))',
+    ]
+    for index, key in enumerate(input_nodes):
+        if key in used_inputs:
+            lines.append(f'    {variables[key]} = inputs[{index}]')
+
+    for node, activation, aggregation, bias, response, links in node_evals:
+        variables[node] = f'n{node}'
+        products = [f'{variables[source]} * {literal(weight)}' for source, weight in links]
+        if aggregation is aggregations.sum_aggregation:
+            # Adding left to right gives exactly what sum() gives
+            aggregated = f'({" + ".join(products)})'
+        else:
+            aggregated = f'{name(aggregation, "aggregation")}([{", ".join(products)}])'
+        lines.append(f'    z = {literal(bias)} + {literal(response)} * {aggregated}')
+        if activation is activations.relu_activation:
+            lines.append(f'    {variables[node]} = z if z > 0.0 else 0.0')
+        elif activation is activations.identity_activation:
+            lines.append(f'    {variables[node]} = z')
+        else:
+            lines.append(f'    {variables[node]} = {name(activation, "activation")}(z)')
+
+    # Outputs that nothing reaches stay at 0.0, like they do in FeedForwardNetwork
+    outputs = ', '.join(variables.get(key, '0.0') for key in output_nodes)
+    lines.append(f'    return [{outputs}]')
+    return '\n'.join(lines) + '\n'
+
+def compile_genome(genome, config) -> CompiledNetwork:
+    '''Compiles the genome's network into a CompiledNetwork'''
+    genome_config = config.genome_config
+    connections = [connection.key for connection in genome.connections.values() if connection.enabled]
+    incoming = {}
+    for input_node, output_node in connections:
+        incoming.setdefault(output_node, []).append((input_node, genome.connections[(input_node, output_node)].weight))
+
+    # feed_forward_layers only lays out the nodes an output depends on
+    node_evals = []
+    for layer in feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections):
+        for node in layer:
+            node_gene = genome.nodes[node]
+            activation = genome_config.activation_defs.get(node_gene.activation)
+            aggregation = genome_config.aggregation_function_defs.get(node_gene.aggregation)
+            node_evals.append((node, activation, aggregation, node_gene.bias, node_gene.response, incoming[node]))
+    return CompiledNetwork(genome_config.input_keys, genome_config.output_keys, node_evals)
+
+class NetworkCompiler(object):
+    '''
+    Compiles genomes and keeps the most recently used networks, so genomes that are
+    carried over to the next generation unchanged are not compiled again
+    '''
+    def __init__(self, max_size: int = 1000):
+        """
+        Initialize a NetworkCompiler object.
+
+        Args:
+            max_size (int, optional): The number of compiled networks to keep. Defaults to 1000.
+        """
+        self.max_size = max_size
+        self.networks = OrderedDict()
+
+    def compile(self, genome, config) -> CompiledNetwork:
+        '''Returns the compiled network of the genome'''
+        key = genome_hash(genome)
+        network = self.networks.get(key)
+        if network is None:
+            network = self.networks[key] = compile_genome(genome, config)
+            while len(self.networks) > self.max_size:
+                self.networks.popitem(last=False)
+        self.networks.move_to_end(key)
+        return network
+
+# Shared by every game controller in the process, worker processes keep theirs across generations
+network_compiler = NetworkCompiler()
@@ -5,6 +5,10 @@ NUM_COLS = 28
 SCREEN_WIDTH = TILE_WIDTH * NUM_COLS
 SCREEN_HEIGHT = TILE_HEIGHT * NUM_ROWS
 SCREEN_SIZE = (SCREEN_WIDTH, SCREEN_HEIGHT)
+NUM_TILES = NUM_COLS * NUM_ROWS
+
+FPS = 60
+FIXED_DELTA_TIME = 1 / FPS
 
 BLACK = (0, 0, 0)
 TILE_COLOR_1 = (32, 36, 39)
@@ -14,6 +18,7 @@ UP = 'up'
 DOWN = 'down'
 LEFT = 'left'
 RIGHT = 'right'
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
 
 PATH = 'path'
 WALL = 'wall'
@@ -21,11 +26,13 @@ GHOST_DOOR = 'ghost_door'
 GHOST_HOUSE = 'ghost_house'                         
 PORTAL = 'portal'
 EMPTY = 'empty'
+TILE_TYPES = (EMPTY, PATH, WALL, GHOST_DOOR, GHOST_HOUSE)
 
 SCATTER = 'scatter'
 CHASE = 'chase'
 FRIGHTENED = 'frightened'
 EATEN = 'eaten'
 LEAVE_GHOST_HOUSE = 'leave_ghost_house'
-
-
+GHOST_PHASES = (SCATTER, CHASE, FRIGHTENED, EATEN, LEAVE_GHOST_HOUSE)
+# Every agent is chased by its own Blinky, Pinky, Inky and Clyde
+NUM_GHOSTS = 4
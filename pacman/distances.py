@@ -0,0 +1,123 @@
+import os, math
+import numpy as np
+from collections import deque
+from constants import *
+from maze import PHASES, MOVEMENT_RULES
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+# Bump when the way the tables are computed changes, so stale cache files are ignored
+DISTANCE_TABLE_VERSION = 1
+UNREACHABLE = -1
+
+class DistanceTable(object):
+    '''
+    All-pairs shortest path lengths, in tiles, between the tiles of a maze.
+
+    There is one table for every distinct set of movement rules, so ghosts that may not
+    enter the ghost house get distances around it. Portals are free to walk through.
+    The tables are computed once per level with a breadth first search, saved next to
+    the package and memory-mapped afterwards, so every process shares the same pages.
+    '''
+    _loaded = {}
+
+    def __init__(self, maze, level_hash: str, cache_dir: str = CACHE_DIR):
+        """
+        Initialize a DistanceTable object.
+
+        Args:
+            maze (CompiledMaze): The maze to measure distances in
+            level_hash (str): Hash of the level file the maze was built from, keys the cache file
+            cache_dir (str, optional): Directory of the cache files. Defaults to CACHE_DIR.
+        """
+        rule_sets = []
+        for phase in PHASES:
+            rules = frozenset(MOVEMENT_RULES[phase])
+            if rules not in rule_sets:
+                rule_sets.append(rules)
+        self.rule_sets = rule_sets
+        # Index of the table to use for every phase, in the order of PHASES
+        self.phase_tables = {phase: rule_sets.index(frozenset(MOVEMENT_RULES[phase])) for phase in PHASES}
+        self.phase_table_indexes = np.array([self.phase_tables[phase] for phase in PHASES])
+        self.tile_coordinates = maze.tile_positions / TILE_WIDTH
+
+        path = os.path.join(cache_dir, f'distances-{level_hash}-v{DISTANCE_TABLE_VERSION}.npy')
+        self.tables = DistanceTable.load(path, maze, rule_sets)
+
+    @staticmethod
+    def load(path: str, maze, rule_sets) -> np.ndarray:
+        '''Memory-maps the tables cached at the path, computing and saving them first if needed'''
+        if path in DistanceTable._loaded:
+            return DistanceTable._loaded[path]
+        if not os.path.exists(path):
+            tables = np.stack([DistanceTable.compute(maze, rules) for rules in rule_sets])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Several workers may build the cache at once, so write it under a unique name first
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.save(file, tables)
+            os.replace(temporary_path, path)
+        tables = DistanceTable._loaded[path] = np.load(path, mmap_mode='r')
+        return tables
+
+    @staticmethod
+    def compute(maze, rules) -> np.ndarray:
+        '''Returns the shortest path lengths between every pair of tiles under the given movement rules'''
+        blocked = np.array([TILE_TYPES[tile_type] in rules for tile_type in maze.tile_types])
+        neighbors = maze.neighbors.tolist()
+        portals = maze.portal_destinations.tolist()
+        distances = np.full((maze.num_tiles, maze.num_tiles), UNREACHABLE, dtype=np.int16)
+
+        for source in range(maze.num_tiles):
+            if blocked[source]:
+                continue
+            row = distances[source]
+            row[source] = 0
+            # 0-1 breadth first search, reaching a portal puts the entity on its destination for free
+            frontier = deque([source])
+            while frontier:
+                index = frontier.popleft()
+                distance = row[index]
+                destination = portals[index]
+                if destination >= 0 and (row[destination] == UNREACHABLE or row[destination] > distance):
+                    row[destination] = distance
+                    frontier.appendleft(destination)
+                for neighbor in neighbors[index]:
+                    if neighbor >= 0 and not blocked[neighbor] and row[neighbor] == UNREACHABLE:
+                        row[neighbor] = distance + 1
+                        frontier.append(neighbor)
+        return distances
+
+    def euclidean_distance(self, start: int, target: int) -> float:
+        '''Returns the straight line distance in tiles between two tiles'''
+        start_x, start_y = self.tile_coordinates[start]
+        target_x, target_y = self.tile_coordinates[target]
+        return math.hypot(target_x - start_x, target_y - start_y)
+
+    def distance(self, start: int, target: int, phase=None) -> float:
+        '''
+        Returns the length in tiles of the shortest path from one tile to another. Targets that
+        cannot be reached, like the scatter corners outside the maze, fall back to the straight
+        line distance.
+
+        Args:
+            start (int): The index of the tile to start from
+            target (int): The index of the tile to reach
+            phase (str, optional): The phase whose movement rules apply, None for agents and pacman
+        '''
+        distance = self.tables[self.phase_tables[phase], start, target]
+        if distance == UNREACHABLE:
+            return self.euclidean_distance(start, target)
+        return int(distance)
+
+    def distances(self, starts: np.ndarray, targets: np.ndarray, phase_indexes: np.ndarray) -> np.ndarray:
+        '''
+        Vectorized distance for arrays of start tiles, target tiles and indexes into PHASES
+        that broadcast against each other
+        '''
+        distances = self.tables[self.phase_table_indexes[phase_indexes], starts, targets].astype(np.float64)
+        unreachable = distances == UNREACHABLE
+        if unreachable.any():
+            offsets = self.tile_coordinates[targets] - self.tile_coordinates[starts]
+            euclidean = np.sqrt((offsets ** 2).sum(axis=-1))
+            distances[unreachable] = np.broadcast_to(euclidean, distances.shape)[unreachable]
+        return distances
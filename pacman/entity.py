@@ -1,10 +1,30 @@
 # Import necessary modules and classes
+import struct
 from abc import ABC, abstractmethod
 from typing import List, Tuple
 from constants import *
 from vector import Vector2D
+from maze import PHASES, DIRECTION_BITS
+from game_state import CODED_DIRECTIONS, direction_code, phase_code, tile_at
+
+# Unit vectors of the directions, shared by every entity and never modified
+DIRECTION_VECTORS = {
+    UP : Vector2D(0, -1),
+    DOWN : Vector2D(0, 1),
+    LEFT : Vector2D(-1, 0),
+    RIGHT : Vector2D(1, 0),
+    None : Vector2D(0, 0)
+}
+
+# Tile, next tile, position, previous position, direction, phase, speed, elapsed time,
+# timer, animation timer, sprite toggle and visibility
+ENTITY_STATE = struct.Struct('<hhddddbbdddd??')
+ENTITY_VALUES = len(ENTITY_STATE.unpack(bytes(ENTITY_STATE.size)))
 
 class Entity(ABC):
+    # Every entity packs its state with one struct that starts with ENTITY_STATE
+    STATE = ENTITY_STATE
+
     def __init__(self, tile):
         self.elapsed_time, self.timer = 0, 0
         self.phase = LEAVE_GHOST_HOUSE
@@ -14,13 +34,7 @@ class Entity(ABC):
 
         # Movement Attributes
         self.speed = 0
-        self.directions = {
-            UP : Vector2D(0, -1),
-            DOWN : Vector2D(0, 1),
-            LEFT : Vector2D(-1, 0),
-            RIGHT : Vector2D(1, 0),
-            None : Vector2D(0, 0)
-        }
+        self.directions = DIRECTION_VECTORS
         self.current_direction = None
 
         # Tile Related Attributes
@@ -28,8 +42,10 @@ class Entity(ABC):
         self.next_tile = tile
         self.starting_tile = tile
 
-        # Initialize the entity's position
-        self.set_position()
+        # Initialize the entity's position, the vectors are updated in place from now on
+        self.position = tile.position.copy()
+        # Where the entity was before its last move, collisions are swept from here
+        self.previous_position = tile.position.copy()
 
     @staticmethod  
     def opposite_direction(direction: int) -> int:
@@ -55,10 +71,44 @@ class Entity(ABC):
         self.current_direction = None
         self.tile = self.next_tile = self.starting_tile
         self.set_position()
+        self.previous_position.update(self.position)
+
+    def state_values(self) -> tuple:
+        '''Returns the values of ENTITY_STATE, subclasses append theirs and pack them with their own STATE'''
+        return (self.tile.index, self.next_tile.index, self.position.x, self.position.y,
+                self.previous_position.x, self.previous_position.y,
+                direction_code(self.current_direction), phase_code(self.phase), self.speed,
+                self.elapsed_time, self.timer, self.animation_timer, self.sprite_toggle, self.is_visible)
+
+    def restore_state_values(self, values: tuple, tiles) -> None:
+        '''Restores the values returned by state_values'''
+        (tile, next_tile, x, y, previous_x, previous_y, direction, phase, self.speed, self.elapsed_time,
+         self.timer, self.animation_timer, self.sprite_toggle, self.is_visible) = values[:ENTITY_VALUES]
+        self.tile, self.next_tile = tile_at(tiles, tile), tile_at(tiles, next_tile)
+        self.position.set(x, y)
+        self.previous_position.set(previous_x, previous_y)
+        self.current_direction = CODED_DIRECTIONS[direction]
+        self.phase = PHASES[phase]
+
+    def pack_state(self) -> bytes:
+        '''Returns the state of the entity packed into bytes'''
+        return self.STATE.pack(*self.state_values())
+
+    def unpack_state(self, buffer, offset: int, tiles) -> int:
+        '''
+        Restores the state packed by pack_state and returns the offset after it
+
+        Args:
+            buffer (bytes): The packed state
+            offset (int): Where the state starts in the buffer
+            tiles (TileCollection): The tiles of the game the entity moves on
+        '''
+        self.restore_state_values(self.STATE.unpack_from(buffer, offset), tiles)
+        return offset + self.STATE.size
 
     def set_position(self):
         '''Sets the entity's position'''
-        self.position = self.tile.position.copy()
+        self.position.update(self.tile.position)
     
     def set_speed(self, speed: float):
         '''
@@ -71,9 +121,10 @@ class Entity(ABC):
 
     def has_reached_next_tile(self) -> bool:
         '''Returns whether the entity has reached the next tile'''
-        positon_to_target = self.next_tile.position - self.position
-        tile_to_target = self.next_tile.position - self.tile.position
-        dot_product = positon_to_target.dot(tile_to_target)
+        # The dot product of position to target and tile to target, without building the vectors
+        target, position, tile_position = self.next_tile.position, self.position, self.tile.position
+        dot_product = ((target.x - position.x) * (target.x - tile_position.x)
+                       + (target.y - position.y) * (target.y - tile_position.y))
         return dot_product <= 0
     
     def check_for_portal(self):
@@ -92,21 +143,8 @@ class Entity(ABC):
         '''
         if direction is None:
             return False
-        else:
-            movement_rules = { 
-                None : [WALL, GHOST_DOOR, GHOST_HOUSE],
-                SCATTER : [WALL, GHOST_DOOR, GHOST_HOUSE],
-                CHASE : [WALL, GHOST_DOOR, GHOST_HOUSE],
-                FRIGHTENED : [WALL, GHOST_DOOR, GHOST_HOUSE],
-                EATEN : [WALL],
-                LEAVE_GHOST_HOUSE : [WALL]
-            }
-
-            current_phase = self.phase
-            tile_type = self.tile.neighbors[direction].type
-            if tile_type in movement_rules[current_phase]:
-                return False
-            return True
+        tile = self.tile
+        return tile.maze.passable_masks[self.phase][tile.index] & DIRECTION_BITS[direction] != 0
         
     def determine_next_tile(self, direction):
         ''' Determines the next tile for the entity to move to '''
@@ -0,0 +1,222 @@
+import multiprocessing, random, time
+from collections import Counter, OrderedDict
+from typing import List, Tuple
+from neat_utils import genome_hash
+
+# Returned for keys that are not cached, so a cached None still counts as cached
+MISSING = object()
+
+def report_tick_rate(ticks: int, elapsed_time: float):
+    '''Prints how many simulated ticks were run per wall-clock second'''
+    ticks_per_second = ticks / elapsed_time if elapsed_time > 0 else float('inf')
+    print(f'Simulated {ticks} ticks in {elapsed_time:.2f}s ({ticks_per_second:.0f} ticks/s)')
+
+def report_startup_time(elapsed_time: float):
+    '''Prints how long the process took from starting to its first simulated tick'''
+    print(f'Simulated the first tick {elapsed_time * 1000:.0f}ms after starting')
+
+def report_terminations(reasons, num_agents: int):
+    '''Prints how many of the agents the termination rules stopped and why'''
+    if reasons:
+        stopped = ', '.join(f'{count} by {reason}' for reason, count in reasons.most_common())
+        print(f'Stopped {sum(reasons.values())} of {num_agents} agents early: {stopped}')
+
+def report_scenarios(scenario_fitnesses: dict):
+    '''Prints the mean and best fitness of the population in every scenario'''
+    for name, fitnesses in scenario_fitnesses.items():
+        if fitnesses:
+            values = list(fitnesses.values())
+            print(f'Scenario {name}: mean fitness {sum(values) / len(values):.1f}, best {max(values)}')
+
+def split_genomes(genomes: List[Tuple[int, object]], num_chunks: int) -> List[List[Tuple[int, object]]]:
+    '''
+    Splits the genomes into at most num_chunks contiguous chunks of near equal size
+
+    Args:
+        genomes (List[Tuple[int, object]]): The (genome_id, genome) pairs to split
+        num_chunks (int): The number of chunks to split the genomes into
+    '''
+    num_chunks = max(1, min(num_chunks, len(genomes)))
+    chunk_size, remainder = divmod(len(genomes), num_chunks)
+    chunks, start = [], 0
+    for chunk_index in range(num_chunks):
+        end = start + chunk_size + (1 if chunk_index < remainder else 0)
+        chunks.append(genomes[start:end])
+        start = end
+    return chunks
+
+class FitnessCache(object):
+    '''
+    Least recently used cache of fitnesses keyed by the genome's network, the settings of the
+    simulation and the episode seed.
+
+    With a fixed timestep an episode is fully determined by its seed and settings, and an
+    agent's fitness does not depend on the other agents it is simulated with, so elites
+    carried over with a fixed seed and structurally identical offspring do not need to be
+    simulated again.
+    '''
+    def __init__(self, max_size: int = 10000, settings: tuple = ()):
+        """
+        Initialize a FitnessCache object.
+
+        Args:
+            max_size (int, optional): The number of fitnesses to keep. Defaults to 10000.
+            settings (tuple, optional): Everything besides the seed that changes an episode, like the backend,
+                the feature set and the timestep. Part of every key. Defaults to ().
+        """
+        self.max_size = max_size
+        self.settings = settings
+        self.fitnesses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        '''Returns the cached fitness for the key, default if it is not cached'''
+        fitness = self.fitnesses.get(key, MISSING)
+        if fitness is MISSING:
+            return default
+        self.fitnesses.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness) -> None:
+        '''Caches the fitness, evicting the least recently used fitness when the cache is full'''
+        self.fitnesses[key] = fitness
+        self.fitnesses.move_to_end(key)
+        while len(self.fitnesses) > self.max_size:
+            self.fitnesses.popitem(last=False)
+
+    def find_pending(self, genomes, seed) -> tuple:
+        '''
+        Returns the cache key of every genome keyed by genome id, the genomes to simulate, one per
+        network that is not cached yet, and the cached fitnesses, both keyed by cache key
+
+        Args:
+            genomes (List[Tuple[int, object]]): The (genome_id, genome) pairs to evaluate
+            seed: The seed of the episode, or anything else that determines it
+        '''
+        keys, pending, cached = {}, OrderedDict(), {}
+        for genome_id, genome in genomes:
+            key = keys[genome_id] = (genome_hash(genome), self.settings, seed)
+            if key in pending or key in cached:
+                continue
+            fitness = self.get(key, MISSING)
+            if fitness is MISSING:
+                pending[key] = (genome_id, genome)
+            else:
+                cached[key] = fitness
+        return keys, pending, cached
+
+    def store(self, keys: dict, pending: OrderedDict, cached: dict, simulated_fitnesses: dict) -> dict:
+        '''Caches the fitnesses of the simulated genomes and returns the fitness of every genome keyed by genome id'''
+        # Read back from the lookup and the simulation, a cache smaller than a generation evicts while storing
+        fitnesses = dict(cached)
+        for key, (genome_id, genome) in pending.items():
+            fitnesses[key] = simulated_fitnesses[genome_id]
+            self.put(key, fitnesses[key])
+        self.misses += len(pending)
+        self.hits += len(keys) - len(pending)
+        return {genome_id: fitnesses[key] for genome_id, key in keys.items()}
+
+    def evaluate(self, genomes, seed: int, simulate_function):
+        '''
+        Returns the fitness of every genome keyed by genome id and the number of simulated ticks,
+        simulating one genome per network that is not cached yet
+
+        Args:
+            genomes (List[Tuple[int, object]]): The (genome_id, genome) pairs to evaluate
+            seed (int): The seed of the episode
+            simulate_function: Called as simulate_function(genomes) with the genomes to simulate. Returns
+                the fitnesses keyed by genome id and the number of simulated ticks
+        '''
+        keys, pending, cached = self.find_pending(genomes, seed)
+        simulated_fitnesses, ticks = {}, 0
+        if pending:
+            simulated_fitnesses, ticks = simulate_function(list(pending.values()))
+        print(f'Fitness cache: reused {len(genomes) - len(pending)} of {len(genomes)} genomes')
+        return self.store(keys, pending, cached, simulated_fitnesses), ticks
+
+class ParallelEvaluator(object):
+    '''
+    Evaluates a population across worker processes. Every worker simulates its own
+    headless game for a chunk of the genomes and the fitnesses are written back here.
+    '''
+    def __init__(self, num_workers: int, eval_function, timeout: float = None, seed: int = None,
+                 fitness_cache: FitnessCache = None, suite=None):
+        """
+        Initialize a ParallelEvaluator object.
+
+        Args:
+            num_workers (int): The number of worker processes
+            eval_function: Called as eval_function(genomes, config, seed, scenario=scenario) inside a worker.
+                Returns the fitnesses keyed by genome id, the number of simulated ticks and a (reasons, agents)
+                pair counting the agents its termination policy stopped, reported here once per generation
+            timeout (float, optional): Seconds to wait for a chunk. Defaults to waiting forever.
+            seed (int, optional): Seed of every episode. Defaults to a new seed every generation.
+            fitness_cache (FitnessCache, optional): Skips the genomes whose fitness is cached. Defaults to None.
+            suite (ScenarioSuite, optional): Evaluates every genome on every scenario of the suite. Defaults to
+                None, which plays a single episode.
+        """
+        self.num_workers = num_workers
+        self.eval_function = eval_function
+        self.timeout = timeout
+        self.seed = seed
+        self.fitness_cache = fitness_cache
+        self.suite = suite
+        # The termination counts the workers returned this generation
+        self.stopped = Counter()
+        self.num_agents = 0
+        self.pool = multiprocessing.Pool(num_workers)
+
+    def submit(self, genomes, config, seed: int, scenario=None, num_chunks: int = None) -> list:
+        '''Queues the genomes in chunks for the workers and returns the pending jobs'''
+        return [self.pool.apply_async(self.eval_function, (chunk, config, seed), {'scenario': scenario})
+                for chunk in split_genomes(genomes, num_chunks or self.num_workers)]
+
+    def collect(self, jobs) -> tuple:
+        '''Waits for the jobs of one episode and returns their fitnesses and the number of simulated ticks'''
+        fitnesses, ticks = {}, 0
+        for job in jobs:
+            chunk_fitnesses, chunk_ticks, (chunk_stopped, chunk_agents) = job.get(timeout=self.timeout)
+            fitnesses.update(chunk_fitnesses)
+            self.stopped.update(chunk_stopped)
+            self.num_agents += chunk_agents
+            ticks = max(ticks, chunk_ticks)
+        return fitnesses, ticks
+
+    def simulate(self, genomes, config, seed: int):
+        '''Simulates the genomes across the workers and returns their fitnesses and the number of simulated ticks'''
+        return self.collect(self.submit(genomes, config, seed))
+
+    def simulate_scenarios(self, runs, config, seed: int) -> list:
+        '''
+        Simulates every (scenario, genomes) run at once and returns a (fitnesses, ticks) pair per run. Each
+        scenario is split into fewer chunks the more scenarios there are, so the workers stay busy while
+        every chunk still simulates enough agents to be worth sending
+        '''
+        num_chunks = -(-self.num_workers // max(1, len(runs)))
+        jobs = [self.submit(genomes, config, scenario.episode_seed(seed), scenario, num_chunks) for scenario, genomes in runs]
+        return [self.collect(scenario_jobs) for scenario_jobs in jobs]
+
+    def evaluate(self, genomes, config):
+        '''Evaluates the genomes and sets their fitness'''
+        # Every chunk plays the same episode, so the fitnesses do not depend on the number of workers
+        seed = self.seed if self.seed is not None else random.randrange(2 ** 32)
+        start_time = time.perf_counter()
+        self.stopped, self.num_agents = Counter(), 0
+        if self.suite is not None:
+            fitnesses, ticks = self.suite.evaluate(genomes, seed, lambda runs: self.simulate_scenarios(runs, config, seed),
+                                                   self.fitness_cache)
+        elif self.fitness_cache is None:
+            fitnesses, ticks = self.simulate(genomes, config, seed)
+        else:
+            fitnesses, ticks = self.fitness_cache.evaluate(genomes, seed, lambda pending: self.simulate(pending, config, seed))
+        report_tick_rate(ticks, time.perf_counter() - start_time)
+        report_terminations(self.stopped, self.num_agents)
+
+        for genome_id, genome in genomes:
+            genome.fitness = fitnesses[genome_id]
+
+    def close(self):
+        '''Shuts the worker processes down'''
+        self.pool.close()
+        self.pool.join()
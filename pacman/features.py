@@ -0,0 +1,263 @@
+import numpy as np
+from constants import *
+from rays import WINDOW_SIZE
+
+# Codes of the directions and phases in the observation
+OBSERVATION_CODES = {
+    UP: 0, DOWN: 1, LEFT: 2, RIGHT: 3, SCATTER: 4,
+    CHASE: 5, FRIGHTENED: 6, EATEN: 7, LEAVE_GHOST_HOUSE: 8,
+    EMPTY: 9, WALL: 10, GHOST_DOOR: 11, GHOST_HOUSE: 12,
+    None: 13
+}
+# The batch simulation stores directions and phases as indexes into DIRECTIONS and GHOST_PHASES
+NO_DIRECTION_CODE = OBSERVATION_CODES[None]
+PHASE_CODE_OFFSET = OBSERVATION_CODES[GHOST_PHASES[0]]
+GHOST_VALUES = 5
+
+# Every registered feature by name
+FEATURES = {}
+
+class Feature(object):
+    '''
+    A named group of observation values with an extractor for each backend.
+
+    extract(controller, agent, values) writes the values of one agent of a GameController and
+    extract_batch(simulation, phase, values) writes a (agents, size) view for a BatchSimulation.
+    Both write into the view they are given instead of returning new lists or arrays.
+    '''
+    def __init__(self, name: str, size: int, extract, extract_batch=None):
+        """
+        Initialize a Feature object.
+
+        Args:
+            name (str): The name of the feature
+            size (int): The number of values the feature writes
+            extract: Writes the feature of one agent of a GameController
+            extract_batch (optional): Writes the feature of every agent of a BatchSimulation. Defaults to None.
+        """
+        self.name = name
+        self.size = size
+        self.extract = extract
+        self.extract_batch = extract_batch
+
+def feature(name: str, size: int):
+    '''Registers the decorated function as the GameController extractor of a feature'''
+    def register(extract):
+        FEATURES[name] = Feature(name, size, extract)
+        return extract
+    return register
+
+def batch_feature(name: str):
+    '''Registers the decorated function as the BatchSimulation extractor of a registered feature'''
+    def register(extract_batch):
+        FEATURES[name].extract_batch = extract_batch
+        return extract_batch
+    return register
+
+class FeatureSet(object):
+    '''
+    The features an agent observes, laid out one after another. The offsets are derived
+    from the feature sizes, so a feature is added by registering it and naming it here.
+    '''
+    def __init__(self, names):
+        """
+        Initialize a FeatureSet object.
+
+        Args:
+            names (List[str]): The names of the registered features, in observation order
+        """
+        self.features = [FEATURES[name] for name in names]
+        self.slices = []
+        offset = 0
+        for registered_feature in self.features:
+            self.slices.append(slice(offset, offset + registered_feature.size))
+            offset += registered_feature.size
+        self.size = offset
+
+    def layout(self) -> list:
+        '''Returns the name and the slice of the observation of every feature'''
+        return [(registered_feature.name, values) for registered_feature, values in zip(self.features, self.slices)]
+
+    def allocate(self, num_agents: int) -> np.ndarray:
+        '''Returns an observation buffer for the given number of agents'''
+        return np.zeros((num_agents, self.size), dtype=np.float32)
+
+    def observe(self, controller, agent, observation: np.ndarray) -> np.ndarray:
+        '''Writes the observation of one agent of a GameController into the buffer row'''
+        for registered_feature, values in zip(self.features, self.slices):
+            registered_feature.extract(controller, agent, observation[values])
+        return observation
+
+    def observe_batch(self, simulation, phase: str, observations: np.ndarray) -> np.ndarray:
+        '''Writes the observations of every agent of a BatchSimulation into the buffer'''
+        for registered_feature, values in zip(self.features, self.slices):
+            registered_feature.extract_batch(simulation, phase, observations[:, values])
+        return observations
+
+def configure_inputs(genome_config, feature_set: FeatureSet) -> None:
+    '''Derives the number of network inputs and their keys from the feature set'''
+    genome_config.num_inputs = feature_set.size
+    genome_config.input_keys = [-index - 1 for index in range(feature_set.size)]
+
+def check_inputs(genome_config, feature_set: FeatureSet) -> None:
+    '''Raises a ValueError when networks built with the config cannot take the feature set'''
+    if genome_config.num_inputs != feature_set.size:
+        names = ', '.join(name for name, values in feature_set.layout())
+        raise ValueError(f'The networks take {genome_config.num_inputs} inputs, '
+                         f'but the features ({names}) produce {feature_set.size}')
+
+@feature('game_phase', 1)
+def game_phase(controller, agent, values):
+    values[0] = OBSERVATION_CODES[controller.phase]
+
+@batch_feature('game_phase')
+def game_phase_batch(simulation, phase, values):
+    values[:, 0] = OBSERVATION_CODES[phase]
+
+@feature('agent_position', 2)
+def agent_position(controller, agent, values):
+    values[0] = int(agent.position.x)
+    values[1] = int(agent.position.y)
+
+@batch_feature('agent_position')
+def agent_position_batch(simulation, phase, values):
+    np.trunc(simulation.agent_position, out=values, casting='unsafe')
+
+@feature('agent_direction', 1)
+def agent_direction(controller, agent, values):
+    values[0] = OBSERVATION_CODES[agent.current_direction]
+
+@batch_feature('agent_direction')
+def agent_direction_batch(simulation, phase, values):
+    values[:, 0] = simulation.agent_direction
+    values[simulation.agent_direction < 0, 0] = NO_DIRECTION_CODE
+
+@feature('idle_timer', 1)
+def idle_timer(controller, agent, values):
+    values[0] = int(agent.idle_timer)
+
+@batch_feature('idle_timer')
+def idle_timer_batch(simulation, phase, values):
+    np.trunc(simulation.idle_timer, out=values[:, 0], casting='unsafe')
+
+@feature('score', 1)
+def score(controller, agent, values):
+    values[0] = agent.score
+
+@batch_feature('score')
+def score_batch(simulation, phase, values):
+    values[:, 0] = simulation.score
+
+@feature('lives', 1)
+def lives(controller, agent, values):
+    values[0] = agent.lives
+
+@batch_feature('lives')
+def lives_batch(simulation, phase, values):
+    values[:, 0] = simulation.lives
+
+@feature('legal_moves', len(DIRECTIONS))
+def legal_moves(controller, agent, values):
+    # Legal moves come from the compiled maze, directions off the edge are never legal
+    legal_moves = agent.tile.maze.passable_masks[agent.phase][agent.tile.index]
+    for index in range(len(DIRECTIONS)):
+        values[index] = (legal_moves >> index) & 1
+
+@batch_feature('legal_moves')
+def legal_moves_batch(simulation, phase, values):
+    values[:] = simulation.agent_passable[simulation.agent_tile]
+
+@feature('ghosts', GHOST_VALUES * NUM_GHOSTS)
+def ghosts(controller, agent, values):
+    # Position, walking distance from the agent in pixels, direction and phase of every ghost
+    maze_distances = controller.tiles.maze.distances
+    for offset, ghost in zip(range(0, len(values), GHOST_VALUES), controller.agent_ghost_pairs[agent].values()):
+        values[offset] = int(ghost.position.x)
+        values[offset + 1] = int(ghost.position.y)
+        values[offset + 2] = int(maze_distances.distance(agent.tile.index, ghost.tile.index) * TILE_WIDTH)
+        values[offset + 3] = OBSERVATION_CODES[ghost.current_direction]
+        values[offset + 4] = OBSERVATION_CODES[ghost.phase]
+
+@batch_feature('ghosts')
+def ghosts_batch(simulation, phase, values):
+    ghost_values = values.reshape(len(values), NUM_GHOSTS, GHOST_VALUES)
+    np.trunc(simulation.ghost_position, out=ghost_values[:, :, 0:2], casting='unsafe')
+    # Walking distance from the agent's tile, measured with the agent's movement rules
+    distances = simulation.distances.distances(simulation.agent_tile[:, None], simulation.ghost_tile, 0)
+    np.trunc(distances * TILE_WIDTH, out=ghost_values[:, :, 2], casting='unsafe')
+    ghost_values[:, :, 3] = simulation.ghost_direction
+    ghost_values[simulation.ghost_direction < 0, 3] = NO_DIRECTION_CODE
+    ghost_values[:, :, 4] = PHASE_CODE_OFFSET + simulation.ghost_phase
+
+@feature('corridors', len(DIRECTIONS))
+def corridors(controller, agent, values):
+    # How many tiles the agent walks in every direction before it reaches the next junction, corner
+    # or dead end, 0 where the way is blocked
+    values[:] = controller.tiles.maze.junctions[None].corridor_lengths[agent.tile.index]
+
+@batch_feature('corridors')
+def corridors_batch(simulation, phase, values):
+    values[:] = simulation.maze.junctions[None].corridor_lengths[simulation.agent_tile]
+
+def remaining_pellets(controller, agent) -> np.ndarray:
+    '''Returns whether each tile still holds a pellet or power pellet for the agent'''
+    return controller.tiles.maze.pellet_tiles & (np.frombuffer(agent.collected_tiles, dtype=np.uint8) == 0)
+
+@feature('wall_rays', len(DIRECTIONS))
+def wall_rays(controller, agent, values):
+    # How many tiles the agent can move in every direction before it hits a wall
+    values[:] = controller.tiles.maze.rays.wall_distances[agent.tile.index]
+
+@batch_feature('wall_rays')
+def wall_rays_batch(simulation, phase, values):
+    values[:] = simulation.rays.wall_distances[simulation.agent_tile]
+
+@feature('pellet_rays', len(DIRECTIONS))
+def pellet_rays(controller, agent, values):
+    # How many tiles away the nearest pellet in sight is in every direction, 0 when there is none
+    rays, tile = controller.tiles.maze.rays, agent.tile.index
+    values[:] = rays.first_hits(tile, remaining_pellets(controller, agent)[rays.ray_tiles[tile]])
+
+@batch_feature('pellet_rays')
+def pellet_rays_batch(simulation, phase, values):
+    rays, tiles = simulation.rays, simulation.agent_tile
+    agents = np.arange(simulation.num_agents)[:, None, None]
+    values[:] = rays.first_hits(tiles, simulation.pellets[agents, rays.ray_tiles[tiles]])
+
+@feature('ghost_rays', len(DIRECTIONS))
+def ghost_rays(controller, agent, values):
+    # How many tiles away the nearest ghost in sight is in every direction, 0 when there is none
+    ghost_tiles = np.array([[ghost.tile.index for ghost in controller.agent_ghost_pairs[agent].values()]])
+    values[:] = controller.tiles.maze.rays.nearest_on_rays(np.array([agent.tile.index]), ghost_tiles)[0]
+
+@batch_feature('ghost_rays')
+def ghost_rays_batch(simulation, phase, values):
+    values[:] = simulation.rays.nearest_on_rays(simulation.agent_tile, simulation.ghost_tile)
+
+@feature('window', WINDOW_SIZE)
+def window(controller, agent, values):
+    # Blocked, free, pellet and power pellet codes of the tiles around the agent, row by row
+    rays, tile = controller.tiles.maze.rays, agent.tile.index
+    window_tiles = rays.window_tiles[tile]
+    values[:] = rays.window_codes[tile] + rays.item_codes[window_tiles] * remaining_pellets(controller, agent)[window_tiles]
+
+@batch_feature('window')
+def window_batch(simulation, phase, values):
+    rays, tiles = simulation.rays, simulation.agent_tile
+    window_tiles = rays.window_tiles[tiles]
+    agents = np.arange(simulation.num_agents)[:, None]
+    values[:] = rays.window_codes[tiles] + rays.item_codes[window_tiles] * simulation.pellets[agents, window_tiles]
+
+# The observation the networks in config.txt were trained on
+DEFAULT_FEATURES = FeatureSet(['game_phase', 'agent_position', 'agent_direction', 'idle_timer', 'score', 'lives',
+                               'legal_moves', 'ghosts'])
+# Opt-in observations with more inputs, selected with --features. They need their own population
+# since the networks take a different number of inputs
+FEATURE_SETS = {
+    'default' : DEFAULT_FEATURES,
+    'rays' : FeatureSet([name for name, values in DEFAULT_FEATURES.layout()]
+                        + ['wall_rays', 'pellet_rays', 'ghost_rays']),
+    'rays_window' : FeatureSet([name for name, values in DEFAULT_FEATURES.layout()]
+                               + ['wall_rays', 'pellet_rays', 'ghost_rays', 'window']),
+    'junctions' : FeatureSet([name for name, values in DEFAULT_FEATURES.layout()] + ['corridors']),
+}
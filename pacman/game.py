@@ -1,10 +1,20 @@
-import pygame, sys, random
+import pygame, sys, random, struct
 from constants import *
 from tiles import TileCollection
 from pacman import Pacman
 from ghost import Blinky, Pinky, Inky, Clyde
 from items import *
 from text import Score
+from collisions import CollisionSystem
+from rendering import MazeLayers, DirtyRectScreen
+from maze import PHASES
+from game_state import (GAME_STATE, pack_header, unpack_header, phase_code, tile_at, pack_random, unpack_random,
+                        pack_flags, unpack_flags, pack_power_pellets, unpack_power_pellets)
+
+# The special items in the order they are spawned
+SPECIAL_ITEMS = (Cherry, Strawberry, Orange, Apple, Pretzel, GalaxianFlagship, Bell, Key)
+# Phase, phase timer, phase interval, whether a special item waits to be collected and how many were spawned
+GAME_CONTROLLER_STATE = struct.Struct('<bdi?B')
 
 class GameController(object):
     '''
@@ -13,6 +23,7 @@ class GameController(object):
     def __init__(self):
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.display = DirtyRectScreen(self.screen)
         self.clock = pygame.time.Clock()
         self.max_phase_intervals = {
             'scatter' : (7, 10),
@@ -30,12 +41,18 @@ class GameController(object):
         self.phase = SCATTER
         self.phase_timer, self.phase_interval = 0, random.randint(*self.max_phase_intervals[self.phase])
         self.tiles = TileCollection()
-        self.special_items = [Cherry, Strawberry, Orange, Apple, Pretzel, GalaxianFlagship, Bell, Key]
-        self.pacman = Pacman(self.tiles.get_tile(14, 26))
-        self.blinky = Blinky(self.tiles.get_tile(16, 16))
-        self.pinky = Pinky(self.tiles.get_tile(11, 16))
-        self.inky = Inky(self.tiles.get_tile(16, 18))
-        self.clyde = Clyde(self.tiles.get_tile(11, 18))
+        self.maze_layers = MazeLayers(self.tiles, self.background)
+        self.display.invalidate()
+        self.collisions = CollisionSystem()
+        self.special_items = list(SPECIAL_ITEMS)
+        # The tile, the special item and the item it replaced of every spawned special item
+        self.spawned_items = []
+        blinky_spawn, pinky_spawn, inky_spawn, clyde_spawn = self.tiles.ghost_spawns
+        self.pacman = Pacman(self.tiles.pacman_spawn)
+        self.blinky = Blinky(blinky_spawn)
+        self.pinky = Pinky(pinky_spawn)
+        self.inky = Inky(inky_spawn)
+        self.clyde = Clyde(clyde_spawn)
         self.ghosts = [self.blinky, self.pinky, self.inky, self.clyde]
         self.score = Score((SCREEN_WIDTH // 2, 25))
 
@@ -45,7 +62,7 @@ class GameController(object):
         self.pacman.update(delta_time)
         for ghost in self.ghosts:
             ghost.update(delta_time, self.pacman, self.tiles.look_up_table)
-        self.check_collisions()
+        self.check_collisions(delta_time)
         self.score.update(self.pacman.score)
         self.update_game_phase(delta_time)
         self.update_ghosts_phase(delta_time)
@@ -57,19 +74,79 @@ class GameController(object):
 
     def spawn_special_item(self):
         '''Selects a random tile and spawns an item on it'''
-        if len(self.pacman.collected_items) % 38 == 0 and self.tiles.unique_item is None:
+        if self.pacman.num_collected_items % 38 == 0 and self.tiles.unique_item is None:
             if len(self.special_items) == 0:
                 return
             empty_tiles = []
             for tile in self.tiles.look_up_table.values():
-                if tile.type == PATH and tile.item in self.pacman.collected_items:
+                if tile.type == PATH and self.pacman.collected_tiles[tile.index]:
                     empty_tiles.append(tile)
             if empty_tiles:
-                random_tile = random.choice(empty_tiles)
-                item = self.special_items.pop(0)(random_tile.position.as_tuple())
-                self.tiles.unique_item = item
-                self.tiles.items.append(item)
-                random_tile.item = item
+                self.place_special_item(random.choice(empty_tiles))
+
+    def place_special_item(self, tile):
+        '''Places the next special item on the tile'''
+        item = self.special_items.pop(0)(tile.position.as_tuple())
+        self.spawned_items.append((tile, item, tile.item))
+        self.tiles.unique_item = item
+        self.tiles.items.append(item)
+        tile.item = item
+
+    def save_state(self) -> bytes:
+        '''Returns a snapshot of the game that restore_state resumes from'''
+        collected_tiles = bytearray(NUM_TILES)
+        for tile in self.tiles.look_up_table.values():
+            if tile.item is not None and tile.item.collected:
+                collected_tiles[tile.index] = 1
+        spawned_tiles = [tile.index for tile, item, replaced_item in self.spawned_items]
+        return b''.join([
+            pack_header(GAME_STATE, 1),
+            GAME_CONTROLLER_STATE.pack(phase_code(self.phase), self.phase_timer, self.phase_interval,
+                                       self.tiles.unique_item is not None, len(spawned_tiles)),
+            struct.pack(f'<{len(spawned_tiles)}h', *spawned_tiles),
+            pack_flags(collected_tiles),
+            pack_power_pellets(self.tiles.power_pellets),
+            self.pacman.pack_state(),
+            *(ghost.pack_state() for ghost in self.ghosts),
+            pack_random(random),
+        ])
+
+    def restore_state(self, buffer) -> None:
+        '''
+        Resumes the game from a snapshot taken by save_state
+
+        Raises:
+            ValueError: If the snapshot was not taken of a single player game
+        '''
+        offset = unpack_header(buffer, GAME_STATE, 1)
+        phase, self.phase_timer, self.phase_interval, has_unique_item, num_spawned = \
+            GAME_CONTROLLER_STATE.unpack_from(buffer, offset)
+        self.phase = PHASES[phase]
+        offset += GAME_CONTROLLER_STATE.size
+        spawned_tiles = struct.unpack_from(f'<{num_spawned}h', buffer, offset)
+        offset += struct.calcsize(f'<{num_spawned}h')
+
+        # Takes back every spawned special item and spawns the ones of the snapshot again
+        for tile, item, replaced_item in reversed(self.spawned_items):
+            tile.item = replaced_item
+            self.tiles.items.remove(item)
+        self.special_items, self.spawned_items = list(SPECIAL_ITEMS), []
+        for index in spawned_tiles:
+            self.place_special_item(tile_at(self.tiles, index))
+        self.tiles.unique_item = self.spawned_items[-1][1] if has_unique_item else None
+
+        collected_tiles, offset = unpack_flags(buffer, offset)
+        for tile in self.tiles.look_up_table.values():
+            if tile.item is not None:
+                tile.item.collected = bool(collected_tiles[tile.index])
+                tile.item.is_visible = not tile.item.collected
+        offset = unpack_power_pellets(self.tiles.power_pellets, buffer, offset)
+        offset = self.pacman.unpack_state(buffer, offset, self.tiles)
+        self.pacman.special_items = [item for tile, item, replaced_item in self.spawned_items if item.collected]
+        for ghost in self.ghosts:
+            offset = ghost.unpack_state(buffer, offset, self.tiles)
+        unpack_random(random, buffer, offset)
+        self.score.update(self.pacman.score)
              
     def check_events(self):
         '''Checks for events'''
@@ -78,45 +155,62 @@ class GameController(object):
                 pygame.quit()
                 sys.exit()
     
-    def check_collisions(self):
+    def check_collisions(self, delta_time: float):
         '''Checks for collisions'''
-        pacman = self.pacman 
-        for item in self.tiles.items:
-            distance_to_pacman = item.position.distance(pacman.position)
-            
-            if distance_to_pacman <= item.collision_radius and not item.collected:
-                item.collected = True
-                item.is_visible = False
-                pacman.score += item.POINTS
-                
-                if item.name in ['pellet', 'power_pellet']:
-                    pacman.collected_items.append(item)
-                    if item.name == 'power_pellet':
-                        for ghost in self.ghosts:
-                            if ghost.phase not in [EATEN, LEAVE_GHOST_HOUSE]:
-                                ghost.phase = FRIGHTENED
-                                ghost.speed = 50
-                                ghost.elapsed_time = 0
-
-                elif item.name in ['cherry', 'strawberry', 'orange', 'apple', 'pretzel', 'galaxian_flagship', 'bell', 'key']:
-                    pacman.special_items.append(item)
-                    self.tiles.unique_item = None
+        # Ghosts are resolved first, so a deadly ghost ends the checks, and again
+        # after a power pellet so pacman eats the ghosts it is touching
+        if self.check_ghost_collisions(delta_time):
+            return
+        if self.collect_items():
+            self.check_ghost_collisions(delta_time)
 
-        for ghost in self.ghosts:
-            if ghost.position.distance(self.pacman.position) <= ghost.collision_radius:
-                if ghost.phase == FRIGHTENED:
-                    ghost.phase = EATEN
-                    ghost.speed = 150
-                    ghost.elapsed_time = 0
-                    pacman.score += 200
-                elif ghost.phase == CHASE or ghost.phase == SCATTER:
-                    self.pacman.lives -= 1
-                    self.pacman.reset_position()
+    def collect_items(self) -> bool:
+        '''Collects the items pacman touches and returns whether it ate a power pellet'''
+        pacman = self.pacman
+        ate_power_pellet = False
+        for tile in self.collisions.items_in_reach(pacman):
+            item = tile.item
+            if item.collected:
+                continue
+            item.collected = True
+            item.is_visible = False
+            pacman.score += item.points
+            
+            if item.name in ['pellet', 'power_pellet']:
+                pacman.collected_tiles[tile.index] = 1
+                pacman.num_collected_items += 1 + item.COVERED_PELLETS
+                if item.name == 'power_pellet':
+                    ate_power_pellet = True
                     for ghost in self.ghosts:
-                        ghost.reset()
-                        ghost.phase = LEAVE_GHOST_HOUSE
-                    self.phase_timer = 0
-                    self.phase_interval = random.randint(*self.max_phase_intervals[self.phase])        
+                        if ghost.phase not in [EATEN, LEAVE_GHOST_HOUSE]:
+                            ghost.phase = FRIGHTENED
+                            ghost.speed = 50
+                            ghost.elapsed_time = 0
+
+            elif item.name in ['cherry', 'strawberry', 'orange', 'apple', 'pretzel', 'galaxian_flagship', 'bell', 'key']:
+                pacman.special_items.append(item)
+                self.tiles.unique_item = None
+        return ate_power_pellet
+
+    def check_ghost_collisions(self, delta_time: float) -> bool:
+        '''Lets pacman eat the frightened ghosts it touched and returns whether it died'''
+        pacman = self.pacman
+        for ghost in self.collisions.ghosts_in_reach(pacman, self.ghosts, delta_time):
+            if ghost.phase == FRIGHTENED:
+                ghost.phase = EATEN
+                ghost.speed = 150
+                ghost.elapsed_time = 0
+                pacman.score += 200
+            elif ghost.phase == CHASE or ghost.phase == SCATTER:
+                pacman.lives -= 1
+                pacman.reset_position()
+                for ghost in self.ghosts:
+                    ghost.reset_position()
+                    ghost.phase = LEAVE_GHOST_HOUSE
+                self.phase_timer = 0
+                self.phase_interval = random.randint(*self.max_phase_intervals[self.phase])
+                return True
+        return False
 
     def switch_phase(self):
         '''Switches the phase'''
@@ -169,13 +263,13 @@ class GameController(object):
 
     def render(self):
         '''Renders the game'''
-        self.screen.blit(self.background, (0, 0))
-        self.tiles.render(self.screen)
-        self.pacman.render(self.screen)
-        self.score.render(self.screen)
+        changed_rects = self.maze_layers.update()
+        screen = self.display.begin_frame(self.maze_layers.item_layer, changed_rects)
+        blits = self.pacman.get_blits() + self.score.get_blits()
         for ghost in self.ghosts:
-            ghost.render(self.screen)
-        pygame.display.update()
+            blits.extend(ghost.get_blits())
+        screen.blits(blits)
+        self.display.present()
 
     def game_over(self):
         '''Ends the game'''
@@ -0,0 +1,111 @@
+'''
+Compact binary snapshots of a running game.
+
+Every controller and entity packs its own fields with the precompiled structs of this
+module and restores them in place, so a snapshot is a single bytes object that is cheap
+to take, to keep in memory and to write to disk. A snapshot is restored into a game that
+was started the same way, with the same maze and the same genomes.
+'''
+import struct
+import numpy as np
+from constants import *
+from maze import PHASES, PHASE_INDEX, DIRECTION_INDEX
+
+# Stored in every snapshot, so a snapshot of another layout or kind of game is never misread
+STATE_MAGIC = b'PMST'
+STATE_VERSION = 2
+OBJECTS_STATE, BATCH_STATE, GAME_STATE = range(3)
+# Magic, version, kind of game and the number of agents
+STATE_HEADER = struct.Struct('<4sBBI')
+
+# Tiles and directions are stored as indexes and -1 stands for None, indexing
+# CODED_DIRECTIONS with it picks the trailing None. Phases are indexes into PHASES
+NO_INDEX = -1
+CODED_DIRECTIONS = DIRECTIONS + (None,)
+
+# The 624 words of a Mersenne Twister and its position, whether a gauss draw is kept and the draw
+RANDOM_STATE = struct.Struct('<625I?d')
+# Timer and flashing of a power pellet
+POWER_PELLET_STATE = struct.Struct('<d?')
+
+def direction_code(direction) -> int:
+    '''Returns the stored index of a direction'''
+    return NO_INDEX if direction is None else DIRECTION_INDEX[direction]
+
+def phase_code(phase) -> int:
+    '''Returns the stored index of a phase'''
+    return PHASE_INDEX[phase]
+
+def tile_code(tile) -> int:
+    '''Returns the stored index of a tile'''
+    return NO_INDEX if tile is None else tile.index
+
+def tile_at(tiles, index: int):
+    '''Returns the tile of the collection at the stored index'''
+    return None if index == NO_INDEX else tiles.get_tile(index % NUM_COLS, index // NUM_COLS)
+
+def pack_header(kind: int, num_agents: int) -> bytes:
+    '''Returns the header that starts a snapshot'''
+    return STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, kind, num_agents)
+
+def unpack_header(buffer, kind: int, num_agents: int) -> int:
+    '''
+    Checks the header of a snapshot and returns the offset of the data after it
+
+    Raises:
+        ValueError: If the snapshot was not taken of this kind of game with this many agents
+    '''
+    magic, version, stored_kind, stored_agents = STATE_HEADER.unpack_from(buffer, 0)
+    if magic != STATE_MAGIC or version != STATE_VERSION:
+        raise ValueError(f'Not a game snapshot of version {STATE_VERSION}')
+    if stored_kind != kind or stored_agents != num_agents:
+        raise ValueError(f'Snapshot of {stored_agents} agents of kind {stored_kind} cannot be restored '
+                         f'into {num_agents} agents of kind {kind}')
+    return STATE_HEADER.size
+
+def pack_random(rng) -> bytes:
+    '''Returns the packed state of a random.Random or the random module'''
+    version, words, gauss_next = rng.getstate()
+    return RANDOM_STATE.pack(*words, gauss_next is not None, gauss_next or 0.0)
+
+def unpack_random(rng, buffer, offset: int) -> int:
+    '''Restores the state of a random.Random or the random module and returns the offset after it'''
+    values = RANDOM_STATE.unpack_from(buffer, offset)
+    rng.setstate((3, values[:625], values[626] if values[625] else None))
+    return offset + RANDOM_STATE.size
+
+def queue_codes(queue) -> tuple:
+    '''Returns the length of a directions queue and its two direction slots'''
+    directions = [direction_code(direction) for direction in queue.queue] + [NO_INDEX, NO_INDEX]
+    return (queue.size(), directions[0], directions[1])
+
+def restore_queue(queue, length: int, first: int, second: int) -> None:
+    '''Refills a directions queue from its length and two direction slots'''
+    queue.clear()
+    for code in (first, second)[:length]:
+        queue.enqueue(CODED_DIRECTIONS[code])
+
+def pack_flags(flags) -> bytes:
+    '''Returns the flags of every tile, a bytearray or bool array of NUM_TILES, packed into bits'''
+    return np.packbits(np.frombuffer(flags, dtype=np.uint8) if isinstance(flags, bytearray) else flags).tobytes()
+
+def unpack_flags(buffer, offset: int, count: int = NUM_TILES) -> tuple:
+    '''Returns the flags packed by pack_flags as a bool array and the offset after them'''
+    size = (count + 7) // 8
+    packed = np.frombuffer(buffer, dtype=np.uint8, count=size, offset=offset)
+    return np.unpackbits(packed, count=count).view(bool), offset + size
+
+def pack_power_pellets(power_pellets) -> bytes:
+    '''Returns the packed flashing state of the power pellets'''
+    return b''.join(POWER_PELLET_STATE.pack(power_pellet.flash_timer, power_pellet.flashing)
+                    for power_pellet in power_pellets)
+
+def unpack_power_pellets(power_pellets, buffer, offset: int) -> int:
+    '''Restores the flashing state of the power pellets and returns the offset after them'''
+    for power_pellet in power_pellets:
+        flash_timer, flashing = POWER_PELLET_STATE.unpack_from(buffer, offset)
+        offset += POWER_PELLET_STATE.size
+        power_pellet.flash_timer = flash_timer
+        if power_pellet.flashing != flashing:
+            power_pellet.set_flashing(flashing)
+    return offset
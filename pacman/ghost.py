@@ -1,25 +1,59 @@
-import pygame, os, random
+import os, random, struct
 from constants import *
 from vector import Vector2D
-from entity import Entity
-from sprites import SpriteSheet
+from entity import Entity, ENTITY_STATE, ENTITY_VALUES
+from maze import DIRECTION_BITS
+from assets import asset_cache, GENERAL_SPRITES, SPRITE_SIZE, SPRITE_OFFSET
+from game_state import tile_code, tile_at
 
 
 SCALE_FACTOR = 2
+# The two animation frames of a ghost in each direction and phase
+DIRECTION_SPRITE_KEYS = {
+    UP: ('up_1', 'up_2'),
+    DOWN: ('down_1', 'down_2'),
+    LEFT: ('left_1', 'left_2'),
+    RIGHT: ('right_1', 'right_2'),
+}
+PHASE_SPRITE_KEYS = {
+    FRIGHTENED: ('frightened_1', 'frightened_2'),
+    EATEN: ('eaten_1', 'eaten_2'),
+}
+# The entity state and the target tile, the random stream is packed by whoever owns it
+GHOST_STATE = struct.Struct(ENTITY_STATE.format + 'h')
 
 class Ghost(Entity):
     '''
     Class representing a ghost
     '''
-    def __init__(self, tile):
+    STATE = GHOST_STATE
+
+    def __init__(self, tile, rng: random.Random = None):
         super().__init__(tile)
+        # Source of randomness for frightened targets, seeded per episode during training
+        self.random = rng if rng is not None else random
         self.target = None
         self.set_speed(75)
         self.elapsed_time = 0
         self.phase = LEAVE_GHOST_HOUSE
-        self.load_sprites()
+        # Sprites are loaded on the first draw, so nothing is loaded when nothing is drawn
+        self.sprites = None
         self.collision_radius = 8
 
+    def reset(self):
+        '''Resets the ghost to its initial state, so it can play another game'''
+        self.reset_position()
+        self.phase = LEAVE_GHOST_HOUSE
+        self.set_speed(75)
+        self.target = None
+        self.timer, self.animation_timer = 0, 0
+        self.sprite_toggle = False
+        self.is_visible = True
+
+    def reset_position(self):
+        '''Puts the ghost back on its starting tile'''
+        super().reset()
+
     def set_phase(self, phase: int):
         '''
         Sets the phase of the ghost
@@ -29,35 +63,65 @@ class Ghost(Entity):
         '''
         self.phase = phase
 
+    def state_values(self) -> tuple:
+        '''Returns the values of GHOST_STATE'''
+        return super().state_values() + (tile_code(self.target),)
+
+    def restore_state_values(self, values: tuple, tiles) -> None:
+        '''Restores the values returned by state_values'''
+        super().restore_state_values(values, tiles)
+        self.target = tile_at(tiles, values[ENTITY_VALUES])
+
     def load_sprites(self):
         '''Loads the sprites for the ghost'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprites = {}
         self.sprites['frightened_1'] = sprite_sheet.get_image(1, 86, 16, 16)
         self.sprites['frightened_2'] = sprite_sheet.get_image(18, 86, 16, 16)
         self.sprites['eaten_1'] = sprite_sheet.get_image(35, 86, 16, 16)
         self.sprites['eaten_2'] = sprite_sheet.get_image(52, 86, 16, 16)    
+        self.add_sprites()
+        self.scale_sprites()
+
+    def add_sprites(self):
+        '''Adds the sprites of the specific ghost'''
+        pass
+
+    def scale_sprites(self):
+        '''Scales the sprites to the drawn size once, after the ghost added its own sprites'''
+        self.scaled_sprites = {key: asset_cache.transformed(sprite, size=SPRITE_SIZE) for key, sprite in self.sprites.items()}
 
     def determine_next_direction(self):
         '''Determines the next direction to move in'''
-        possible_directions = []
-        for direction in self.directions:
-                if direction != Entity.opposite_direction(self.current_direction):
-                    if self.can_move_in_direction(direction):
-                        possible_directions.append(direction)
-                    
+        tile = self.tile
+        legal_moves = tile.maze.passable_masks[self.phase][tile.index]
+        if self.current_direction is not None:
+            legal_moves &= ~DIRECTION_BITS[Entity.opposite_direction(self.current_direction)]
+        possible_directions = [direction for direction in DIRECTIONS if legal_moves & DIRECTION_BITS[direction]]
+
         if len(possible_directions) == 1:
             return possible_directions[0]
     
+        # The ghost has a real choice here, and the same arrival towards the same target always picks the same exit
+        junctions = tile.maze.junctions[self.phase]
+        target_index = self.target.index
+        next_direction = junctions.memoized_choice(tile.index, self.current_direction, target_index)
+        if next_direction is not None:
+            return next_direction
+
+        # Ghosts follow the maze towards their target instead of the straight line
+        maze_distances = tile.maze.distances
         distances = {}
         for direction in possible_directions:
-            neighbor = self.tile.neighbors[direction]
-            distances[direction] = self.target.position.distance(neighbor.position)
+            neighbor = tile.neighbors[direction]
+            distances[direction] = maze_distances.distance(neighbor.index, target_index, self.phase)
         next_direction = min(distances, key=distances.get)
+        junctions.memoize_choice(tile.index, self.current_direction, target_index, next_direction)
         return next_direction
     
     def move(self, delta_time: float):
-        self.position += self.directions[self.current_direction] * self.speed * delta_time
+        self.previous_position.update(self.position)
+        self.position.add_scaled(self.directions[self.current_direction], self.speed * delta_time)
         if self.has_reached_next_tile():
             self.check_for_portal()
             self.tile = self.next_tile
@@ -74,43 +138,33 @@ class Ghost(Entity):
 
     def render(self, screen):
         '''Renders the ghost'''
-        sprite_key = None
+        screen.blits(self.get_blits())
 
+    def get_blits(self) -> list:
+        '''Returns the (sprite, position) pairs that draw the ghost, to be drawn with Surface.blits'''
+        if self.sprites is None:
+            self.load_sprites()
         if self.phase in [LEAVE_GHOST_HOUSE, CHASE, SCATTER]:
-            direction_sprites = {
-                UP: ['up_1', 'up_2'],
-                DOWN: ['down_1', 'down_2'],
-                LEFT: ['left_1', 'left_2'],
-                RIGHT: ['right_1', 'right_2'],
-            }
-            sprite_key = direction_sprites.get(self.current_direction)
-
-        elif self.phase == FRIGHTENED:
-            sprite_key = ['frightened_1', 'frightened_2']
-        elif self.phase == EATEN:
-            sprite_key = ['eaten_1', 'eaten_2']
-
-        if sprite_key:
-            # position = self.position - Vector2D(8, 8)
-            position = self.position - Vector2D(4, 4)
-            if self.sprite_toggle:
-                sprite = self.sprites[sprite_key[0]]
-                sprite = pygame.transform.scale(sprite, (24, 24))
-                screen.blit(sprite, position.as_tuple())
-            else:
-                sprite = self.sprites[sprite_key[1]]
-                sprite = pygame.transform.scale(sprite, (24, 24))
-                screen.blit(sprite, position.as_tuple())
+            sprite_keys = DIRECTION_SPRITE_KEYS.get(self.current_direction)
+        else:
+            sprite_keys = PHASE_SPRITE_KEYS.get(self.phase)
+        if not sprite_keys:
+            return []
+        sprite = self.scaled_sprites[sprite_keys[0] if self.sprite_toggle else sprite_keys[1]]
+        return [(sprite, (self.position.x - SPRITE_OFFSET, self.position.y - SPRITE_OFFSET))]
 
 class Blinky(Ghost):
     '''Class representing Blinky'''
-    def __init__(self, tile):
-        super().__init__(tile)
-        self.add_sprites()
+    SCATTER_TARGET = (27, 0)
+    EATEN_TARGET = (16, 16)
+    LEAVE_GHOST_HOUSE_TARGET = (15, 10)
+
+    def __init__(self, tile, rng: random.Random = None):
+        super().__init__(tile, rng)
 
     def add_sprites(self):
         '''Adds the sprites for Blinky'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         directions = ['right', 'down', 'left', 'up']
         x, y = 1, 1
         for direction in directions:
@@ -121,15 +175,15 @@ class Blinky(Ghost):
     def find_target(self, pacman, look_up_table):
         '''Finds the target tile for Blinky'''
         if self.phase == SCATTER: 
-            self.target = look_up_table[(27, 0)]
+            self.target = look_up_table[self.SCATTER_TARGET]
         elif self.phase == CHASE:
             self.target = pacman.tile 
         elif self.phase == FRIGHTENED:
-            self.target = random.choice(list(look_up_table.values()))
+            self.target = self.random.choice(list(look_up_table.values()))
         elif self.phase == EATEN:
-            self.target = look_up_table[(16, 16)]
+            self.target = look_up_table[self.EATEN_TARGET]
         elif self.phase == LEAVE_GHOST_HOUSE:
-            self.target = look_up_table[(15, 10)]
+            self.target = look_up_table[self.LEAVE_GHOST_HOUSE_TARGET]
 
     def update(self, delta_time: float, pacman, look_up_table: dict):
         self.find_target(pacman, look_up_table)
@@ -137,13 +191,16 @@ class Blinky(Ghost):
     
 class Pinky(Ghost):
     '''Class representing Pinky'''
-    def __init__(self, tile):
-        super().__init__(tile)
-        self.add_sprites()
+    SCATTER_TARGET = (0, 0)
+    EATEN_TARGET = (11, 16)
+    LEAVE_GHOST_HOUSE_TARGET = (13, 10)
+
+    def __init__(self, tile, rng: random.Random = None):
+        super().__init__(tile, rng)
 
     def add_sprites(self):
         '''Adds the sprites for Pinky'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         directions = ['right', 'down', 'left', 'up']
         x, y = 1, 18
         for direction in directions:
@@ -154,15 +211,15 @@ class Pinky(Ghost):
     def find_target(self, pacman, look_up_table):
         '''Finds the target tile for Pinky'''
         if self.phase == SCATTER: 
-            self.target = look_up_table[(0, 0)]
+            self.target = look_up_table[self.SCATTER_TARGET]
         elif self.phase == CHASE:
             self.target = pacman.tile
         elif self.phase == FRIGHTENED:
-            self.target = random.choice(list(look_up_table.values()))
+            self.target = self.random.choice(list(look_up_table.values()))
         elif self.phase == EATEN:
-            self.target = look_up_table[(11, 16)]
+            self.target = look_up_table[self.EATEN_TARGET]
         elif self.phase == LEAVE_GHOST_HOUSE:
-            self.target = look_up_table[(13, 10)]
+            self.target = look_up_table[self.LEAVE_GHOST_HOUSE_TARGET]
 
     def update(self, delta_time: float, pacman, look_up_table: dict):
         self.find_target(pacman, look_up_table)
@@ -170,13 +227,16 @@ class Pinky(Ghost):
     
 class Inky(Ghost):
     '''Class representing Inky'''
-    def __init__(self, tile):
-        super().__init__(tile)
-        self.add_sprites()
+    SCATTER_TARGET = (27, 35)
+    EATEN_TARGET = (11, 18)
+    LEAVE_GHOST_HOUSE_TARGET = (17, 10)
+
+    def __init__(self, tile, rng: random.Random = None):
+        super().__init__(tile, rng)
 
     def add_sprites(self):
         '''Adds the sprites for Inky'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         directions = ['right', 'down', 'left', 'up']
         x, y = 1, 35
         for direction in directions:
@@ -187,15 +247,15 @@ class Inky(Ghost):
     def find_target(self, pacman, look_up_table):
         '''Finds the target tile for Inky'''
         if self.phase == SCATTER: 
-            self.target = look_up_table[(27, 35)]
+            self.target = look_up_table[self.SCATTER_TARGET]
         elif self.phase == CHASE:
             self.target = pacman.tile
         elif self.phase == FRIGHTENED:
-            self.target = random.choice(list(look_up_table.values()))
+            self.target = self.random.choice(list(look_up_table.values()))
         elif self.phase == EATEN:
-            self.target = look_up_table[(11, 18)]
+            self.target = look_up_table[self.EATEN_TARGET]
         elif self.phase == LEAVE_GHOST_HOUSE:
-            self.target = look_up_table[(17, 10)]
+            self.target = look_up_table[self.LEAVE_GHOST_HOUSE_TARGET]
 
     def update(self, delta_time: float, pacman, look_up_table: dict):
         self.find_target(pacman, look_up_table)
@@ -203,13 +263,16 @@ class Inky(Ghost):
     
 class Clyde(Ghost):
     '''Class representing Clyde'''
-    def __init__(self, tile):
-        super().__init__(tile)
-        self.add_sprites()
+    SCATTER_TARGET = (0, 35)
+    EATEN_TARGET = (16, 18)
+    LEAVE_GHOST_HOUSE_TARGET = (10, 10)
+
+    def __init__(self, tile, rng: random.Random = None):
+        super().__init__(tile, rng)
 
     def add_sprites(self):
         '''Adds the sprites for Clyde'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         directions = ['right', 'down', 'left', 'up']
         x, y = 1, 52
         for direction in directions:
@@ -220,15 +283,15 @@ class Clyde(Ghost):
     def find_target(self, pacman, look_up_table):
         '''Finds the target tile for Clyde'''
         if self.phase == SCATTER: 
-            self.target = look_up_table[(0, 35)]
+            self.target = look_up_table[self.SCATTER_TARGET]
         elif self.phase == CHASE:
             self.target = pacman.tile
         elif self.phase == FRIGHTENED:
-            self.target = random.choice(list(look_up_table.values()))
+            self.target = self.random.choice(list(look_up_table.values()))
         elif self.phase == EATEN:
-            self.target = look_up_table[(16, 18)]
+            self.target = look_up_table[self.EATEN_TARGET]
         elif self.phase == LEAVE_GHOST_HOUSE:
-            self.target = look_up_table[(10, 10)]
+            self.target = look_up_table[self.LEAVE_GHOST_HOUSE_TARGET]
 
     def update(self, delta_time: float, pacman, look_up_table: dict):
         self.find_target(pacman, look_up_table)
@@ -0,0 +1,232 @@
+import numpy as np
+from neat import activations, aggregations
+
+def clamp(z: np.ndarray, low: float, high: float) -> np.ndarray:
+    '''Clamps the values like max(low, min(high, z)) does for a single value'''
+    return np.minimum(np.maximum(z, low), high)
+
+# Vectorized versions of neat-python's activation functions, with the same scaling and clamping.
+# Functions missing here, like user-defined ones, are applied value by value
+NUMPY_ACTIVATIONS = {
+    activations.sigmoid_activation : lambda z: 1.0 / (1.0 + np.exp(-clamp(5.0 * z, -60.0, 60.0))),
+    activations.tanh_activation : lambda z: np.tanh(clamp(2.5 * z, -60.0, 60.0)),
+    activations.sin_activation : lambda z: np.sin(clamp(5.0 * z, -60.0, 60.0)),
+    activations.gauss_activation : lambda z: np.exp(-5.0 * clamp(z, -3.4, 3.4) ** 2),
+    activations.relu_activation : lambda z: np.where(z > 0.0, z, 0.0),
+    activations.softplus_activation : lambda z: 0.2 * np.log(1 + np.exp(clamp(5.0 * z, -60.0, 60.0))),
+    activations.identity_activation : lambda z: z,
+    activations.clamped_activation : lambda z: clamp(z, -1.0, 1.0),
+    activations.exp_activation : lambda z: np.exp(clamp(z, -60.0, 60.0)),
+    activations.abs_activation : np.abs,
+    activations.hat_activation : lambda z: np.maximum(0.0, 1 - np.abs(z)),
+    activations.square_activation : lambda z: z ** 2,
+    activations.cube_activation : lambda z: z ** 3,
+}
+
+def aggregate(function, contributions: np.ndarray, destinations: np.ndarray, num_nodes: int) -> np.ndarray:
+    '''
+    Aggregates the weighted inputs of several nodes at once
+
+    Args:
+        function: The neat-python aggregation function of the nodes
+        contributions (np.ndarray): The value times the weight of every link
+        destinations (np.ndarray): The index of the node every link goes into
+        num_nodes (int): The number of nodes
+    '''
+    if function is aggregations.sum_aggregation:
+        # bincount adds the links in order, exactly like sum() does
+        return np.bincount(destinations, weights=contributions, minlength=num_nodes)
+    if function is aggregations.mean_aggregation:
+        return (np.bincount(destinations, weights=contributions, minlength=num_nodes)
+                / np.bincount(destinations, minlength=num_nodes))
+    if function is aggregations.max_aggregation:
+        aggregated = np.full(num_nodes, -np.inf)
+        np.maximum.at(aggregated, destinations, contributions)
+        return aggregated
+    if function is aggregations.min_aggregation:
+        aggregated = np.full(num_nodes, np.inf)
+        np.minimum.at(aggregated, destinations, contributions)
+        return aggregated
+    if function is aggregations.product_aggregation:
+        aggregated = np.ones(num_nodes)
+        np.multiply.at(aggregated, destinations, contributions)
+        return aggregated
+    node_inputs = [[] for _ in range(num_nodes)]
+    for destination, contribution in zip(destinations.tolist(), contributions.tolist()):
+        node_inputs[destination].append(contribution)
+    return np.array([function(inputs) for inputs in node_inputs], dtype=np.float64)
+
+class NetworkLayer(object):
+    '''The nodes of every network that only depend on the inputs and on earlier layers'''
+    def __init__(self, nodes):
+        """
+        Initialize a NetworkLayer object.
+
+        Args:
+            nodes: (slot, activation, aggregation, bias, response, links) for every node, where
+                links is a list of (source slot, weight) pairs
+        """
+        self.slots = np.array([node[0] for node in nodes], dtype=np.int64)
+        self.biases = np.array([node[3] for node in nodes], dtype=np.float64)
+        self.responses = np.array([node[4] for node in nodes], dtype=np.float64)
+
+        sources, weights, destinations = [], [], []
+        for node_index, node in enumerate(nodes):
+            for source, weight in node[5]:
+                sources.append(source)
+                weights.append(weight)
+                destinations.append(node_index)
+        self.sources = np.array(sources, dtype=np.int64)
+        self.weights = np.array(weights, dtype=np.float64)
+        self.destinations = np.array(destinations, dtype=np.int64)
+
+        # Nodes are grouped by function so every group is applied with one call
+        self.aggregation_groups = self.group(nodes, 2, with_links=True)
+        self.activation_groups = [(NUMPY_ACTIVATIONS.get(function, np.vectorize(function, otypes=[np.float64])), indexes)
+                                  for function, indexes in self.group(nodes, 1)]
+
+    def group(self, nodes, field: int, with_links: bool = False) -> list:
+        '''Returns the node indexes that share each function, None for a group with every node'''
+        functions = {}
+        for node_index, node in enumerate(nodes):
+            functions.setdefault(node[field], []).append(node_index)
+        if len(functions) == 1:
+            function = next(iter(functions))
+            return [(function, None, self.destinations, len(nodes))] if with_links else [(function, None)]
+
+        groups = []
+        for function, indexes in functions.items():
+            indexes = np.array(indexes, dtype=np.int64)
+            if not with_links:
+                groups.append((function, indexes))
+                continue
+            local_indexes = np.full(len(nodes), -1, dtype=np.int64)
+            local_indexes[indexes] = np.arange(len(indexes))
+            links = np.flatnonzero(local_indexes[self.destinations] >= 0)
+            groups.append((function, (indexes, links), local_indexes[self.destinations[links]], len(indexes)))
+        return groups
+
+    def evaluate(self, values: np.ndarray) -> None:
+        '''Evaluates the nodes of the layer and writes their values'''
+        contributions = values[self.sources] * self.weights
+        aggregated = np.empty(len(self.slots))
+        for function, selection, destinations, num_nodes in self.aggregation_groups:
+            if selection is None:
+                aggregated = aggregate(function, contributions, destinations, num_nodes)
+            else:
+                indexes, links = selection
+                aggregated[indexes] = aggregate(function, contributions[links], destinations, num_nodes)
+
+        pre_activations = self.biases + self.responses * aggregated
+        for function, indexes in self.activation_groups:
+            if indexes is None:
+                values[self.slots] = function(pre_activations)
+            else:
+                values[self.slots[indexes]] = function(pre_activations[indexes])
+
+class BatchNetwork(object):
+    '''
+    Evaluates the feed forward networks of a whole population with one call per tick.
+
+    The nodes of every network get a slot in one flat value array. Nodes are grouped into
+    layers by their depth across all networks, and every layer is evaluated with a gather,
+    a weighted bincount and one activation call per activation function. The results match
+    neat-python's FeedForwardNetwork.activate.
+    '''
+    def __init__(self, networks):
+        """
+        Initialize a BatchNetwork object.
+
+        Args:
+            networks (List[FeedForwardNetwork]): The networks of the population
+        """
+        self.networks = networks
+        self.num_inputs = len(networks[0].input_nodes) if networks else 0
+        self.num_outputs = len(networks[0].output_nodes) if networks else 0
+        self.compile(np.arange(len(networks)))
+
+    def compile(self, rows: np.ndarray) -> None:
+        '''Compiles the networks at the given rows, the other networks can no longer be activated'''
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.row_positions = np.full(len(self.networks), -1, dtype=np.int64)
+        self.row_positions[self.rows] = np.arange(len(self.rows))
+
+        num_networks = len(self.rows)
+        # Inputs of every network first, then their outputs, then the hidden nodes
+        input_block = num_networks * self.num_inputs
+        next_slot = input_block + num_networks * self.num_outputs
+        layers = []
+        for position, row in enumerate(self.rows.tolist()):
+            network = self.networks[row]
+            slots, depths = {}, {}
+            for index, key in enumerate(network.input_nodes):
+                slots[key], depths[key] = position * self.num_inputs + index, 0
+            for index, key in enumerate(network.output_nodes):
+                slots[key] = input_block + position * self.num_outputs + index
+            for node, activation, aggregation, bias, response, links in network.node_evals:
+                if node not in slots:
+                    slots[node], next_slot = next_slot, next_slot + 1
+                # node_evals are in evaluation order, so every source already has a depth
+                depth = depths[node] = 1 + max(depths[source] for source, weight in links)
+                while len(layers) < depth:
+                    layers.append([])
+                layers[depth - 1].append((slots[node], activation, aggregation, bias, response,
+                                          [(slots[source], weight) for source, weight in links]))
+        self.num_slots = next_slot
+        self.output_slots = slice(input_block, input_block + num_networks * self.num_outputs)
+        self.layers = [NetworkLayer(nodes) for nodes in layers]
+
+    def retain(self, rows: np.ndarray) -> None:
+        '''Recompiles only the given rows once half of the compiled networks are no longer needed'''
+        if len(rows) * 2 <= len(self.rows):
+            self.compile(rows)
+
+    def activate(self, inputs: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        '''
+        Returns the outputs of the networks at the given rows
+
+        Args:
+            inputs (np.ndarray): A (len(rows), num_inputs) array with the inputs of every network
+            rows (np.ndarray): The indexes of the networks to activate, they have to be compiled
+        '''
+        positions = self.row_positions[rows]
+        values = np.zeros(self.num_slots)
+        values[:len(self.rows) * self.num_inputs].reshape(len(self.rows), self.num_inputs)[positions] = inputs
+        for layer in self.layers:
+            layer.evaluate(values)
+        return values[self.output_slots].reshape(len(self.rows), self.num_outputs)[positions]
+
+class SingleNetwork(object):
+    '''
+    Evaluates the network of a population of one, like the genome --play replays, with the
+    straight-line function the compiler generates for it. Has the interface of BatchNetwork.
+    '''
+    def __init__(self, network):
+        """
+        Initialize a SingleNetwork object.
+
+        Args:
+            network (CompiledNetwork): The network of the only agent
+        """
+        self.network = network
+        self.num_outputs = len(network.output_nodes)
+        self.row_positions = np.zeros(1, dtype=np.int64)
+
+    def compile(self, rows: np.ndarray) -> None:
+        '''The network is always compiled'''
+        pass
+
+    def retain(self, rows: np.ndarray) -> None:
+        '''The network is always kept'''
+        pass
+
+    def activate(self, inputs: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        '''Returns the outputs of the network for every row of inputs, see BatchNetwork.activate'''
+        outputs = [self.network.activate(row) for row in inputs.tolist()]
+        return np.array(outputs, dtype=np.float64).reshape(len(outputs), self.num_outputs)
+
+def build_batch_network(networks):
+    '''Returns the evaluator of the networks, a SingleNetwork for a population of one'''
+    if len(networks) == 1:
+        return SingleNetwork(networks[0])
+    return BatchNetwork(networks)
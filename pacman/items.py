@@ -1,15 +1,16 @@
-import pygame, os
+import os
 from abc import ABC, abstractmethod
 from typing import List, Tuple
 from constants import *
 from vector import Vector2D
-from sprites import SpriteSheet
+from assets import asset_cache, GENERAL_SPRITES, TILE_SPRITES
 
 class Item(ABC):
     '''
     Parent class for all items 
     '''
-    num_items = 0
+    # The pellets placed under the item, collected and scored along with it
+    COVERED_PELLETS = 0
 
     def __init__(self, position: Tuple[float, float]):
         """
@@ -24,10 +25,26 @@ class Item(ABC):
 
         # visualization attributes
         self.is_visible = True
-        self.sprite = self.load_sprite()
+        # The sprite is loaded when it is first needed, so nothing is loaded when nothing is drawn
+        self._sprite = None
         self.collision_radius = TILE_WIDTH // 2
         self.collected = False
-        Item.num_items += 1
+
+    @property
+    def sprite(self):
+        '''The sprite of the item, loaded on first use'''
+        if self._sprite is None:
+            self.load_sprite()
+        return self._sprite
+
+    @sprite.setter
+    def sprite(self, sprite):
+        self._sprite = sprite
+
+    @property
+    def points(self) -> int:
+        '''The points of the item and of the pellets under it'''
+        return self.POINTS + self.COVERED_PELLETS * Pellet.POINTS
 
     def get_sprite(self):
         '''Returns the sprite of the item'''
@@ -35,14 +52,16 @@ class Item(ABC):
 
     @abstractmethod
     def load_sprite(self):
+        '''Loads the sprite of the item into self.sprite'''
         pass
 
     def reset(self):
         '''Resets the item to its initial state'''
-        self.position = self.starting_position.copy()
+        self.position.update(self.starting_position)
         self.collected = False
+        self.is_visible = True
 
-    def render(self, screen: pygame.Surface):
+    def render(self, screen: 'pygame.Surface'):
         '''Renders the item on the screen'''
         if self.is_visible:
             screen.blit(self.sprite, self.position.as_tuple())
@@ -59,19 +78,19 @@ class Pellet(Item):
         """
         super().__init__(position)
         self.name = 'pellet'
-        self.sprite = self.load_sprite()
 
     def load_sprite(self):
         '''Loads the pellet sprite'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-Tile-Sprites.png'))
-        sprite = sprite_sheet.get_image(234, 36, 16, 16)
-        return sprite
+        sprite_sheet = asset_cache.sprite_sheet(TILE_SPRITES)
+        self.sprite = sprite_sheet.get_image(234, 36, 16, 16)
 
 
 class PowerPellet(Item):
     '''Class representing a power pellet'''
 
     POINTS = 10
+    # Power pellets sit on top of a pellet, so eating one scores both
+    COVERED_PELLETS = 1
     def __init__(self, position: Tuple[float, float]):
         """
         Initialize a Pellet object.
@@ -84,25 +103,32 @@ class PowerPellet(Item):
         self.flash_interval = 0.25
         self.flash_timer = 0
         self.flashing = False
-        self.load_sprite()
 
     def load_sprite(self):
         '''Loads the pellet sprite'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-Tile-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(TILE_SPRITES)
         self.normal_sprite = sprite_sheet.get_image(252, 36, 16, 16)
         self.flashing_sprite = sprite_sheet.get_image(270, 36, 16, 16)
-        self.sprite = self.normal_sprite
+        self.sprite = self.flashing_sprite if self.flashing else self.normal_sprite
     
     def flash(self, delta_time: float):
         '''Flashes the power pellet'''
         self.flash_timer += delta_time
         if self.flash_timer >= self.flash_interval:
             self.flash_timer = 0
-            self.flashing = not self.flashing
-            if self.flashing:
-                self.sprite = self.flashing_sprite
-            else:
-                self.sprite = self.normal_sprite
+            self.set_flashing(not self.flashing)
+
+    def reset(self):
+        '''Resets the power pellet to its initial state'''
+        super().reset()
+        self.flash_timer = 0
+        self.set_flashing(False)
+
+    def set_flashing(self, flashing: bool):
+        '''Sets whether the power pellet shows its flashing sprite'''
+        self.flashing = flashing
+        if self._sprite is not None:
+            self.sprite = self.flashing_sprite if flashing else self.normal_sprite
 
 class Cherry(Item):
     '''Class representing a cherry'''
@@ -110,11 +136,10 @@ class Cherry(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'cherry'
-        self.load_sprite()
 
     def load_sprite(self):
         '''Loads the cherry sprite'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(1, 69, 16, 16)
     
 class Strawberry(Item):
@@ -123,11 +148,10 @@ class Strawberry(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'strawberry'
-        self.load_sprite()
 
     def load_sprite(self):
         '''Loads the strawberry sprite'''
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(18, 69, 16, 16)
         
 
@@ -137,10 +161,9 @@ class Orange(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'orange'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(35, 69, 16, 16)
 
 class Apple(Item):
@@ -149,10 +172,9 @@ class Apple(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'apple'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(52, 69, 16, 16)
 
 class Pretzel(Item):
@@ -161,10 +183,9 @@ class Pretzel(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'pretzel'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(69, 69, 16, 16)
 
 class GalaxianFlagship(Item):
@@ -173,10 +194,9 @@ class GalaxianFlagship(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'galaxian_flagship'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(86, 69, 16, 16)
 
 class Bell(Item):
@@ -185,10 +205,9 @@ class Bell(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'bell'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(103, 69, 16, 16)
 
 class Key(Item):
@@ -197,10 +216,9 @@ class Key(Item):
     def __init__(self, position: Tuple[float, float]):
         super().__init__(position)
         self.name = 'key'
-        self.load_sprite()
 
     def load_sprite(self):
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Pac-Man-General-Sprites.png'))
+        sprite_sheet = asset_cache.sprite_sheet(GENERAL_SPRITES)
         self.sprite = sprite_sheet.get_image(120, 69, 16, 16)
 
 
@@ -0,0 +1,96 @@
+import numpy as np
+from constants import *
+from maze import PHASES, MOVEMENT_RULES
+
+# Ghost choices are memoized per junction, incoming direction and target tile. Frightened ghosts
+# pick random targets, so the memo is cleared when it grows past this many entries
+MAX_MEMOIZED_CHOICES = 100000
+
+class JunctionGraph(object):
+    '''
+    Compressed form of a compiled maze for one phase, where only the tiles an entity
+    can make a choice on are kept as nodes and the corridors between them become edges.
+
+    Decision points are junctions, corners and dead ends, where an agent stops unless it
+    turns, so those are the tiles an agent has to act on. Every tile knows how long the
+    corridor in each direction runs before it reaches the next decision point, which is
+    what the corridors feature observes.
+    '''
+    def __init__(self, maze, phase=None):
+        """
+        Initialize a JunctionGraph object.
+
+        Args:
+            maze (CompiledMaze): The maze to compress
+            phase (str, optional): The phase whose movement rules apply, None for agents and pacman
+        """
+        self.phase = phase
+        self.num_tiles = maze.num_tiles
+        blocked = np.array([tile_type in MOVEMENT_RULES[phase] for tile_type in TILE_TYPES])
+        walkable = ~blocked[maze.tile_types]
+        passable = maze.passable[PHASES.index(phase)]
+        up, down, left, right = (passable[:, DIRECTIONS.index(direction)] for direction in DIRECTIONS)
+        exits = passable.sum(axis=1)
+        straight = (exits == 2) & ((up & down) | (left & right))
+        # Entities never stop on a portal, they are carried straight through to its destination
+        portals = maze.portal_destinations >= 0
+
+        self.is_decision_point = walkable & ~straight & ~portals
+
+        self.passable = passable.tolist()
+        self.neighbors = maze.neighbors.tolist()
+        self.portal_destinations = maze.portal_destinations.tolist()
+        self.decision_points = self.is_decision_point.tolist()
+        self.corridor_lengths = self.measure_corridors(np.flatnonzero(walkable).tolist())
+        self.memoized_choices = {}
+
+    def measure_corridors(self, tiles: list) -> np.ndarray:
+        '''
+        Returns a (tiles, directions) array with the number of tiles walked from every tile to the next
+        decision point in every direction, 0 where the way is blocked. Portals inside a corridor are free
+        to walk through, like in the distance tables
+        '''
+        corridor_lengths = np.zeros((self.num_tiles, len(DIRECTIONS)), dtype=np.int16)
+        for index in tiles:
+            for direction_index in range(len(DIRECTIONS)):
+                if self.passable[index][direction_index]:
+                    corridor_lengths[index, direction_index] = self.walk(index, direction_index)[1]
+        return corridor_lengths
+
+    def walk(self, start: int, direction_index: int):
+        '''
+        Follows a straight corridor from the start tile until the next decision point and
+        returns it together with the number of tiles walked
+
+        Args:
+            start (int): The index of the tile to start from
+            direction_index (int): The index in DIRECTIONS of the direction to walk in
+        '''
+        index, length = start, 0
+        while True:
+            index = self.neighbors[index][direction_index]
+            length += 1
+            if self.portal_destinations[index] >= 0:
+                index = self.portal_destinations[index]
+            if self.decision_points[index] or index == start:
+                return index, length
+
+    def memoized_choice(self, tile_index: int, direction, target_index: int):
+        '''Returns the direction chosen earlier on the junction for the same target, None if there is none'''
+        return self.memoized_choices.get((tile_index, direction, target_index))
+
+    def memoize_choice(self, tile_index: int, direction, target_index: int, choice) -> None:
+        '''Remembers the direction chosen on the junction when arriving in the given direction'''
+        if len(self.memoized_choices) >= MAX_MEMOIZED_CHOICES:
+            self.memoized_choices.clear()
+        self.memoized_choices[(tile_index, direction, target_index)] = choice
+
+def build_junction_graphs(maze) -> dict:
+    '''Returns a JunctionGraph for every phase, phases with the same movement rules share one'''
+    graphs, by_rules = {}, {}
+    for phase in PHASES:
+        rules = frozenset(MOVEMENT_RULES[phase])
+        if rules not in by_rules:
+            by_rules[rules] = JunctionGraph(maze, phase)
+        graphs[phase] = by_rules[rules]
+    return graphs
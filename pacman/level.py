@@ -0,0 +1,161 @@
+import os, hashlib
+import numpy as np
+from constants import *
+from assets import level_path
+from distances import CACHE_DIR
+
+# Bump when the layout of a compiled level changes, so stale cache files are ignored
+LEVEL_VERSION = 1
+NO_TILE = -1
+
+NO_ITEM, PELLET, POWER_PELLET = range(3)
+# The tile type and item of every symbol of a level file. Portals, where a portal symbol
+# stands for both ends of a tunnel, and spawns are paths and ghost house tiles as well
+LEVEL_SYMBOLS = {
+    '0' : (EMPTY, NO_ITEM),
+    '.' : (PATH, PELLET),
+    'X' : (WALL, NO_ITEM),
+    '=' : (GHOST_DOOR, NO_ITEM),
+    'H' : (GHOST_HOUSE, NO_ITEM),
+    'o' : (PATH, POWER_PELLET),
+    'T' : (PATH, PELLET),
+    'S' : (PATH, PELLET),
+    'b' : (GHOST_HOUSE, NO_ITEM),
+    'p' : (GHOST_HOUSE, NO_ITEM),
+    'i' : (GHOST_HOUSE, NO_ITEM),
+    'c' : (GHOST_HOUSE, NO_ITEM),
+}
+PORTAL_SYMBOL = 'T'
+PACMAN_SPAWN_SYMBOL = 'S'
+# Where Blinky, Pinky, Inky and Clyde start, in that order
+GHOST_SPAWN_SYMBOLS = 'bpic'
+
+# A compiled level is a single record, so it is saved as one .npy file and memory-mapped
+LEVEL_DTYPE = np.dtype([
+    ('source_hash', 'S16'),
+    ('tile_types', np.int8, NUM_TILES),
+    ('items', np.int8, NUM_TILES),
+    ('neighbors', np.int16, (NUM_TILES, len(DIRECTIONS))),
+    ('portal_destinations', np.int16, NUM_TILES),
+    ('pacman_spawn', np.int16),
+    ('ghost_spawns', np.int16, NUM_GHOSTS),
+])
+
+class Level(object):
+    '''
+    A level file compiled into flat arrays indexed by tile index.
+
+    Holds the tile types, the item placed on every tile, a (tiles, 4) neighbor table, the
+    portal destinations and the spawn tiles. The level file is parsed once, the result is
+    saved next to the package keyed by a hash of the file and memory-mapped afterwards, so
+    loading a level reads the file's hash and nothing else, and needs no pygame.
+    '''
+    _loaded = {}
+
+    def __init__(self, level_file: str = 'level_1.txt', cache_dir: str = CACHE_DIR):
+        """
+        Initialize a Level object.
+
+        Args:
+            level_file (str, optional): The level file in the levels directory. Defaults to 'level_1.txt'.
+            cache_dir (str, optional): Directory of the cache files. Defaults to CACHE_DIR.
+        """
+        self.level_file = level_file
+        self.source_hash = Level.hash_level_file(level_file)
+        path = os.path.join(cache_dir, f'level-{self.source_hash}-v{LEVEL_VERSION}.npy')
+        record = Level.load(path, level_file)[0]
+        self.tile_types = record['tile_types']
+        self.items = record['items']
+        self.neighbors = record['neighbors']
+        self.portal_destinations = record['portal_destinations']
+        self.pacman_spawn = int(record['pacman_spawn'])
+        self.ghost_spawns = record['ghost_spawns'].tolist()
+
+    @staticmethod
+    def hash_level_file(level_file: str) -> str:
+        '''Returns a short hash of the level file's contents, used to key cached level data'''
+        with open(level_path(level_file), 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()[:16]
+
+    @staticmethod
+    def load(path: str, level_file: str) -> np.ndarray:
+        '''Memory-maps the level compiled at the path, compiling and saving it first if needed'''
+        if path in Level._loaded:
+            return Level._loaded[path]
+        if not os.path.exists(path):
+            record = Level.compile(level_file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Several workers may build the cache at once, so write it under a unique name first
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.save(file, record)
+            os.replace(temporary_path, path)
+        record = Level._loaded[path] = np.load(path, mmap_mode='r')
+        return record
+
+    @staticmethod
+    def load_symbols(level_file: str) -> list:
+        '''Returns the rows of symbols of a level file'''
+        rows = []
+        with open(level_path(level_file)) as file:
+            for line in file:
+                line = line.split()
+                if line:
+                    rows.append(line)
+        return rows
+
+    @staticmethod
+    def compile(level_file: str) -> np.ndarray:
+        '''
+        Parses a level file into a compiled level record
+
+        Raises:
+            ValueError: If the level is not NUM_COLS by NUM_ROWS tiles, uses an unknown symbol,
+                has an unpaired portal or not exactly one spawn for pacman and every ghost
+        '''
+        rows = Level.load_symbols(level_file)
+        if len(rows) != NUM_ROWS or any(len(row) != NUM_COLS for row in rows):
+            raise ValueError(f'{level_file} is not {NUM_COLS} by {NUM_ROWS} tiles')
+        symbols = [symbol for row in rows for symbol in row]
+        unknown = set(symbols) - set(LEVEL_SYMBOLS)
+        if unknown:
+            raise ValueError(f'{level_file} uses unknown symbols {sorted(unknown)}')
+
+        record = np.zeros(1, dtype=LEVEL_DTYPE)
+        level = record[0]
+        level['source_hash'] = Level.hash_level_file(level_file).encode()
+        for index, symbol in enumerate(symbols):
+            tile_type, item = LEVEL_SYMBOLS[symbol]
+            level['tile_types'][index] = TILE_TYPES.index(tile_type)
+            level['items'][index] = item
+
+        columns, rows = np.meshgrid(np.arange(NUM_COLS), np.arange(NUM_ROWS))
+        columns, rows = columns.ravel(), rows.ravel()
+        indexes = np.arange(NUM_TILES)
+        level['neighbors'][:] = NO_TILE
+        level['neighbors'][:, 0] = np.where(rows > 0, indexes - NUM_COLS, NO_TILE)
+        level['neighbors'][:, 1] = np.where(rows < NUM_ROWS - 1, indexes + NUM_COLS, NO_TILE)
+        level['neighbors'][:, 2] = np.where(columns > 0, indexes - 1, NO_TILE)
+        level['neighbors'][:, 3] = np.where(columns < NUM_COLS - 1, indexes + 1, NO_TILE)
+
+        # Portals are paired in reading order, the first with the second and so on
+        level['portal_destinations'][:] = NO_TILE
+        portals = [index for index, symbol in enumerate(symbols) if symbol == PORTAL_SYMBOL]
+        if len(portals) % 2:
+            raise ValueError(f'{level_file} has a portal without a destination')
+        for start, end in zip(portals[::2], portals[1::2]):
+            level['portal_destinations'][start] = end
+            level['portal_destinations'][end] = start
+
+        level['pacman_spawn'] = Level.find_spawn(symbols, PACMAN_SPAWN_SYMBOL, level_file)
+        for ghost_index, symbol in enumerate(GHOST_SPAWN_SYMBOLS):
+            level['ghost_spawns'][ghost_index] = Level.find_spawn(symbols, symbol, level_file)
+        return record
+
+    @staticmethod
+    def find_spawn(symbols: list, spawn_symbol: str, level_file: str) -> int:
+        '''Returns the index of the only tile marked with the spawn symbol'''
+        spawns = [index for index, symbol in enumerate(symbols) if symbol == spawn_symbol]
+        if len(spawns) != 1:
+            raise ValueError(f'{level_file} needs exactly one {spawn_symbol!r} spawn, found {len(spawns)}')
+        return spawns[0]
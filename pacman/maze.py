@@ -0,0 +1,84 @@
+import numpy as np
+from constants import *
+
+# Phases are indexed with the agent's phase (None) first, followed by every ghost phase
+PHASES = (None,) + GHOST_PHASES
+PHASE_INDEX = {phase: index for index, phase in enumerate(PHASES)}
+DIRECTION_INDEX = {direction: index for index, direction in enumerate(DIRECTIONS)}
+DIRECTION_BITS = {direction: 1 << index for index, direction in enumerate(DIRECTIONS)}
+
+# Tile types each phase is not allowed to move onto, agents and pacman have no phase
+MOVEMENT_RULES = {
+    None : [WALL, GHOST_DOOR, GHOST_HOUSE],
+    SCATTER : [WALL, GHOST_DOOR, GHOST_HOUSE],
+    CHASE : [WALL, GHOST_DOOR, GHOST_HOUSE],
+    FRIGHTENED : [WALL, GHOST_DOOR, GHOST_HOUSE],
+    EATEN : [WALL],
+    LEAVE_GHOST_HOUSE : [WALL]
+}
+
+def tile_index(column_index: int, row_index: int) -> int:
+    '''Returns the row-major index of the tile at the given column and row index'''
+    return row_index * NUM_COLS + column_index
+
+class CompiledMaze(object):
+    '''
+    Flat, array based form of a TileCollection that is indexed by tile index.
+
+    Holds the tile types and positions, a (tiles, 4) neighbor table with -1 where there
+    is no neighbor, portal destinations, item points and, for every phase, a bitmask per
+    tile of the directions that can be taken from it. It holds no pygame objects, so it
+    can be pickled and shared by every agent and worker process.
+    '''
+    def __init__(self, tiles):
+        """
+        Initialize a CompiledMaze object.
+
+        Args:
+            tiles (TileCollection): The tiles to compile
+        """
+        self.num_tiles = NUM_TILES
+        self.tile_positions = np.zeros((NUM_TILES, 2), dtype=np.float64)
+        self.tile_types = np.zeros(NUM_TILES, dtype=np.int8)
+        self.neighbors = np.full((NUM_TILES, len(DIRECTIONS)), -1, dtype=np.int32)
+        self.portal_destinations = np.full(NUM_TILES, -1, dtype=np.int32)
+        self.item_points = np.zeros(NUM_TILES, dtype=np.int32)
+        self.power_pellet_tiles = np.zeros(NUM_TILES, dtype=bool)
+
+        for tile in tiles.look_up_table.values():
+            index = tile.index
+            self.tile_positions[index] = tile.position.as_tuple()
+            self.tile_types[index] = TILE_TYPES.index(tile.type)
+            for direction_index, direction in enumerate(DIRECTIONS):
+                if tile.neighbors[direction] is not None:
+                    self.neighbors[index, direction_index] = tile.neighbors[direction].index
+            if tile.is_portal:
+                self.portal_destinations[index] = tile.portal_destination.index
+            if tile.item is not None:
+                self.item_points[index] = tile.item.points
+                self.power_pellet_tiles[index] = tile.item.name == 'power_pellet'
+        self.pellet_tiles = self.item_points > 0
+
+        # passable[phase, tile, direction] and the same information packed into one bitmask per tile
+        self.passable = np.stack([self.compile_passable(phase) for phase in PHASES])
+        bits = np.array(list(DIRECTION_BITS.values()), dtype=np.uint8)
+        self.passable_bits = (self.passable * bits).sum(axis=2).astype(np.uint8)
+        # Plain lists are faster than NumPy scalars for the per-entity lookups in the object engine
+        self.passable_masks = {phase: self.passable_bits[index].tolist() for index, phase in enumerate(PHASES)}
+
+    def compile_passable(self, phase) -> np.ndarray:
+        '''Returns whether each tile can be left in each direction during the given phase'''
+        blocked = np.array([tile_type in MOVEMENT_RULES[phase] for tile_type in TILE_TYPES])
+        neighbor_types = self.tile_types[self.neighbors]
+        return (self.neighbors >= 0) & ~blocked[neighbor_types]
+
+    def can_move(self, index: int, phase, direction) -> bool:
+        '''
+        Returns whether the tile can be left in the given direction during the given phase
+
+        Args:
+            index (int): The index of the tile
+            phase (str): The phase of the entity, None for agents and pacman
+            direction (str): The direction to check
+        '''
+        return direction is not None and self.passable_masks[phase][index] & DIRECTION_BITS[direction] != 0
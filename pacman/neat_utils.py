@@ -1,15 +1,40 @@
-import os
+import os, hashlib
 
-def get_largest_checkpoint(directory):
-    checkpoint_files = [filename for filename in os.listdir(directory) if filename.startswith("neat-checkpoint-")]
-    if not checkpoint_files:
+CHECKPOINT_PREFIX = 'neat-checkpoint-'
+# Holds the file name of the newest checkpoint of a directory, so resuming does not list the directory
+LATEST_CHECKPOINT = 'latest'
+
+def checkpoint_generation(filename: str) -> int:
+    '''Returns the generation of a checkpoint file name, None for any other file'''
+    if not filename.startswith(CHECKPOINT_PREFIX):
         return None
+    generation = filename[len(CHECKPOINT_PREFIX):]
+    return int(generation) if generation.isdigit() else None
 
-    # Extract the numbers from checkpoint filenames and find the largest one
-    checkpoint_numbers = [int(filename.split("-")[-1]) for filename in checkpoint_files]
-    largest_number = max(checkpoint_numbers)
+def get_largest_checkpoint(directory):
+    '''Returns the path of the newest checkpoint in the directory, None if there is none'''
+    try:
+        with open(os.path.join(directory, LATEST_CHECKPOINT)) as file:
+            latest_checkpoint_file = file.read().strip()
+    except FileNotFoundError:
+        latest_checkpoint_file = None
+    if latest_checkpoint_file and os.path.exists(os.path.join(directory, latest_checkpoint_file)):
+        return os.path.join(directory, latest_checkpoint_file)
 
-    # Construct the filename of the largest checkpoint file
-    largest_checkpoint_file = f"neat-checkpoint-{largest_number}"
+    # Directories written before the latest file was kept are listed instead
+    if not os.path.isdir(directory):
+        return None
+    generations = [checkpoint_generation(filename) for filename in os.listdir(directory)]
+    generations = [generation for generation in generations if generation is not None]
+    if not generations:
+        return None
+    return os.path.join(directory, f'{CHECKPOINT_PREFIX}{max(generations)}')
 
-    return os.path.join(directory, largest_checkpoint_file)
\ No newline at end of file
+def genome_hash(genome) -> str:
+    '''Returns a hash of the network the genome expresses, equal for structurally identical genomes'''
+    nodes = sorted((key, node.bias, node.response, node.activation, node.aggregation)
+                   for key, node in genome.nodes.items())
+    # Disabled connections do not take part in the network, so they do not change its fitness
+    connections = sorted((key, connection.weight) for key, connection in genome.connections.items()
+                         if connection.enabled)
+    return hashlib.sha1(repr((nodes, connections)).encode()).hexdigest()
@@ -0,0 +1,109 @@
+import numpy as np
+from constants import *
+
+# Number of tiles the local window reaches from the agent in every direction
+WINDOW_RADIUS = 2
+WINDOW_SIZE = (2 * WINDOW_RADIUS + 1) ** 2
+# Codes of the tiles in the local window observation
+BLOCKED_CODE = -1
+FREE_CODE = 0
+PELLET_CODE = 1
+POWER_PELLET_CODE = 2
+
+class RayTables(object):
+    '''
+    Per-tile tables for looking around an agent without walking the maze.
+
+    For every tile and direction the tables hold how many tiles an agent can move in a
+    straight line before it hits a wall, the tiles along that ray (following portals) and
+    the tiles of a square window centred on the tile. Encoders gather from these tables for
+    every agent at once.
+    '''
+    def __init__(self, maze, window_radius: int = WINDOW_RADIUS):
+        """
+        Initialize a RayTables object.
+
+        Args:
+            maze (CompiledMaze): The maze to build the tables for
+            window_radius (int, optional): Number of tiles the window reaches from its centre. Defaults to WINDOW_RADIUS.
+        """
+        passable = maze.passable[0].tolist()
+        neighbors = maze.neighbors.tolist()
+        portals = maze.portal_destinations.tolist()
+        max_length = max(NUM_COLS, NUM_ROWS)
+
+        ray_tiles = np.full((maze.num_tiles, len(DIRECTIONS), max_length), -1, dtype=np.int64)
+        self.wall_distances = np.zeros((maze.num_tiles, len(DIRECTIONS)), dtype=np.int64)
+        for tile in range(maze.num_tiles):
+            for direction_index in range(len(DIRECTIONS)):
+                index, length = tile, 0
+                while length < max_length and passable[index][direction_index]:
+                    index = neighbors[index][direction_index]
+                    if portals[index] >= 0:
+                        index = portals[index]
+                    ray_tiles[tile, direction_index, length] = index
+                    length += 1
+                self.wall_distances[tile, direction_index] = length
+        # The longest ray decides how many tiles every ray is padded to
+        self.ray_length = max(1, int(self.wall_distances.max()))
+        self.ray_mask = ray_tiles[:, :, :self.ray_length] >= 0
+        self.ray_tiles = np.maximum(ray_tiles[:, :, :self.ray_length], 0)
+
+        # For every pair of tiles, how far along which ray of the first tile the second one lies.
+        # Steps of 0 mean the second tile cannot be seen in a straight line
+        self.ray_steps = np.zeros((maze.num_tiles, maze.num_tiles), dtype=np.int8)
+        self.ray_directions = np.zeros((maze.num_tiles, maze.num_tiles), dtype=np.int8)
+        for steps in range(self.ray_length):
+            for direction_index in range(len(DIRECTIONS)):
+                origins = np.flatnonzero(self.ray_mask[:, direction_index, steps])
+                targets = self.ray_tiles[origins, direction_index, steps]
+                unseen = self.ray_steps[origins, targets] == 0
+                self.ray_steps[origins[unseen], targets[unseen]] = steps + 1
+                self.ray_directions[origins[unseen], targets[unseen]] = direction_index
+
+        self.window_radius = window_radius
+        self.window_size = (2 * window_radius + 1) ** 2
+        columns, rows = np.arange(maze.num_tiles) % NUM_COLS, np.arange(maze.num_tiles) // NUM_COLS
+        offsets = np.arange(-window_radius, window_radius + 1)
+        window_columns = (columns[:, None, None] + offsets[None, None, :]).repeat(len(offsets), axis=1)
+        window_rows = (rows[:, None, None] + offsets[None, :, None]).repeat(len(offsets), axis=2)
+        inside = (window_columns >= 0) & (window_columns < NUM_COLS) & (window_rows >= 0) & (window_rows < NUM_ROWS)
+        window_tiles = np.where(inside, window_rows * NUM_COLS + window_columns, 0).reshape(maze.num_tiles, -1)
+
+        # Only path tiles can be walked on, the empty tiles around the maze count as blocked too
+        walkable = maze.tile_types == TILE_TYPES.index(PATH)
+        self.window_tiles = window_tiles
+        self.window_codes = np.where(inside.reshape(maze.num_tiles, -1) & walkable[window_tiles],
+                                     FREE_CODE, BLOCKED_CODE).astype(np.float32)
+        self.item_codes = np.where(maze.power_pellet_tiles, POWER_PELLET_CODE,
+                                   np.where(maze.pellet_tiles, PELLET_CODE, FREE_CODE)).astype(np.float32)
+
+    def first_hits(self, tiles: np.ndarray, hits: np.ndarray) -> np.ndarray:
+        '''
+        Returns how many tiles along each ray the first hit is, 0 where a ray hits nothing
+
+        Args:
+            tiles (np.ndarray): The tiles the rays start from
+            hits (np.ndarray): Whether each tile along the rays of the tiles is a hit, shaped like ray_tiles[tiles]
+        '''
+        hits = hits & self.ray_mask[tiles]
+        return np.where(hits.any(axis=-1), hits.argmax(axis=-1) + 1, 0)
+
+    def nearest_on_rays(self, tiles: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        '''
+        Returns how many tiles along each ray the nearest target is, 0 where a ray sees none
+
+        Args:
+            tiles (np.ndarray): The tile every agent looks from
+            targets (np.ndarray): A (agents, targets) array with the tiles to look for
+        '''
+        steps = self.ray_steps[tiles[:, None], targets]
+        directions = self.ray_directions[tiles[:, None], targets]
+        nearest = np.zeros((len(tiles), len(DIRECTIONS)), dtype=np.int64)
+        agents = np.arange(len(tiles))
+        for target in range(targets.shape[1]):
+            target_steps, target_directions = steps[:, target], directions[:, target]
+            current = nearest[agents, target_directions]
+            closer = (target_steps > 0) & ((current == 0) | (target_steps < current))
+            nearest[agents[closer], target_directions[closer]] = target_steps[closer]
+        return nearest
@@ -0,0 +1,133 @@
+import pygame
+from constants import *
+
+# Past this many rects a frame is cheaper to redraw whole than to patch rect by rect
+MAX_DIRTY_RECTS = 200
+
+class MazeLayers(object):
+    '''
+    The maze baked into a surface once, and a copy of it with the items drawn on top.
+
+    The item layer is patched tile by tile when an item disappears, reappears or changes
+    its sprite, so a frame starts from a ready surface instead of drawing every tile.
+    '''
+    def __init__(self, tiles, background: pygame.Surface):
+        """
+        Initialize a MazeLayers object.
+
+        Args:
+            tiles (TileCollection): The tiles to draw
+            background (pygame.Surface): The surface the maze is drawn on
+        """
+        self.tiles = tiles
+        tiles.load_sprites()
+        self.maze_layer = background.copy()
+        for tile in tiles.look_up_table.values():
+            position = tile.position.as_tuple()
+            pygame.draw.rect(self.maze_layer, tile.color, (*position, TILE_WIDTH, TILE_WIDTH))
+            if tile.sprite:
+                self.maze_layer.blit(tile.sprite, position)
+        self.item_layer = self.maze_layer.copy()
+        # The sprite and rect drawn on the item layer for every tile with an item
+        self.drawn_items = {}
+        self.item_tiles = []
+        self.num_items = None
+
+    def update(self, collected_tiles=None) -> list:
+        '''
+        Patches the item layer to show the visible items and returns the rects that changed
+
+        Args:
+            collected_tiles (optional): Whether the viewed agent collected the item of each tile, by
+                tile index. Defaults to None, which shows every visible item.
+        '''
+        if len(self.tiles.items) != self.num_items:
+            # Special items are placed on tiles during the game
+            self.item_tiles = [tile for tile in self.tiles.look_up_table.values() if tile.item]
+            self.num_items = len(self.tiles.items)
+
+        changed = []
+        for tile in self.item_tiles:
+            item = tile.item
+            sprite = None
+            if item is not None and item.is_visible and (collected_tiles is None or not collected_tiles[tile.index]):
+                sprite = item.sprite
+            drawn_sprite, drawn_rect = self.drawn_items.get(tile.index, (None, None))
+            if sprite is drawn_sprite:
+                continue
+            if drawn_rect is not None:
+                self.item_layer.blit(self.maze_layer, drawn_rect, drawn_rect)
+                changed.append(drawn_rect)
+            if sprite is None:
+                del self.drawn_items[tile.index]
+                continue
+            rect = self.item_layer.blit(sprite, item.position.as_tuple())
+            self.drawn_items[tile.index] = (sprite, rect)
+            changed.append(rect)
+        return changed
+
+class DirtyRectScreen(object):
+    '''
+    Wraps the display surface and only sends the parts that changed to the display.
+
+    Every blit on the wrapper is recorded. The next frame restores those rects from the
+    layer underneath, and the display is updated with the erased and the newly drawn rects.
+    When a large population is drawn the frame is redrawn whole instead.
+    '''
+    def __init__(self, screen: pygame.Surface, max_dirty_rects: int = MAX_DIRTY_RECTS):
+        """
+        Initialize a DirtyRectScreen object.
+
+        Args:
+            screen (pygame.Surface): The display surface
+            max_dirty_rects (int, optional): The most rects patched before the whole frame is redrawn. Defaults to MAX_DIRTY_RECTS.
+        """
+        self.screen = screen
+        self.max_dirty_rects = max_dirty_rects
+        self.drawn_rects = []
+        self.dirty_rects = []
+        self.needs_full_update = True
+
+    def invalidate(self) -> None:
+        '''Redraws and updates the whole display on the next frame'''
+        self.needs_full_update = True
+
+    def begin_frame(self, layer: pygame.Surface, changed_rects: list) -> 'DirtyRectScreen':
+        '''
+        Erases the sprites of the last frame and copies the changed parts of the layer to the screen
+
+        Args:
+            layer (pygame.Surface): The surface the sprites are drawn over
+            changed_rects (list): The rects of the layer that changed since the last frame
+        '''
+        if len(self.drawn_rects) + len(changed_rects) > self.max_dirty_rects:
+            self.needs_full_update = True
+        if self.needs_full_update:
+            self.screen.blit(layer, (0, 0))
+            self.dirty_rects = []
+        else:
+            self.dirty_rects = self.drawn_rects + changed_rects
+            for rect in self.dirty_rects:
+                self.screen.blit(layer, rect, rect)
+        self.drawn_rects = []
+        return self
+
+    def blit(self, source: pygame.Surface, dest, area=None, special_flags: int = 0) -> pygame.Rect:
+        '''Draws the source on the screen and records where'''
+        rect = self.screen.blit(source, dest, area, special_flags)
+        self.drawn_rects.append(rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn: bool = True) -> list:
+        '''Draws every (source, dest) pair on the screen with one call and records where'''
+        rects = self.screen.blits(blit_sequence, True)
+        self.drawn_rects.extend(rects)
+        return rects if doreturn else None
+
+    def present(self) -> None:
+        '''Sends the changed parts of the screen to the display'''
+        if self.needs_full_update:
+            pygame.display.update()
+            self.needs_full_update = False
+        else:
+            pygame.display.update(self.dirty_rects + self.drawn_rects)
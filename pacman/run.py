@@ -1,60 +1,199 @@
-import pygame, sys, random, pickle, neat, os
-from pygame.locals import *
+import time
+# When the process started, to report how long it took to simulate the first tick
+STARTUP_TIME = time.perf_counter()
+
+import sys, random, pickle, neat, os, argparse, struct
+import numpy as np
+from functools import partial
+from collections import Counter
 from constants import *
 from tiles import TileCollection
 from agent import Agent
 from ghost import Blinky, Pinky, Inky, Clyde
 from items import *
 from text import Score
+from collisions import CollisionSystem
+from viewer import Viewer, Snapshot, VIEWER_FPS
+from vector import Vector2D
+from batch_simulation import BatchSimulation, NO_DIRECTION, GHOST_CLASSES
 from neat_utils import get_largest_checkpoint
+from checkpoints import AsyncCheckpointer
+from inference import build_batch_network
+from features import FEATURE_SETS, configure_inputs, check_inputs
+from compiler import network_compiler
+from evaluation import FitnessCache, ParallelEvaluator, report_tick_rate, report_startup_time, report_terminations
+from termination import TerminationPolicy, build_termination_policy
+from streams import RandomStream
+from scenarios import Scenario, ScenarioSuite, DEFAULT_SCENARIO, SCENARIO_SUITES, REDUCERS, build_scenario_suite
+from maze import PHASES
+from game_state import (OBJECTS_STATE, BATCH_STATE, pack_header, unpack_header, phase_code, pack_random,
+                        unpack_random, pack_power_pellets, unpack_power_pellets)
+
+# Tick, simulated time, phase, phase timer, phase interval and high score of a snapshot
+CONTROLLER_STATE = struct.Struct('<Idbddi')
 
 class GameController(object):
     '''
     A class that controls the game loop and game state
     '''
-    def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.clock = pygame.time.Clock()
+    def __init__(self, headless: bool = False, delta_time: float = None, seed: int = None,
+                 decision_points_only: bool = False, features: str = 'default', scenario: Scenario = None):
+        '''
+        Args:
+            headless (bool): Skips the display entirely and runs the simulation as fast as possible
+            delta_time (float): Fixed timestep in seconds. Defaults to FIXED_DELTA_TIME when headless,
+                otherwise the timestep is measured from the clock
+            seed (int): Seed of the episode. Every agent sees the same phase schedule and its ghosts
+                draw from their own generator, so an agent's fitness does not depend on the
+                other agents it is simulated with
+            decision_points_only (bool): Only query an agent's network while it is stopped or heading
+                for a junction, corner or dead end. Agents can then no longer turn around mid-corridor
+            features (str): The key of the feature set in FEATURE_SETS the agents observe
+            scenario (Scenario): The level, start tiles and ghost order of every episode, the seed is set
+                separately. Defaults to DEFAULT_SCENARIO
+        '''
+        self.headless = headless
+        self.scenario = scenario if scenario is not None else DEFAULT_SCENARIO
+        self.seed = seed
+        self.decision_points_only = decision_points_only
+        self.features = FEATURE_SETS[features]
+        if delta_time is None and headless:
+            delta_time = FIXED_DELTA_TIME
+        self.fixed_delta_time = delta_time
+        if headless:
+            # Nothing is drawn, so pygame is never imported or initialized. Should anything still
+            # open the display, the dummy driver never opens a window
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            self.screen, self.display, self.clock = None, None, None
+        else:
+            import pygame
+            from rendering import DirtyRectScreen
+            pygame.init()
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.display = DirtyRectScreen(self.screen)
+            self.clock = pygame.time.Clock()
+        self.ticks = 0
+        self.simulated_time = 0
         self.max_phase_intervals = {
             'scatter' : (7, 10),
             'chase' : (2, 5),
         }
+        # The maze, agents and ghosts are built by the first game and reset in place for every later one
+        self.tiles = None
+        self.agent_pool = []
+        # Stops agents early, set before start
+        self.termination = None
     
     def set_background(self):
-        '''Sets the background of the screen'''
+        '''Sets the background of the screen, nothing is drawn when headless'''
+        if self.headless:
+            return
+        import pygame
         self.background = pygame.Surface(SCREEN_SIZE).convert()
         self.screen.fill(BLACK)
 
-    def start(self, genomes, config):
-        '''Starts the game'''
-        self.set_background()
+    def start_rendering(self):
+        '''Bakes the maze of the episode into layers, nothing is drawn when headless'''
+        if self.headless:
+            return
+        from rendering import MazeLayers
+        self.maze_layers = MazeLayers(self.tiles, self.background)
+        self.display.invalidate()
+
+    def pack_controller_state(self) -> bytes:
+        '''Returns the state shared by every agent packed into bytes'''
+        return (CONTROLLER_STATE.pack(self.ticks, self.simulated_time, phase_code(self.phase), self.phase_timer,
+                                      self.phase_interval, self.high_score.score)
+                + pack_random(self.random) + pack_power_pellets(self.tiles.power_pellets))
+
+    def unpack_controller_state(self, buffer, offset: int) -> int:
+        '''Restores the state packed by pack_controller_state and returns the offset after it'''
+        (self.ticks, self.simulated_time, phase, self.phase_timer, self.phase_interval,
+         self.high_score.score) = CONTROLLER_STATE.unpack_from(buffer, offset)
+        self.phase = PHASES[phase]
+        offset = unpack_random(self.random, buffer, offset + CONTROLLER_STATE.size)
+        return unpack_power_pellets(self.tiles.power_pellets, buffer, offset)
+
+    def retain_networks(self, rows) -> None:
+        '''Compiles the networks at the given rows again if a restored snapshot revived dropped ones'''
+        if (self.batch_network.row_positions[rows] < 0).any():
+            self.batch_network.compile(rows)
+
+    def start_phase(self):
+        '''Seeds the episode and starts the first phase'''
+        self.random = random.Random(self.seed)
         self.phase = SCATTER
-        self.phase_timer, self.phase_interval = 0, random.randint(*self.max_phase_intervals[self.phase])
-        self.tiles = TileCollection()
-        self.special_items = [Cherry, Strawberry, Orange, Apple, Pretzel, GalaxianFlagship, Bell, Key]
+        self.phase_timer, self.phase_interval = 0, self.random.randint(*self.max_phase_intervals[self.phase])
+
+    def start_maze(self):
+        '''Builds the maze for the first game and puts its items back for every later one'''
+        if self.tiles is None:
+            self.set_background()
+            self.tiles = TileCollection(self.scenario.level_file)
+            self.pacman_spawn, self.ghost_spawns = self.scenario.spawns(self.tiles)
+            self.start_rendering()
+        else:
+            self.tiles.reset()
         self.score = Score((SCREEN_WIDTH // 2, 25))
         self.high_score = Score((SCREEN_WIDTH // 2, 25))
 
+    def create_agent(self, neural_network) -> tuple:
+        '''Returns a new agent and its ghosts, which share one random generator'''
+        agent = Agent(self.pacman_spawn, neural_network)
+        ghost_rng = RandomStream(self.seed)
+        blinky_spawn, pinky_spawn, inky_spawn, clyde_spawn = self.ghost_spawns
+        ghosts = {
+            'blinky' : Blinky(blinky_spawn, ghost_rng),
+            'pinky' : Pinky(pinky_spawn, ghost_rng),
+            'inky' : Inky(inky_spawn, ghost_rng),
+            'clyde' : Clyde(clyde_spawn, ghost_rng)
+        }
+        return agent, ghosts
+
+    def start(self, genomes, config):
+        '''Starts the game, reusing the maze, agents and ghosts of the last game'''
+        self.start_phase()
+        self.start_maze()
+        self.collisions = CollisionSystem()
+        self.special_items = [Cherry, Strawberry, Orange, Apple, Pretzel, GalaxianFlagship, Bell, Key]
+
         self.agents = []
         self.agent_ghost_pairs = {}
+        self.agent_genome_ids = {}
 
-        for genome_id, genome in genomes:
+        for row, (genome_id, genome) in enumerate(genomes):
             genome.fitness = 0
-            net = neat.nn.FeedForwardNetwork.create(genome, config)
-            agent = Agent(self.tiles.get_tile(14, 26), net)
+            net = network_compiler.compile(genome, config)
+            if row < len(self.agent_pool):
+                agent, ghosts = self.agent_pool[row]
+                agent.reset()
+                agent.neural_network = net
+                for ghost in ghosts.values():
+                    ghost.reset()
+                # Seeded again, the generator draws as if the ghosts were new
+                ghosts['blinky'].random.seed(self.seed)
+            else:
+                agent, ghosts = self.create_agent(net)
+                self.agent_pool.append((agent, ghosts))
             self.agents.append(agent)
-            self.agent_ghost_pairs[agent] = {
-                'blinky' : Blinky(self.tiles.get_tile(16, 16)),
-                'pinky' : Pinky(self.tiles.get_tile(11, 16)),
-                'inky' : Inky(self.tiles.get_tile(16, 18)),
-                'clyde' : Clyde(self.tiles.get_tile(11, 18))
-            }
-            self.alive_agents = len(self.agents)
-            
-            self.best_agent = self.find_best_agent()
+            self.agent_genome_ids[agent] = genome_id
+            self.agent_ghost_pairs[agent] = ghosts
+        self.alive_agents = len(self.agents)
+        self.find_best_agent()
+        self.agent_rows = {agent: row for row, agent in enumerate(self.agents)}
+        self.observations = self.features.allocate(len(self.agents))
+        self.batch_network = build_batch_network([agent.neural_network for agent in self.agents])
+        if self.termination is not None:
+            self.termination.start(len(self.agents))
+            # Filled in place every tick, only with the arrays the termination rules read
+            inputs = self.termination.inputs
+            self.termination_alive = np.zeros(len(self.agents), dtype=bool)
+            self.termination_scores = np.zeros(len(self.agents), dtype=np.int64) if 'scores' in inputs else None
+            self.termination_tiles = np.zeros(len(self.agents), dtype=np.int64) if 'tiles' in inputs else None
 
         self.show_best_agent = False
+        self.ticks = 0
+        self.simulated_time = 0
     
     def find_best_agent(self):
         '''Finds the best agent'''
@@ -80,6 +219,22 @@ class GameController(object):
         self.best_agent = best_agent
 
 
+    def choose_directions(self, agents) -> dict:
+        '''Returns the direction every agent chooses, activating all of their networks at once'''
+        if not agents:
+            return {}
+        rows = [self.agent_rows[agent] for agent in agents]
+        for agent in agents:
+            self.get_game_state(agent)
+        action_outputs = self.batch_network.activate(self.observations[rows], rows)
+        return {agent: DIRECTIONS[action] for agent, action in zip(agents, action_outputs.argmax(axis=1).tolist())}
+
+    def is_at_decision_point(self, agent) -> bool:
+        '''Returns whether the agent's network has to be queried this tick'''
+        if not self.decision_points_only or agent.current_direction is None:
+            return True
+        return self.tiles.maze.junctions[None].decision_points[agent.next_tile.index]
+
     def get_game_state(self, agent):
         """Get the game state information for a given agent.
 
@@ -87,58 +242,9 @@ class GameController(object):
             agent: The agent for which to retrieve the game state.
 
         Returns:
-            game_state: A list containing the game state information.
+            game_state: The agent's row of the observation buffer, laid out by self.features.
         """
-        # Define a dictionary to map constants to numerical values
-        constants_dict = {
-            UP: 0, DOWN: 1, LEFT: 2, RIGHT: 3, SCATTER: 4,
-            CHASE: 5, FRIGHTENED: 6, EATEN: 7, LEAVE_GHOST_HOUSE: 8,
-            EMPTY: 9, WALL: 10, GHOST_DOOR: 11, GHOST_HOUSE: 12,
-            None: 13
-        }
-
-        # Initialize the game state list
-        game_state = []
-
-        # Add information about the game phase
-        game_state.append(constants_dict[self.phase])
-
-        # Get the agent's position and add it to the game state
-        agent_position = agent.position.as_tuple()
-        game_state.append(int(agent_position[0]))
-        game_state.append(int(agent_position[1]))
-
-        # Add the agent's current direction, idle timer, score, and lives
-        game_state.append(constants_dict[agent.current_direction])
-        game_state.append(int(agent.idle_timer))
-        game_state.append(agent.score)
-        game_state.append(agent.lives)
-
-        for direction in [UP, DOWN, LEFT, RIGHT]:
-            try:
-                if agent.can_move_in_direction(direction):
-                    game_state.append(1)
-                else:
-                    game_state.append(0)
-            except:
-                game_state.append(0)
-
-        # Iterate over the ghosts associated with the agent
-        for ghost in self.agent_ghost_pairs[agent].values():    
-            # Get the ghost's position and add it to the game state
-            ghost_position = ghost.position.as_tuple()
-            game_state.append(int(ghost_position[0]))
-            game_state.append(int(ghost_position[1]))
-
-            # Add the distance between the agent and the ghost
-            game_state.append(int(agent.position.distance(ghost.position)))
-
-            # Add the ghost's current direction and phase
-            game_state.append(constants_dict[ghost.current_direction])
-            game_state.append(constants_dict[ghost.phase])
-
-        # Return the populated game state list
-        return game_state
+        return self.features.observe(self, agent, self.observations[self.agent_rows[agent]])
 
     def interpret_action(self, action_outputs):
         """_summary_
@@ -161,24 +267,58 @@ class GameController(object):
     def get_fitness(self, agent):
         '''Returns the fitness of the agent'''
         return agent.score
+
+    def get_fitnesses(self) -> dict:
+        '''Returns the fitness of every agent keyed by the id of its genome'''
+        return {self.agent_genome_ids[agent]: self.get_fitness(agent) for agent in self.agents}
+
+    def get_termination_reasons(self) -> dict:
+        '''Returns why the termination policy stopped each agent it stopped, keyed by the id of its genome'''
+        return {self.agent_genome_ids[agent]: reason for agent, reason in zip(self.agents, self.termination.reasons)
+                if reason is not None}
+
+    def apply_termination(self):
+        '''Stops the agents the termination policy gives up on'''
+        if self.termination is None:
+            return
+        agents = self.agents
+        alive, scores, tiles = self.termination_alive, self.termination_scores, self.termination_tiles
+        alive[:] = [agent.alive for agent in agents]
+        if scores is not None:
+            scores[:] = [agent.score for agent in agents]
+        if tiles is not None:
+            tiles[:] = [agent.tile.index for agent in agents]
+        for index in self.termination.check(self.ticks, alive, scores, tiles):
+            agents[index].alive = False
     
+    def get_delta_time(self) -> float:
+        '''Returns the timestep of the current tick'''
+        if self.headless:
+            return self.fixed_delta_time
+        elapsed = self.clock.tick(FPS) / 1000.0
+        if self.fixed_delta_time is not None:
+            return self.fixed_delta_time
+        return elapsed
+
     def update(self):
         '''Updates the game state'''
-        delta_time = self.clock.tick(60) / 1000.0
-        for agent in self.agents:
-            if agent.alive:
-                game_state = self.get_game_state(agent)
-                action_outputs = agent.neural_network.activate(game_state)
-                direction = self.interpret_action(action_outputs)
-                agent.update(direction, delta_time)
-                for ghost in self.agent_ghost_pairs[agent].values():
-                    ghost.update(delta_time, agent, self.tiles.look_up_table)
-                self.check_collisions(agent)
-                self.score.update(agent)
-                self.update_game_phase(delta_time)
-                self.update_ghosts_phase(agent, delta_time)
-                if agent.is_idle:
-                    agent.alive = False
+        delta_time = self.get_delta_time()
+        self.ticks += 1
+        self.simulated_time += delta_time
+        alive_agents = [agent for agent in self.agents if agent.alive]
+        self.batch_network.retain([self.agent_rows[agent] for agent in alive_agents])
+        directions = self.choose_directions([agent for agent in alive_agents if self.is_at_decision_point(agent)])
+        for agent in alive_agents:
+            agent.update(directions.get(agent), delta_time)
+            for ghost in self.agent_ghost_pairs[agent].values():
+                ghost.update(delta_time, agent, self.tiles.look_up_table)
+            self.check_collisions(agent, delta_time)
+            self.score.update(agent)
+            self.update_ghosts_phase(agent, delta_time)
+            if agent.is_idle:
+                agent.alive = False
+        self.update_game_phase(delta_time)
+        self.apply_termination()
         self.check_alive_agents()
         self.handle_flashing_events(delta_time)
         self.find_best_agent()
@@ -187,27 +327,29 @@ class GameController(object):
         except:
             self.score.update(0)
         self.high_score.text = 'HIGH SCORE: ' + str(self.high_score.score)
-        self.check_events()
+        if not self.headless:
+            self.check_events()
         # print(self.high_score.score, self.best_agent.score)
 
     def check_events(self):
         '''Checks for events'''
+        import pygame
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
-            elif event.type == KEYDOWN and event.key == K_SPACE:
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
                 self.show_best_agent = not self.show_best_agent
 
     def spawn_special_item(self):
         '''Selects a random tile and spawns an item on it'''
         raise NotImplementedError
-        '''if len(self.pacman.collected_items) % 38 == 0 and self.tiles.unique_item is None:
+        '''if self.pacman.num_collected_items % 38 == 0 and self.tiles.unique_item is None:
             if len(self.special_items) == 0:
                 return
             empty_tiles = []
             for tile in self.tiles.look_up_table.values():
-                if tile.type == PATH and tile.item in self.pacman.collected_items:
+                if tile.type == PATH and self.pacman.collected_tiles[tile.index]:
                     empty_tiles.append(tile)
             if empty_tiles:
                 random_tile = random.choice(empty_tiles)
@@ -216,35 +358,52 @@ class GameController(object):
                 self.tiles.items.append(item)
                 random_tile.item = item'''
         
-    def check_collisions(self, agent):
-        for item in self.tiles.items:
-            distance_to_agent = agent.position.distance(item.position)
-
-            if distance_to_agent <= item.collision_radius and item not in agent.collected_items:
-                agent.collected_items.append(item)
-                agent.score += item.POINTS
-
-                if item.name == 'power_pellet':
-                    for ghost in self.agent_ghost_pairs[agent].values():
-                        if ghost.phase not in [EATEN, LEAVE_GHOST_HOUSE]:
-                            ghost.phase = FRIGHTENED
-                            ghost.speed = 50
-                            ghost.elapsed_time = 0
-
-            for ghost in self.agent_ghost_pairs[agent].values():
-                if ghost.position.distance(agent.position) <= ghost.collision_radius:
-                    if ghost.phase == FRIGHTENED:
-                        ghost.phase = EATEN
-                        ghost.speed = 150
+    def check_collisions(self, agent, delta_time: float):
+        '''Resolves the collisions of the agent with its ghosts and the items in reach'''
+        # Ghosts are resolved first, so a deadly ghost ends the agent's checks, and again
+        # after a power pellet so the agent eats the ghosts it is touching
+        if self.check_ghost_collisions(agent, delta_time):
+            return
+        if self.collect_items(agent):
+            self.check_ghost_collisions(agent, delta_time)
+
+    def collect_items(self, agent) -> bool:
+        '''Collects the items the agent touches and returns whether it ate a power pellet'''
+        ate_power_pellet = False
+        for tile in self.collisions.items_in_reach(agent):
+            if agent.collected_tiles[tile.index]:
+                continue
+            item = tile.item
+            agent.collected_tiles[tile.index] = 1
+            agent.num_collected_items += 1 + item.COVERED_PELLETS
+            agent.score += item.points
+
+            if item.name == 'power_pellet':
+                ate_power_pellet = True
+                for ghost in self.agent_ghost_pairs[agent].values():
+                    if ghost.phase not in [EATEN, LEAVE_GHOST_HOUSE]:
+                        ghost.phase = FRIGHTENED
+                        ghost.speed = 50
                         ghost.elapsed_time = 0
-                        agent.score += 200
-                    elif ghost.phase == CHASE or ghost.phase == SCATTER:
-                        agent.lives -= 1
-                        agent.reset_position()
-                        for ghost in self.agent_ghost_pairs[agent].values():
-                            ghost.reset()
-                            ghost.phase = LEAVE_GHOST_HOUSE
-                        return   
+        return ate_power_pellet
+
+    def check_ghost_collisions(self, agent, delta_time: float) -> bool:
+        '''Lets the agent eat the frightened ghosts it touched and returns whether it died'''
+        ghosts = self.agent_ghost_pairs[agent].values()
+        for ghost in self.collisions.ghosts_in_reach(agent, ghosts, delta_time):
+            if ghost.phase == FRIGHTENED:
+                ghost.phase = EATEN
+                ghost.speed = 150
+                ghost.elapsed_time = 0
+                agent.score += 200
+            elif ghost.phase == CHASE or ghost.phase == SCATTER:
+                agent.lives -= 1
+                agent.reset_position()
+                for ghost in ghosts:
+                    ghost.reset_position()
+                    ghost.phase = LEAVE_GHOST_HOUSE
+                return True
+        return False
 
     def switch_phase(self):
         '''Switches the phase'''
@@ -252,7 +411,7 @@ class GameController(object):
             self.phase = CHASE
         elif self.phase == CHASE:
             self.phase = SCATTER
-        self.phase_interval = random.randint(*self.max_phase_intervals[self.phase])
+        self.phase_interval = self.random.randint(*self.max_phase_intervals[self.phase])
         self.phase_timer = 0
 
     def update_game_phase(self, delta_time: float):
@@ -308,53 +467,379 @@ class GameController(object):
 
     def render(self):
         '''Renders the game state'''
+        if self.headless:
+            return
         if self.show_best_agent or self.alive_agents == 1:
             if self.best_agent is None:
                 return
-            for tile in self.tiles.look_up_table.values():
-                if tile.item in self.best_agent.collected_items:
-                    tile.render(self.screen, False)
-                else:
-                    tile.render(self.screen, True)
-            self.best_agent.render(self.screen)
-
+            changed_rects = self.maze_layers.update(self.best_agent.collected_tiles)
+            screen = self.display.begin_frame(self.maze_layers.item_layer, changed_rects)
+            blits = self.best_agent.get_blits()
             for ghost in self.agent_ghost_pairs[self.best_agent].values():
-                ghost.render(self.screen)
-            self.score.render(self.screen)
+                blits.extend(ghost.get_blits())
+            screen.blits(blits)
+            self.score.render(screen)
         else:
-            self.screen.blit(self.background, (0, 0))
-            self.tiles.render(self.screen)
+            changed_rects = self.maze_layers.update()
+            screen = self.display.begin_frame(self.maze_layers.item_layer, changed_rects)
+            # Every entity of the population is drawn with a single blits call
+            blits = []
             for agent in self.agents:
                 if agent.alive:
                     for ghost in self.agent_ghost_pairs[agent].values():
-                        ghost.render(self.screen)
-                    agent.render(self.screen)
-            self.high_score.render(self.screen)
-            # self.high_score.render(self.screen)
-        
-        pygame.display.update()
+                        blits.extend(ghost.get_blits())
+                    blits.extend(agent.get_blits())
+            screen.blits(blits)
+            self.high_score.render(screen)
+
+        self.display.present()
+
+    def snapshot(self) -> Snapshot:
+        '''Returns what a Viewer needs to draw the current frame, None when there is nothing to draw'''
+        if self.show_best_agent or self.alive_agents == 1:
+            if self.best_agent is None:
+                return None
+            agents, collected_tiles, text = [self.best_agent], bytes(self.best_agent.collected_tiles), self.score.text
+        else:
+            agents, collected_tiles, text = [agent for agent in self.agents if agent.alive], None, self.high_score.text
+        ghosts = [(GHOST_CLASSES.index(type(ghost)), ghost.position.x, ghost.position.y, ghost.current_direction,
+                   ghost.phase, ghost.sprite_toggle)
+                  for agent in agents for ghost in self.agent_ghost_pairs[agent].values()]
+        agents = [(agent.position.x, agent.position.y, agent.current_direction, agent.animation_state, agent.lives)
+                  for agent in agents]
+        return Snapshot(agents, ghosts, collected_tiles, self.tiles.power_pellets[0].flashing, text)
+
+    def save_agent_state(self, agent) -> bytes:
+        '''Returns the state of the agent, its ghosts and their random generator packed into bytes'''
+        ghosts = self.agent_ghost_pairs[agent].values()
+        return b''.join([agent.pack_state(), *(ghost.pack_state() for ghost in ghosts),
+                         self.agent_ghost_pairs[agent]['blinky'].random.pack_state()])
+
+    def restore_agent_state(self, agent, buffer, offset: int = 0) -> int:
+        '''Restores the state packed by save_agent_state and returns the offset after it'''
+        offset = agent.unpack_state(buffer, offset, self.tiles)
+        for ghost in self.agent_ghost_pairs[agent].values():
+            offset = ghost.unpack_state(buffer, offset, self.tiles)
+        return self.agent_ghost_pairs[agent]['blinky'].random.unpack_state(buffer, offset)
+
+    def save_state(self) -> bytes:
+        '''Returns a snapshot of the game that restore_state resumes from'''
+        return b''.join([pack_header(OBJECTS_STATE, len(self.agents)), self.pack_controller_state(),
+                         *(self.save_agent_state(agent) for agent in self.agents)])
+
+    def restore_state(self, buffer) -> None:
+        '''
+        Resumes the game from a snapshot taken by save_state
+
+        Args:
+            buffer (bytes): The snapshot, of a game started with the same genomes
+
+        Raises:
+            ValueError: If the snapshot was not taken of a game of this backend and population
+        '''
+        offset = self.unpack_controller_state(buffer, unpack_header(buffer, OBJECTS_STATE, len(self.agents)))
+        for agent in self.agents:
+            offset = self.restore_agent_state(agent, buffer, offset)
+        self.retain_networks([self.agent_rows[agent] for agent in self.agents if agent.alive])
+        self.check_alive_agents()
+        self.find_best_agent()
 
     def is_game_over(self):
         '''Returns True if the game is over'''
         return all([not agent.alive for agent in self.agents])
 
+class BatchGameController(GameController):
+    '''
+    A game controller that advances the whole population with a BatchSimulation
+    instead of stepping an Agent and four Ghost objects per genome
+    '''
+    def start(self, genomes, config):
+        '''Starts the game, reusing the maze and the simulation arrays of the last game'''
+        first_game = self.tiles is None
+        self.start_phase()
+        self.start_maze()
+
+        self.genome_ids = []
+        self.networks = []
+        for genome_id, genome in genomes:
+            genome.fitness = 0
+            self.genome_ids.append(genome_id)
+            self.networks.append(network_compiler.compile(genome, config))
+        self.batch_network = build_batch_network(self.networks)
+        if first_game:
+            self.simulation = BatchSimulation(self.tiles, len(self.networks), self.seed, self.features,
+                                              self.pacman_spawn, self.ghost_spawns)
+            # Entities that are only moved onto the simulated state to be drawn
+            self.agent_sprite = Agent(self.pacman_spawn, None)
+            self.ghost_sprites = [ghost(tile) for ghost, tile in zip(GHOST_CLASSES, self.ghost_spawns)]
+        else:
+            self.simulation.restart(len(self.networks), self.seed)
+        if self.termination is not None:
+            self.termination.start(len(self.networks))
+
+        self.alive_agents = len(self.networks)
+        self.best_agent = None
+        self.show_best_agent = False
+        self.ticks = 0
+        self.simulated_time = 0
+
+    def find_best_agent(self):
+        '''Finds the index of the alive agent with the highest score'''
+        simulation = self.simulation
+        scores = np.where(simulation.alive, simulation.score, 0)
+        self.best_agent = int(scores.argmax()) if scores.max() > 0 else None
+        if len(scores):
+            self.high_score.score = max(self.high_score.score, int(simulation.score.max()))
+
+    def get_fitnesses(self) -> dict:
+        '''Returns the fitness of every agent keyed by the id of its genome'''
+        return dict(zip(self.genome_ids, self.simulation.score.tolist()))
+
+    def get_termination_reasons(self) -> dict:
+        '''Returns why the termination policy stopped each agent it stopped, keyed by the id of its genome'''
+        return {genome_id: reason for genome_id, reason in zip(self.genome_ids, self.termination.reasons)
+                if reason is not None}
+
+    def apply_termination(self):
+        '''Stops the agents the termination policy gives up on'''
+        if self.termination is None:
+            return
+        simulation = self.simulation
+        stopped = self.termination.check(self.ticks, simulation.alive, simulation.score, simulation.agent_tile)
+        simulation.alive[stopped] = False
+
+    def save_state(self) -> bytes:
+        '''Returns a snapshot of the game that restore_state resumes from'''
+        return b''.join([pack_header(BATCH_STATE, self.simulation.num_agents), self.pack_controller_state(),
+                         self.simulation.pack_state()])
+
+    def restore_state(self, buffer) -> None:
+        '''
+        Resumes the game from a snapshot taken by save_state
+
+        Args:
+            buffer (bytes): The snapshot, of a game started with the same genomes
+
+        Raises:
+            ValueError: If the snapshot was not taken of a game of this backend and population
+        '''
+        simulation = self.simulation
+        offset = self.unpack_controller_state(buffer, unpack_header(buffer, BATCH_STATE, simulation.num_agents))
+        simulation.unpack_state(buffer, offset)
+        self.retain_networks(np.flatnonzero(simulation.alive))
+        self.alive_agents = int(simulation.alive.sum())
+        self.find_best_agent()
+
+    def update(self):
+        '''Updates the game state'''
+        delta_time = self.get_delta_time()
+        self.ticks += 1
+        self.simulated_time += delta_time
+
+        simulation = self.simulation
+        observations = simulation.observe(self.phase)
+        actions = np.full(simulation.num_agents, NO_DIRECTION)
+        self.batch_network.retain(np.flatnonzero(simulation.alive))
+        deciding = simulation.alive
+        if self.decision_points_only:
+            deciding = deciding & simulation.at_decision_points()
+        rows = np.flatnonzero(deciding)
+        if len(rows):
+            actions[rows] = self.batch_network.activate(observations[rows], rows).argmax(axis=1)
+        simulation.step(actions, self.phase, delta_time)
+
+        self.update_game_phase(delta_time)
+        self.apply_termination()
+        self.alive_agents = int(simulation.alive.sum())
+        self.handle_flashing_events(delta_time)
+        self.find_best_agent()
+        self.score.update(0 if self.best_agent is None else simulation.score[self.best_agent])
+        self.high_score.text = 'HIGH SCORE: ' + str(self.high_score.score)
+        if not self.headless:
+            self.check_events()
+
+    def get_agent_blits(self, index: int) -> list:
+        '''Returns the (sprite, position) pairs that draw the simulated agent at the given index and its ghosts'''
+        simulation = self.simulation
+        blits = []
+        for ghost_index, ghost in enumerate(self.ghost_sprites):
+            ghost.position.set(*simulation.ghost_position[index, ghost_index])
+            direction = simulation.ghost_direction[index, ghost_index]
+            ghost.current_direction = None if direction == NO_DIRECTION else DIRECTIONS[direction]
+            ghost.phase = GHOST_PHASES[simulation.ghost_phase[index, ghost_index]]
+            ghost.sprite_toggle = (self.ticks // 12) % 2 == 0
+            blits.extend(ghost.get_blits())
+
+        agent = self.agent_sprite
+        agent.position.set(*simulation.agent_position[index])
+        direction = simulation.agent_direction[index]
+        agent.current_direction = None if direction == NO_DIRECTION else DIRECTIONS[direction]
+        agent.lives = int(simulation.lives[index])
+        blits.extend(agent.get_blits())
+        return blits
+
+    def render(self):
+        '''Renders the game state'''
+        if self.headless:
+            return
+        simulation = self.simulation
+        if self.show_best_agent or self.alive_agents == 1:
+            if self.best_agent is None:
+                return
+            changed_rects = self.maze_layers.update(simulation.pellets[self.best_agent] == 0)
+            screen = self.display.begin_frame(self.maze_layers.item_layer, changed_rects)
+            screen.blits(self.get_agent_blits(self.best_agent))
+            self.score.render(screen)
+        else:
+            changed_rects = self.maze_layers.update()
+            screen = self.display.begin_frame(self.maze_layers.item_layer, changed_rects)
+            blits = []
+            for index in np.flatnonzero(simulation.alive):
+                blits.extend(self.get_agent_blits(index))
+            screen.blits(blits)
+            self.high_score.render(screen)
+
+        self.display.present()
+
+    def snapshot(self) -> Snapshot:
+        '''Returns what a Viewer needs to draw the current frame, None when there is nothing to draw'''
+        simulation = self.simulation
+        if self.show_best_agent or self.alive_agents == 1:
+            if self.best_agent is None:
+                return None
+            indexes, text = [self.best_agent], self.score.text
+            collected_tiles = (simulation.pellets[self.best_agent] == 0).tobytes()
+        else:
+            indexes, collected_tiles, text = np.flatnonzero(simulation.alive), None, self.high_score.text
+        sprite_toggle = (self.ticks // 12) % 2 == 0
+        # NO_DIRECTION is -1, so it picks the trailing None
+        directions = DIRECTIONS + (None,)
+        ghosts = [(ghost_index, x, y, directions[direction], GHOST_PHASES[phase], sprite_toggle)
+                  for positions, ghost_directions, phases in zip(simulation.ghost_position[indexes].tolist(),
+                                                                 simulation.ghost_direction[indexes].tolist(),
+                                                                 simulation.ghost_phase[indexes].tolist())
+                  for ghost_index, ((x, y), direction, phase) in enumerate(zip(positions, ghost_directions, phases))]
+        agents = [(x, y, directions[direction], 0, lives)
+                  for (x, y), direction, lives in zip(simulation.agent_position[indexes].tolist(),
+                                                      simulation.agent_direction[indexes].tolist(),
+                                                      simulation.lives[indexes].tolist())]
+        return Snapshot(agents, ghosts, collected_tiles, self.tiles.power_pellets[0].flashing, text)
+
+    def is_game_over(self):
+        '''Returns True if the game is over'''
+        return not self.simulation.alive.any()
+
+GAME_CONTROLLERS = {
+    'objects' : GameController,
+    'batch' : BatchGameController,
+}
+# The game controllers of this process, keyed by their settings and the setup of their scenario.
+# Every episode reuses the controller of the last one, so only the networks change between generations
+game_controllers = {}
+
+def get_game_controller(backend: str, headless: bool, delta_time: float, decision_points_only: bool,
+                        features: str, scenario: Scenario = None) -> GameController:
+    '''Returns the game controller of the process with these settings, creating it for the first episode'''
+    scenario = scenario if scenario is not None else DEFAULT_SCENARIO
+    key = (backend, headless, delta_time, decision_points_only, features, scenario.setup)
+    if key not in game_controllers:
+        game_controllers[key] = GAME_CONTROLLERS[backend](headless, delta_time, None, decision_points_only, features,
+                                                          scenario)
+    return game_controllers[key]
+
     # ------------------ NEAT ------------------ #
-def eval_genomes(genomes, config):
-    '''Evaluates the genomes'''
-    game_controller = GameController()
+def simulate_genomes(genomes, config, seed: int = None, headless: bool = True, delta_time: float = None,
+                     backend: str = 'objects', decision_points_only: bool = False, features: str = 'default',
+                     viewer: Viewer = None, termination: TerminationPolicy = None, scenario: Scenario = None):
+    '''
+    Plays one episode with an agent for every genome
+
+    Args:
+        backend (str): The key of the game controller in GAME_CONTROLLERS to simulate with
+        decision_points_only (bool): Only query the networks at decision points, see GameController
+        features (str): The key of the feature set in FEATURE_SETS the agents observe
+        viewer (Viewer): Sends snapshots to the viewer process instead of rendering, use with headless
+        termination (TerminationPolicy): Stops agents early, the reasons are counted until the caller takes them
+        scenario (Scenario): Where the episode starts, the seed is already the seed of the scenario's episode.
+            Defaults to DEFAULT_SCENARIO
+
+    Returns:
+        A tuple of the fitnesses keyed by genome id and the number of simulated ticks
+    '''
+    game_controller = get_game_controller(backend, headless, delta_time, decision_points_only, features, scenario)
+    game_controller.seed = seed
+    game_controller.termination = termination
+    global STARTUP_TIME
     game_controller.start(genomes, config)
     while not game_controller.is_game_over():
         game_controller.update()
-        game_controller.render()
+        if STARTUP_TIME is not None:
+            # Only the first tick of the process shows how long it took to start
+            report_startup_time(time.perf_counter() - STARTUP_TIME)
+            STARTUP_TIME = None
+        if viewer is not None:
+            viewer.send(game_controller)
+        else:
+            game_controller.render()
+    return game_controller.get_fitnesses(), game_controller.ticks
+
+def simulate_chunk(genomes, config, seed: int = None, termination: TerminationPolicy = None, **settings):
+    '''
+    Plays simulate_genomes in a worker process and returns the fitnesses, the number of simulated ticks
+    and the (reasons, agents) counts of its termination policy, so the parent reports them once
+    '''
+    fitnesses, ticks = simulate_genomes(genomes, config, seed, termination=termination, **settings)
+    stopped = termination.take_counts() if termination is not None else (Counter(), len(genomes))
+    return fitnesses, ticks, stopped
+
+def simulate_scenarios(runs, seed: int, simulate) -> list:
+    '''Plays the (scenario, genomes) runs one after the other with simulate, a partial of simulate_genomes'''
+    return [simulate(genomes, seed=scenario.episode_seed(seed), scenario=scenario) for scenario, genomes in runs]
+
+def eval_genomes(genomes, config, headless: bool = False, delta_time: float = None, backend: str = 'objects',
+                 decision_points_only: bool = False, features: str = 'default', seed: int = None,
+                 fitness_cache: FitnessCache = None, viewer: Viewer = None, termination: TerminationPolicy = None,
+                 suite: ScenarioSuite = None):
+    '''Evaluates the genomes, skipping the ones whose fitness is cached for the episode's seed'''
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    simulate = partial(simulate_genomes, config=config, seed=seed, headless=headless, delta_time=delta_time,
+                       backend=backend, decision_points_only=decision_points_only, features=features, viewer=viewer,
+                       termination=termination)
+    start_time = time.perf_counter()
+    if suite is not None:
+        fitnesses, ticks = suite.evaluate(genomes, seed, partial(simulate_scenarios, seed=seed, simulate=simulate),
+                                          fitness_cache)
+    elif fitness_cache is None:
+        fitnesses, ticks = simulate(genomes)
+    else:
+        fitnesses, ticks = fitness_cache.evaluate(genomes, seed, simulate)
+    report_tick_rate(ticks, time.perf_counter() - start_time)
+    if termination is not None:
+        report_terminations(*termination.take_counts())
 
     for genome_id, genome in genomes:
-        for agent in game_controller.agents:
-            if agent.neural_network is genome:
-                genome.fitness = game_controller.get_fitness(agent)
+        genome.fitness = fitnesses[genome_id]
 
 
-def run(config_file):
-    '''Runs the NEAT algorithm'''
+def run(config_file, headless: bool = False, delta_time: float = None, num_workers: int = 1, backend: str = 'objects',
+        decision_points_only: bool = False, features: str = 'default', seed: int = None,
+        fitness_cache_size: int = 10000, viewer_fps: float = None, termination: TerminationPolicy = None,
+        suite: ScenarioSuite = None, keep_checkpoints: int = 5, keep_every: int = None):
+    '''
+    Runs the NEAT algorithm
+
+    Args:
+        viewer_fps (float): Simulates headless and shows the training in a viewer process that is
+            sent this many snapshots per second. Defaults to None, which renders in this process
+            unless headless
+        termination (TerminationPolicy): Stops agents that are no longer worth simulating. Defaults
+            to None, which plays every agent until it runs out of lives or goes idle
+        suite (ScenarioSuite): Plays every generation on each scenario of the suite and reduces the
+            fitnesses. Defaults to None, which plays a single episode
+        keep_checkpoints (int): The number of newest checkpoints to keep, None keeps every checkpoint
+        keep_every (int): Also keeps the checkpoint of every generation that is a multiple of this
+    '''
     checkpoint_dir = os.path.join(os.getcwd(), 'checkpoints')
     larget_checkpoint = get_largest_checkpoint(checkpoint_dir)
 
@@ -362,26 +847,126 @@ def run(config_file):
         p = neat.Checkpointer.restore_checkpoint(larget_checkpoint)
     else:
         p = neat.Population(config_file)
+    # Checkpoints keep the config they were started with
+    check_inputs(p.config.genome_config, FEATURE_SETS[features])
 
     p.add_reporter(neat.StdOutReporter(True))
     stats = neat.StatisticsReporter()
     p.add_reporter(stats)
 
-    checkpoint_dir_path = os.path.join(os.getcwd(), 'checkpoints')
-    checkpoint_saver = neat.Checkpointer(generation_interval=1, time_interval_seconds=None, filename_prefix=checkpoint_dir_path + '/neat-checkpoint-')
+    checkpoint_saver = AsyncCheckpointer(checkpoint_dir, generation_interval=1, time_interval_seconds=None,
+                                         keep_last=keep_checkpoints, keep_every=keep_every)
 
     p.add_reporter(checkpoint_saver)
 
-    winner = p.run(eval_genomes, 1000)
-    with open(os.path.join(checkpoint_dir_path, 'winner.pkl'), 'wb') as output:
+    viewer = None
+    if viewer_fps is not None:
+        viewer, headless = Viewer(viewer_fps), True
+    fitness_cache = None
+    if fitness_cache_size > 0:
+        # Cached fitnesses are only reused when an episode always plays out the same way
+        if not headless and num_workers == 1 and delta_time is None:
+            print('Fitness cache disabled: the timestep is measured from the clock, pass --dt to fix it')
+        elif termination is not None and not termination.deterministic:
+            print('Fitness cache disabled: the termination rules depend on wall-clock time')
+        else:
+            settings = (backend, features, delta_time if delta_time is not None else FIXED_DELTA_TIME, decision_points_only)
+            fitness_cache = FitnessCache(fitness_cache_size, settings)
+    if num_workers > 1:
+        evaluator = ParallelEvaluator(num_workers, partial(simulate_chunk, headless=True, delta_time=delta_time,
+                                                           backend=backend, decision_points_only=decision_points_only,
+                                                           features=features, termination=termination),
+                                      seed=seed, fitness_cache=fitness_cache, suite=suite)
+        winner = p.run(evaluator.evaluate, 1000)
+        evaluator.close()
+    else:
+        winner = p.run(partial(eval_genomes, headless=headless, delta_time=delta_time, backend=backend,
+                               decision_points_only=decision_points_only, features=features, seed=seed,
+                               fitness_cache=fitness_cache, viewer=viewer, termination=termination, suite=suite), 1000)
+    if viewer is not None:
+        viewer.close()
+    checkpoint_saver.close()
+    with open(os.path.join(checkpoint_dir, 'winner.pkl'), 'wb') as output:
         pickle.dump(winner, output, 1)
 
+def play(genome_file: str, config, headless: bool = False, delta_time: float = None, seed: int = None,
+         backend: str = 'objects', decision_points_only: bool = False, features: str = 'default',
+         termination: TerminationPolicy = None, suite: ScenarioSuite = None):
+    '''Plays an episode with a saved genome, like the winner.pkl written by run, or one per scenario of the suite'''
+    with open(genome_file, 'rb') as file:
+        genome = pickle.load(file)
+    genomes = [(genome.key, genome)]
+    if suite is None:
+        fitnesses, ticks = simulate_genomes(genomes, config, seed, headless, delta_time, backend,
+                                            decision_points_only, features, termination=termination)
+    else:
+        simulate = partial(simulate_genomes, config=config, headless=headless, delta_time=delta_time, backend=backend,
+                           decision_points_only=decision_points_only, features=features, termination=termination)
+        fitnesses, ticks = suite.evaluate(genomes, seed, partial(simulate_scenarios, seed=seed, simulate=simulate))
+    if termination is not None:
+        report_terminations(*termination.take_counts())
+    print(f'Score: {fitnesses[genome.key]} after {ticks} ticks')
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Trains Pac-Man agents with NEAT')
+    parser.add_argument('--headless', action='store_true',
+                        help='skip the display and simulate with a fixed timestep as fast as possible')
+    parser.add_argument('--dt', type=float, default=None,
+                        help=f'fixed simulation timestep in seconds (default when headless: {FIXED_DELTA_TIME:.4f})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that evaluate the population in parallel (implies --headless)')
+    parser.add_argument('--backend', choices=GAME_CONTROLLERS, default='objects',
+                        help='simulate one object per entity or the whole population as arrays')
+    parser.add_argument('--decision-points', action='store_true',
+                        help='only query the networks when an agent is stopped or heading for a junction, corner or dead end')
+    parser.add_argument('--features', choices=FEATURE_SETS, default='default',
+                        help='observation to train on, rays and rays_window add wall, pellet and ghost rays and a local window, '
+                             'junctions adds the length of the corridor in each direction')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='play every generation with the same episode, so carried over elites reuse their cached fitness')
+    parser.add_argument('--fitness-cache', type=int, default=10000,
+                        help='number of fitnesses to cache by genome structure and episode seed, 0 disables the cache. '
+                             'It is off when fitnesses are not reproducible, with a clock-driven timestep or --time-budget')
+    parser.add_argument('--viewer', metavar='FPS', type=float, nargs='?', const=VIEWER_FPS, default=None,
+                        help=f'simulate headless and watch in a separate window that draws up to FPS frames per second '
+                             f'(default: {VIEWER_FPS}), dropping frames instead of slowing the training down')
+    parser.add_argument('--max-ticks', type=int, default=None,
+                        help='stop every agent once the episode is this many ticks long')
+    parser.add_argument('--no-progress', metavar='TICKS', type=int, default=None,
+                        help='stop an agent whose score did not go up in this many ticks')
+    parser.add_argument('--max-revisits', type=int, default=None,
+                        help='stop an agent that entered the same tile more than this many times since it last scored')
+    parser.add_argument('--time-budget', metavar='SECONDS', type=float, default=None,
+                        help='stop every agent once an episode took this many seconds, fitnesses then depend on the machine')
+    parser.add_argument('--scenarios', choices=SCENARIO_SUITES, default=None,
+                        help='evaluate every genome on each scenario of the suite: other seeds, start tiles or ghost orders')
+    parser.add_argument('--reducer', choices=REDUCERS, default='mean',
+                        help='how the fitnesses of a genome in the scenarios are reduced to its fitness')
+    parser.add_argument('--keep-checkpoints', metavar='N', type=int, default=5,
+                        help='number of newest checkpoints to keep, 0 keeps every checkpoint')
+    parser.add_argument('--keep-every', metavar='K', type=int, default=None,
+                        help='also keep the checkpoint of every K-th generation')
+    parser.add_argument('--play', metavar='GENOME_FILE', default=None,
+                        help='play an episode with a saved genome, such as checkpoints/winner.pkl, instead of training')
+    args = parser.parse_args()
+    if args.viewer is not None and args.workers > 1:
+        parser.error('--viewer shows the simulation of this process and cannot be combined with --workers')
+
     local_dir = os.path.dirname(__file__)
     config_path = os.path.join(local_dir, 'config.txt')
     config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
                          neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
-    run(config)
+    configure_inputs(config.genome_config, FEATURE_SETS[args.features])
+    termination = build_termination_policy(args.max_ticks, args.no_progress, args.max_revisits, args.time_budget)
+    suite = build_scenario_suite(args.scenarios, args.reducer)
+    if args.play is not None:
+        play(args.play, config, headless=args.headless, delta_time=args.dt, seed=args.seed, backend=args.backend,
+             decision_points_only=args.decision_points, features=args.features, termination=termination, suite=suite)
+    else:
+        run(config, headless=args.headless, delta_time=args.dt, num_workers=args.workers, backend=args.backend,
+            decision_points_only=args.decision_points, features=args.features, seed=args.seed,
+            fitness_cache_size=args.fitness_cache, viewer_fps=args.viewer, termination=termination, suite=suite,
+            keep_checkpoints=args.keep_checkpoints or None, keep_every=args.keep_every)
 
 
 
@@ -0,0 +1,170 @@
+import statistics
+from typing import List, Tuple
+from constants import *
+from evaluation import report_scenarios
+
+# The ghosts in the order of the ghost spawns of a level
+GHOST_NAMES = ('blinky', 'pinky', 'inky', 'clyde')
+
+class Scenario(object):
+    '''
+    One of the episodes a genome is evaluated on.
+
+    A scenario changes how an episode starts: the level, where the agent starts, which
+    ghost starts on which spawn and the seed of the episode. Ghosts on the spawns next to
+    the ghost door leave the house first, so reordering the ghosts changes the order they
+    are released in.
+    '''
+    def __init__(self, name: str, seed_offset: int = 0, start_tile: Tuple[int, int] = None,
+                 ghost_order: Tuple[str, ...] = GHOST_NAMES, level_file: str = 'level_1.txt'):
+        """
+        Initialize a Scenario object.
+
+        Args:
+            name (str): The name the results of the scenario are reported with
+            seed_offset (int, optional): Added to the seed of the generation. Defaults to 0.
+            start_tile (Tuple[int, int], optional): The (column, row) the agent starts on. Defaults to the
+                spawn of the level.
+            ghost_order (Tuple[str, ...], optional): The ghost that starts on each ghost spawn of the level,
+                in the order of GHOST_NAMES. Defaults to GHOST_NAMES.
+            level_file (str, optional): The level file in the levels directory. Defaults to 'level_1.txt'.
+        """
+        if sorted(ghost_order) != sorted(GHOST_NAMES):
+            raise ValueError(f'The ghost order of {name} must name every ghost once, got {ghost_order}')
+        self.name = name
+        self.seed_offset = seed_offset
+        self.start_tile = start_tile
+        self.ghost_order = tuple(ghost_order)
+        self.level_file = level_file
+
+    @property
+    def setup(self) -> tuple:
+        '''Everything about the scenario but its seed, scenarios with the same setup share a game controller'''
+        return (self.level_file, self.start_tile, self.ghost_order)
+
+    def episode_seed(self, seed: int) -> int:
+        '''Returns the seed of the scenario's episode in a generation played with the given seed'''
+        return None if seed is None else (seed + self.seed_offset) % 2 ** 32
+
+    def spawns(self, tiles) -> tuple:
+        '''
+        Returns the tile the agent starts on and the start tiles of Blinky, Pinky, Inky and Clyde
+
+        Raises:
+            ValueError: If the start tile is not a path of the level
+        '''
+        pacman_spawn = tiles.pacman_spawn
+        if self.start_tile is not None:
+            pacman_spawn = tiles.get_tile(*self.start_tile)
+            if pacman_spawn.type != PATH:
+                raise ValueError(f'The start tile {self.start_tile} of {self.name} is not a path')
+        ghost_spawns = [tiles.ghost_spawns[self.ghost_order.index(name)] for name in GHOST_NAMES]
+        return pacman_spawn, ghost_spawns
+
+    def __repr__(self):
+        return f'Scenario({self.name!r})'
+
+DEFAULT_SCENARIO = Scenario('default')
+
+def mean_minus_deviation(fitnesses: List[float]) -> float:
+    '''Returns the mean fitness minus its standard deviation, which favours genomes that do well everywhere'''
+    return statistics.fmean(fitnesses) - statistics.pstdev(fitnesses)
+
+# How the fitnesses of a genome in every scenario are reduced to its fitness
+REDUCERS = {
+    'mean' : statistics.fmean,
+    'median' : statistics.median,
+    'min' : min,
+    'mean_minus_deviation' : mean_minus_deviation,
+}
+
+START_TILES = ((1, 4), (26, 4), (1, 32), (26, 32))
+GHOST_ORDERS = (
+    ('pinky', 'blinky', 'clyde', 'inky'),
+    ('inky', 'clyde', 'blinky', 'pinky'),
+    ('clyde', 'inky', 'pinky', 'blinky'),
+)
+SCENARIO_SUITES = {
+    'single' : (DEFAULT_SCENARIO,),
+    'seeds' : tuple(Scenario(f'seed_{offset}', seed_offset=offset) for offset in range(4)),
+    'starts' : (DEFAULT_SCENARIO,) + tuple(Scenario(f'start_{column}_{row}', start_tile=(column, row))
+                                           for column, row in START_TILES),
+    'ghosts' : (DEFAULT_SCENARIO,) + tuple(Scenario(f'ghosts_{index}', ghost_order=order)
+                                           for index, order in enumerate(GHOST_ORDERS)),
+    'mixed' : (DEFAULT_SCENARIO,) + tuple(Scenario(f'mixed_{index}', seed_offset=index + 1, start_tile=start_tile,
+                                                   ghost_order=ghost_order)
+                                          for index, (start_tile, ghost_order) in enumerate(zip(START_TILES, GHOST_ORDERS))),
+}
+
+class ScenarioSuite(object):
+    '''
+    Evaluates every genome on every scenario and reduces its fitnesses to one.
+
+    Fitness from a single episode rewards genomes that happen to suit its start and its
+    phase schedule. Each scenario is a separate episode of the whole population, so the
+    scenarios of a generation can be simulated at the same time by different processes.
+    '''
+    def __init__(self, scenarios, reducer: str = 'mean'):
+        """
+        Initialize a ScenarioSuite object.
+
+        Args:
+            scenarios (List[Scenario]): The scenarios, their names must be unique
+            reducer (str, optional): The key of the function in REDUCERS that reduces the fitnesses. Defaults to 'mean'.
+        """
+        self.scenarios = list(scenarios)
+        if len({scenario.name for scenario in self.scenarios}) != len(self.scenarios):
+            raise ValueError('Every scenario of a suite needs its own name')
+        self.reducer = reducer
+        self.reduce = REDUCERS[reducer]
+        # The fitnesses of the last evaluation keyed by scenario name and genome id
+        self.scenario_fitnesses = {}
+
+    def evaluate(self, genomes, seed: int, simulate_function, fitness_cache=None):
+        '''
+        Returns the reduced fitness of every genome keyed by genome id and the number of ticks
+        simulated across the scenarios
+
+        Args:
+            genomes (List[Tuple[int, object]]): The (genome_id, genome) pairs to evaluate
+            seed (int): The seed of the generation, every scenario offsets it
+            simulate_function: Called as simulate_function(runs) with a list of (scenario, genomes) pairs,
+                returns a (fitnesses keyed by genome id, ticks) pair for every run
+            fitness_cache (FitnessCache, optional): Skips the genomes whose fitness in a scenario is cached.
+                Defaults to None.
+        '''
+        runs, lookups = [], {}
+        for scenario in self.scenarios:
+            if fitness_cache is None:
+                keys, pending, cached, pending_genomes = None, None, None, genomes
+            else:
+                # The episode of a scenario is determined by its seed and its setup
+                keys, pending, cached = fitness_cache.find_pending(genomes, (scenario.episode_seed(seed), scenario.setup))
+                pending_genomes = list(pending.values())
+            lookups[scenario.name] = (keys, pending, cached)
+            if pending_genomes:
+                runs.append((scenario, pending_genomes))
+
+        results = simulate_function(runs)
+        ticks = sum(run_ticks for _, run_ticks in results)
+        simulated_fitnesses = {scenario.name: run_fitnesses for (scenario, _), (run_fitnesses, _) in zip(runs, results)}
+        self.scenario_fitnesses = {}
+        for scenario in self.scenarios:
+            keys, pending, cached = lookups[scenario.name]
+            run_fitnesses = simulated_fitnesses.get(scenario.name, {})
+            if keys is not None:
+                run_fitnesses = fitness_cache.store(keys, pending, cached, run_fitnesses)
+            self.scenario_fitnesses[scenario.name] = run_fitnesses
+        if fitness_cache is not None:
+            reused = sum(len(keys) - len(pending) for keys, pending, cached in lookups.values())
+            print(f'Fitness cache: reused {reused} of {len(genomes) * len(self.scenarios)} scenario fitnesses')
+
+        fitnesses = {genome_id: self.reduce([self.scenario_fitnesses[scenario.name][genome_id]
+                                             for scenario in self.scenarios])
+                     for genome_id, genome in genomes}
+        report_scenarios(self.scenario_fitnesses)
+        return fitnesses, ticks
+
+def build_scenario_suite(suite: str = None, reducer: str = 'mean') -> ScenarioSuite:
+    '''Returns the suite of SCENARIO_SUITES with the given key, None when no suite is given'''
+    return ScenarioSuite(SCENARIO_SUITES[suite], reducer) if suite is not None else None
@@ -4,15 +4,19 @@ class SpriteSheet(object):
     '''Class representing a sprite sheet'''
     def __init__(self, file_name: str):
         """
-        _summary_
+        Initialize a SpriteSheet object.
 
         Args:
-            file_name (str): _description_
+            file_name (str): The path of the sprite sheet image
         """
         self.sprite_sheet = pygame.image.load(file_name).convert()
+        self.images = {}
     
     def get_image(self, x: int, y: int, width: int, height: int) -> pygame.Surface:
-        '''Extracts an image from the spritesheet'''
-        image = self.sprite_sheet.subsurface(pygame.Rect(x, y, width, height))
-        image.set_colorkey((0, 0, 0))
-        return image
\ No newline at end of file
+        '''Extracts an image from the spritesheet, the same region always returns the same shared image'''
+        key = (x, y, width, height)
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = self.sprite_sheet.subsurface(pygame.Rect(x, y, width, height))
+            image.set_colorkey((0, 0, 0))
+        return image
@@ -0,0 +1,69 @@
+'''
+Counter-based random streams for the frightened ghost targets.
+
+A stream is a key and the number of values drawn from it, and the n-th value of a stream
+is a hash of its key and n. The ghosts of an agent share one stream. The object backend
+draws from it one value at a time like a random.Random, the batch backend draws the next
+values of every agent's stream at once from an array of counters, so both backends pick
+the same targets for the same seed and a stream packs into 16 bytes.
+'''
+import random, struct
+import numpy as np
+
+MASK = 2 ** 64 - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+# The key of the stream and the number of values drawn from it
+STREAM_STATE = struct.Struct('<QQ')
+
+def mix(value: int) -> int:
+    '''Returns the SplitMix64 finalizer of a 64 bit value'''
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+def stream_key(seed: int = None) -> int:
+    '''Returns the key of the stream of a seed, a random key when the seed is None'''
+    if seed is None:
+        return random.getrandbits(64)
+    return mix((seed + GOLDEN_GAMMA) & MASK)
+
+def stream_values(key: int, counters: np.ndarray) -> np.ndarray:
+    '''Returns the values of the stream with the given key at every counter, the same values RandomStream draws'''
+    values = np.uint64(key) + (counters.astype(np.uint64) + np.uint64(1)) * np.uint64(GOLDEN_GAMMA)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+class RandomStream(object):
+    '''A random stream drawn from one value at a time, used where the ghosts take a random.Random'''
+    def __init__(self, seed: int = None):
+        """
+        Initialize a RandomStream object.
+
+        Args:
+            seed (int, optional): The seed of the stream. Defaults to None, which picks a random key.
+        """
+        self.seed(seed)
+
+    def seed(self, seed: int = None) -> None:
+        '''Starts the stream of the seed from its first value'''
+        self.key = stream_key(seed)
+        self.counter = 0
+
+    def next_value(self) -> int:
+        '''Returns the next 64 bit value of the stream'''
+        self.counter += 1
+        return mix((self.key + self.counter * GOLDEN_GAMMA) & MASK)
+
+    def choice(self, sequence):
+        '''Returns a random element of the sequence'''
+        return sequence[self.next_value() % len(sequence)]
+
+    def pack_state(self) -> bytes:
+        '''Returns the state of the stream packed into bytes'''
+        return STREAM_STATE.pack(self.key, self.counter)
+
+    def unpack_state(self, buffer, offset: int) -> int:
+        '''Restores the state packed by pack_state and returns the offset after it'''
+        self.key, self.counter = STREAM_STATE.unpack_from(buffer, offset)
+        return offset + STREAM_STATE.size
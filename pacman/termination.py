@@ -0,0 +1,182 @@
+import time
+from collections import Counter
+import numpy as np
+from constants import *
+
+class TerminationRule(object):
+    '''
+    A reason to stop agents before they run out of lives or go idle.
+
+    Rules are checked every tick with the state of the whole population as arrays, so the
+    same rules stop agents of the object and of the batch backend.
+    '''
+    reason = None
+    # Whether the same episode always stops the same agents, which fitness caching relies on
+    deterministic = True
+    # The arrays the rule reads besides alive, the others may be passed as None
+    inputs = ('scores', 'tiles')
+
+    def start(self, num_agents: int) -> None:
+        '''Forgets the last episode, called before the first tick'''
+        pass
+
+    def check(self, ticks: int, alive: np.ndarray, scores: np.ndarray, tiles: np.ndarray) -> np.ndarray:
+        '''
+        Returns which agents to stop, None when no agent is stopped
+
+        Args:
+            ticks (int): The ticks simulated so far
+            alive (np.ndarray): Whether each agent is still playing
+            scores (np.ndarray): The score of each agent, None when no rule of the policy reads it
+            tiles (np.ndarray): The index of the tile each agent is on, None when no rule of the policy reads it
+        '''
+        raise NotImplementedError
+
+class MaxTicks(TerminationRule):
+    '''Stops every agent once the episode is max_ticks long'''
+    reason = 'max_ticks'
+    inputs = ()
+
+    def __init__(self, max_ticks: int):
+        self.max_ticks = max_ticks
+
+    def check(self, ticks, alive, scores, tiles):
+        return alive if ticks >= self.max_ticks else None
+
+class NoProgress(TerminationRule):
+    '''Stops the agents whose score did not go up in the last window ticks'''
+    reason = 'no_progress'
+    inputs = ('scores',)
+
+    def __init__(self, window: int):
+        self.window = window
+
+    def start(self, num_agents):
+        self.best_scores = np.zeros(num_agents)
+        self.last_progress = np.zeros(num_agents, dtype=np.int64)
+
+    def check(self, ticks, alive, scores, tiles):
+        progress = scores > self.best_scores
+        self.best_scores[progress] = scores[progress]
+        self.last_progress[progress] = ticks
+        return alive & (ticks - self.last_progress >= self.window)
+
+class TileLoop(TerminationRule):
+    '''
+    Stops the agents that entered the same tile more than max_revisits times since they
+    last scored, which catches agents swinging between two tiles as well as agents
+    circling an empty part of the maze
+    '''
+    reason = 'tile_loop'
+
+    def __init__(self, max_revisits: int):
+        self.max_revisits = max_revisits
+
+    def start(self, num_agents):
+        self.visits = np.zeros((num_agents, NUM_TILES), dtype=np.int32)
+        self.previous_tiles = np.full(num_agents, -1, dtype=np.int64)
+        self.best_scores = np.zeros(num_agents)
+
+    def check(self, ticks, alive, scores, tiles):
+        progress = scores > self.best_scores
+        if progress.any():
+            self.best_scores[progress] = scores[progress]
+            self.visits[progress] = 0
+        rows = np.flatnonzero(alive & (tiles != self.previous_tiles))
+        self.previous_tiles[:] = tiles
+        if not len(rows):
+            return None
+        entered = tiles[rows]
+        self.visits[rows, entered] += 1
+        stop = np.zeros(len(alive), dtype=bool)
+        stop[rows] = self.visits[rows, entered] > self.max_revisits
+        return stop
+
+class TimeBudget(TerminationRule):
+    '''
+    Stops every agent once the episode took seconds of wall-clock time. Fitnesses then
+    depend on the speed of the machine, unlike with the other rules
+    '''
+    reason = 'time_budget'
+    deterministic = False
+    inputs = ()
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def start(self, num_agents):
+        self.start_time = time.perf_counter()
+
+    def check(self, ticks, alive, scores, tiles):
+        return alive if time.perf_counter() - self.start_time >= self.seconds else None
+
+class TerminationPolicy(object):
+    '''
+    The termination rules of an episode and why each agent was stopped.
+
+    Every rule sees every tick, so rules that track the agents stay up to date. An agent
+    stopped by several rules in the same tick is recorded with the first of them.
+    '''
+    def __init__(self, rules):
+        """
+        Initialize a TerminationPolicy object.
+
+        Args:
+            rules (List[TerminationRule]): The rules, in the order their reasons take precedence
+        """
+        self.rules = list(rules)
+        self.reasons = []
+        # How many agents each reason stopped since the counts were last taken and how many agents played
+        self.stopped = Counter()
+        self.num_agents = 0
+
+    def start(self, num_agents: int) -> None:
+        '''Forgets the last episode, called before the first tick'''
+        self.reasons = [None] * num_agents
+        self.num_agents += num_agents
+        for rule in self.rules:
+            rule.start(num_agents)
+
+    def check(self, ticks: int, alive: np.ndarray, scores: np.ndarray, tiles: np.ndarray) -> list:
+        '''Returns the indexes of the agents to stop this tick and records why, see TerminationRule.check'''
+        stopped = []
+        for rule in self.rules:
+            stop = rule.check(ticks, alive, scores, tiles)
+            if stop is None or not stop.any():
+                continue
+            for index in np.flatnonzero(stop).tolist():
+                self.reasons[index] = rule.reason
+                self.stopped[rule.reason] += 1
+                stopped.append(index)
+            alive = alive & ~stop
+        return stopped
+
+    @property
+    def inputs(self) -> set:
+        '''The arrays the rules of the policy read besides alive'''
+        return {name for rule in self.rules for name in rule.inputs}
+
+    @property
+    def deterministic(self) -> bool:
+        '''Whether every rule of the policy is deterministic'''
+        return all(rule.deterministic for rule in self.rules)
+
+    def take_counts(self) -> tuple:
+        '''Returns how many agents each reason stopped and how many agents played since the last call'''
+        counts, num_agents = self.stopped, self.num_agents
+        self.stopped, self.num_agents = Counter(), 0
+        return counts, num_agents
+
+def build_termination_policy(max_ticks: int = None, no_progress_ticks: int = None, max_revisits: int = None,
+                             time_budget: float = None) -> TerminationPolicy:
+    '''Returns a policy with a rule for every limit that is set, None when no limit is set'''
+    rules = []
+    if max_ticks is not None:
+        rules.append(MaxTicks(max_ticks))
+    if no_progress_ticks is not None:
+        rules.append(NoProgress(no_progress_ticks))
+    if max_revisits is not None:
+        rules.append(TileLoop(max_revisits))
+    if time_budget is not None:
+        rules.append(TimeBudget(time_budget))
+    return TerminationPolicy(rules) if rules else None
@@ -1,21 +1,35 @@
-import pygame, os
 from constants import *
 from vector import Vector2D
+from assets import asset_cache
 
 class Text(object):
     def __init__(self, text: str, position: tuple, font_size: int = 12, color: tuple = (255, 255, 255)):
         self.text = text
         self.position = Vector2D(*position)
-        self.font = pygame.font.Font(os.path.join('pacman', 'assets', 'fonts', 'PressStart2P-Regular.ttf'), font_size)
+        # The font is opened on the first draw
+        self.font_size = font_size
+        self.font = None
         self.color = color
         self.is_visible = True
+        # The text is only rasterized again when it or its color changes
+        self.rendered = None
+        self.surface, self.rect = None, None
 
-    def render(self, screen: pygame.Surface):
+    def render(self, screen: 'pygame.Surface'):
         '''Renders the text on the screen'''
-        if self.is_visible:
-            surface = self.font.render(self.text, True, self.color)
-            rect = surface.get_rect(center=self.position.as_tuple())
-            screen.blit(surface, rect)
+        screen.blits(self.get_blits())
+
+    def get_blits(self) -> list:
+        '''Returns the (surface, rect) pairs that draw the text, to be drawn with Surface.blits'''
+        if not self.is_visible:
+            return []
+        if self.rendered != (self.text, self.color):
+            if self.font is None:
+                self.font = asset_cache.font(self.font_size)
+            self.surface = self.font.render(self.text, True, self.color)
+            self.rect = self.surface.get_rect(center=self.position.as_tuple())
+            self.rendered = (self.text, self.color)
+        return [(self.surface, self.rect)]
 
 class Score(Text):
     def __init__(self, position: tuple):
@@ -1,14 +1,16 @@
 # Import necessary modules and classes
-import pygame, os
 from typing import List, Tuple
 from constants import *
 from vector import Vector2D
-from sprites import SpriteSheet
+from assets import asset_cache, MAZE_SPRITES
 from items import Item, Pellet, PowerPellet, Cherry, Strawberry, Orange, Apple
+from maze import CompiledMaze
+from level import Level, NO_TILE, PELLET, POWER_PELLET
+from distances import DistanceTable
+from junctions import build_junction_graphs
+from rays import RayTables
 class Tile(object):
     '''Class representing a tile object'''
-    num_tiles = 0
-
     def __init__(self, position: Tuple[float, float], type: str = EMPTY, item: Item = None):
         """
         Initialize a Tile object.
@@ -18,8 +20,10 @@ class Tile(object):
             type (str, optional): The type of the tile. Defaults to EMPTY.
             item (item, optional): An item associated with the tile. Defaults to None.
         """
-        self.id = Tile.generate_id()
         self.position = Vector2D(*position)
+        # Row-major index of the tile, used to key per-tile state such as collected pellets
+        self.index = int(position[1] // TILE_HEIGHT) * NUM_COLS + int(position[0] // TILE_WIDTH)
+        self.id = Tile.generate_id(self.index)
         self.neighbors = {UP: None, DOWN: None, LEFT: None, RIGHT: None}
 
         # tile type and associated item
@@ -27,25 +31,24 @@ class Tile(object):
         self.item = item
 
         self.is_portal = False
+        # The compiled form of the collection this tile belongs to
+        self.maze = None
 
         # Visualization attributes
-        self.color = Tile.determine_color(self.position.y)
+        self.color = Tile.determine_color(self.index, self.position.y)
         self.sprite = None
 
-        # Increment the number of tiles
-        Tile.num_tiles += 1
-
     @staticmethod
-    def generate_id() -> int:
-        '''Generates a unique id for the tile'''
-        character_id = format(Tile.num_tiles, '03d')
+    def generate_id(index: int) -> int:
+        '''Generates the id of the tile from its index, unique within a collection'''
+        character_id = format(index, '03d')
         return int(f'1{character_id}')
     
     @staticmethod
-    def determine_color(tile_position_y: float):
+    def determine_color(index: int, tile_position_y: float):
         '''Determines the color of the tile'''
         row_index = int(tile_position_y // TILE_WIDTH)
-        if (Tile.num_tiles + row_index) % 2 == 0:
+        if (index + row_index) % 2 == 0:
             return TILE_COLOR_1
         return TILE_COLOR_2
     
@@ -87,8 +90,9 @@ class Tile(object):
             arg.is_portal = True
             arg.portal_destination = tile if arg is self else self
     
-    def render(self, screen: pygame.Surface, show_items: bool = True) -> None:
+    def render(self, screen: 'pygame.Surface', show_items: bool = True) -> None:
             '''Renders the tile on the screen'''
+            import pygame
             position = self.position.as_tuple()
             pygame.draw.rect(screen, self.color, (*position, TILE_WIDTH, TILE_WIDTH))
             if self.sprite:
@@ -106,62 +110,71 @@ class TileCollection(object):
     '''
     Class representing a collection of tiles
     '''
-    def __init__(self):
+    def __init__(self, level_file: str = 'level_1.txt'):
+        """
+        Initialize a TileCollection object.
+
+        Args:
+            level_file (str, optional): The level file in the levels directory. Defaults to 'level_1.txt'.
+        """
         self.unique_item = None
-        self.tile_symbols = { 
-            '0' : 'empty', '.' : 'path', 'X' : 'wall',
-            '=' : 'ghost_door', 'H' : 'ghost_house'
-            }
-        level_data = TileCollection.load_level_data(os.path.join('level_1.txt'))
-        self.create_look_up_table(level_data)
-        self.set_tile_sprites(level_data)
+        self.level = Level(level_file)
+        self.level_hash = self.level.source_hash
+        self.create_look_up_table()
+        # The maze sprites are cut from the sprite sheet when the maze is first drawn
+        self.sprites_loaded = False
         self.connect_tiles()
         self.add_items()
-        self.get_tile(0, 17).set_portal(self.get_tile(27, 17))
-
-    def load_level_data(level_file: str) -> List[List[str]]:
-        '''Loads the level data from a file'''
-        level_data = []
-        with open(os.path.join('pacman', 'assets', 'levels', level_file)) as file:
-            for line in file:
-                line = line.strip().split()
-                if line:
-                    level_data.append(list(line))
-        return level_data
-    
-    def create_look_up_table(self, level_data: List[List[str]]) -> None:
+        self.set_portals()
+        self.pacman_spawn = self.indexed_tiles[self.level.pacman_spawn]
+        # The start tiles of Blinky, Pinky, Inky and Clyde
+        self.ghost_spawns = [self.indexed_tiles[index] for index in self.level.ghost_spawns]
+        self.compile()
+
+    def create_look_up_table(self) -> None:
         '''Creates a lookup table for the level data'''
         self.look_up_table = {}
-        for row_index, row in enumerate(level_data):
-            for column_index, tile_symbol in enumerate(row):
-                tile_type = self.tile_symbols[tile_symbol]
-                position = (column_index * TILE_WIDTH, row_index * TILE_WIDTH)
-                self.look_up_table[(column_index, row_index)] = Tile(position, tile_type)
-
-    def set_tile_sprites(self, level_data: List[List[str]]) -> None:
-        sprite_sheet = SpriteSheet(os.path.join('pacman', 'assets', 'sprites', 'Maze-Parts.png'))
-        for row_index, row in enumerate(level_data):
-            for column_index, tile in enumerate(row):
-                try:
-                    sprite = SpriteSheet.get_image(sprite_sheet, column_index * TILE_WIDTH, row_index * TILE_WIDTH, TILE_WIDTH, TILE_HEIGHT)
-                    self.look_up_table[(column_index, row_index)].sprite = sprite
-                except:
-                    pass
-            
+        # The same tiles by tile index
+        self.indexed_tiles = []
+        for index, tile_type in enumerate(self.level.tile_types.tolist()):
+            row_index, column_index = divmod(index, NUM_COLS)
+            position = (column_index * TILE_WIDTH, row_index * TILE_WIDTH)
+            tile = self.look_up_table[(column_index, row_index)] = Tile(position, TILE_TYPES[tile_type])
+            self.indexed_tiles.append(tile)
+
+    def load_sprites(self) -> None:
+        '''Sets the tile sprites unless they are already set'''
+        if not self.sprites_loaded:
+            self.set_tile_sprites()
+            self.sprites_loaded = True
+
+    def set_tile_sprites(self) -> None:
+        '''Cuts the sprite of every tile from the maze sprite sheet, which is drawn at the size of the maze'''
+        sprite_sheet = asset_cache.sprite_sheet(MAZE_SPRITES)
+        for tile in self.indexed_tiles:
+            tile.sprite = sprite_sheet.get_image(int(tile.position.x), int(tile.position.y), TILE_WIDTH, TILE_HEIGHT)
 
     def connect_tiles(self) -> None:
-        for row_index in range(NUM_ROWS):
-            for column_index in range(NUM_COLS):
-                tile = self.look_up_table[(column_index, row_index)]
-                if row_index > 0:
-                    tile.connect(UP, self.look_up_table[(column_index, row_index - 1)])
-                if row_index < NUM_ROWS - 1:
-                    tile.connect(DOWN, self.look_up_table[(column_index, row_index + 1)])
-                if column_index > 0:
-                    tile.connect(LEFT, self.look_up_table[(column_index - 1, row_index)])
-                if column_index < NUM_COLS - 1:
-                    tile.connect(RIGHT, self.look_up_table[(column_index + 1, row_index)])
-                # tile.set_tile_sprite()
+        '''Connects every tile to its neighbors'''
+        for tile, neighbors in zip(self.indexed_tiles, self.level.neighbors.tolist()):
+            for direction, neighbor in zip(DIRECTIONS, neighbors):
+                if neighbor != NO_TILE:
+                    tile.neighbors[direction] = self.indexed_tiles[neighbor]
+
+    def set_portals(self) -> None:
+        '''Pairs up the portals of the level'''
+        for index, destination in enumerate(self.level.portal_destinations.tolist()):
+            if destination > index:
+                self.indexed_tiles[index].set_portal(self.indexed_tiles[destination])
+
+    def compile(self) -> None:
+        '''Compiles the tiles into flat neighbor, passability, distance and ray arrays shared by every entity'''
+        self.maze = CompiledMaze(self)
+        self.maze.distances = DistanceTable(self.maze, self.level_hash)
+        self.maze.junctions = build_junction_graphs(self.maze)
+        self.maze.rays = RayTables(self.maze)
+        for tile in self.look_up_table.values():
+            tile.maze = self.maze
 
     def get_tile(self, column_index: int, row_index: int) -> Tile:
         '''Returns the tile at the given column and row index'''
@@ -170,21 +183,25 @@ class TileCollection(object):
     def add_items(self):
         '''Adds items to the tiles'''
         self.items = []
-        for row_index in range(NUM_ROWS):
-            for column_index in range(NUM_COLS):
-                tile = self.look_up_table[(column_index, row_index)]
-                if tile.type == PATH:
-                    tile.item = Pellet(tile.position.as_tuple())
-                    self.items.append(tile.item)
         self.power_pellets = []
-        power_pellet_locations = [(1, 6), (26, 6), (1, 26), (26, 26)]
-        for location in power_pellet_locations:
-            self.look_up_table[location].item = PowerPellet(self.look_up_table[location].position.as_tuple())
-            self.items.append(self.look_up_table[location].item)
-            self.power_pellets.append(self.look_up_table[location].item)
+        for tile, item in zip(self.indexed_tiles, self.level.items.tolist()):
+            if item == PELLET:
+                tile.item = Pellet(tile.position.as_tuple())
+            elif item == POWER_PELLET:
+                tile.item = PowerPellet(tile.position.as_tuple())
+                self.power_pellets.append(tile.item)
+            else:
+                continue
+            self.items.append(tile.item)
+
+    def reset(self) -> None:
+        '''Puts every item back for a new game on the same maze'''
+        for item in self.items:
+            item.reset()
 
-    def render(self, screen: pygame.Surface) -> None:
+    def render(self, screen: 'pygame.Surface') -> None:
         '''Renders the tiles on the screen'''
+        self.load_sprites()
         for tile in self.look_up_table.values():
             tile.render(screen)
     
\ No newline at end of file
@@ -2,11 +2,19 @@
 import math
 from typing import List, Tuple
 
+# Components closer than this are considered equal
+EQUALITY_THRESHOLD = 1e-6
+
 class Vector2D(object):
+    '''
+    A 2D vector. The operators return new vectors, the in-place methods and operators
+    update the vector itself so hot loops do not allocate.
+    '''
+    __slots__ = ('x', 'y')
+
     def __init__(self, x: float, y: float):
         self.x = x
         self.y = y
-        self.thresh = 1e-6
 
     def as_tuple(self) -> Tuple[float, float]:
         '''Returns a tuple representation of the vector'''
@@ -14,58 +22,104 @@ class Vector2D(object):
 
     def magnitude_squared(self) -> float:
         '''Returns the magnitude squared of the vector'''
-        return self.x ** 2 + self.y ** 2
+        return self.x * self.x + self.y * self.y
 
     def magnitude(self) -> float:
         '''Returns the magnitude of the vector'''
-        return math.sqrt(self.x ** 2 + self.y ** 2)
-    
+        return math.sqrt(self.x * self.x + self.y * self.y)
+
+    def distance_squared(self, other: 'Vector2D') -> float:
+        '''Returns the squared distance between this vector and another vector'''
+        delta_x, delta_y = self.x - other.x, self.y - other.y
+        return delta_x * delta_x + delta_y * delta_y
+
     def distance(self, other: 'Vector2D') -> float:
         '''Returns the distance between this vector and another vector'''
-        if isinstance(other, Vector2D):
-            return (self - other).magnitude()
-        raise TypeError(f'Cannot get distance between Vector2D and {type(other)}')
-    
+        return math.sqrt(self.distance_squared(other))
+
     def dot(self, other: 'Vector2D') -> float:
         '''Returns the dot product of this vector and another vector'''
-        if isinstance(other, Vector2D):
-            return self.x * other.x + self.y * other.y
-        raise TypeError(f'Cannot dot Vector2D and {type(other)}')
-    
+        return self.x * other.x + self.y * other.y
+
     def copy(self) -> 'Vector2D':
         '''Returns a copy of this vector'''
         return Vector2D(self.x, self.y)
 
+    def set(self, x: float, y: float) -> 'Vector2D':
+        '''Sets the components of this vector'''
+        self.x = x
+        self.y = y
+        return self
+
+    def update(self, other: 'Vector2D') -> 'Vector2D':
+        '''Copies the components of another vector into this vector'''
+        self.x = other.x
+        self.y = other.y
+        return self
+
+    def add_scaled(self, other: 'Vector2D', scalar: float) -> 'Vector2D':
+        '''Adds another vector times a scalar to this vector'''
+        self.x += other.x * scalar
+        self.y += other.y * scalar
+        return self
+
     def __add__(self, other: 'Vector2D') -> 'Vector2D':
-        if isinstance(other, Vector2D):
+        try:
             return Vector2D(self.x + other.x, self.y + other.y)
-        raise TypeError(f'Cannot add Vector2D and {type(other)}')
-    
+        except AttributeError:
+            raise TypeError(f'Cannot add Vector2D and {type(other)}') from None
+
     def __sub__(self, other: 'Vector2D') -> 'Vector2D':
-        if isinstance(other, Vector2D):
+        try:
             return Vector2D(self.x - other.x, self.y - other.y)
-        raise TypeError(f'Cannot subtract Vector2D and {type(other)}')
-    
+        except AttributeError:
+            raise TypeError(f'Cannot subtract Vector2D and {type(other)}') from None
+
     def __mul__(self, scalar: float) -> 'Vector2D':
-        if isinstance(scalar, (int, float)):
-            return Vector2D(self.x * scalar, self.y * scalar)
-        raise TypeError(f'Cannot multiply Vector2D and {type(scalar)}') 
-    
+        return Vector2D(self.x * scalar, self.y * scalar)
+
     def __truediv__(self, scalar: float) -> 'Vector2D':
-        if isinstance(scalar, (int, float)):
-            return Vector2D(self.x / scalar, self.y / scalar)
-        raise TypeError(f'Cannot divide Vector2D and {type(scalar)}')
-    
+        return Vector2D(self.x / scalar, self.y / scalar)
+
+    def __iadd__(self, other: 'Vector2D') -> 'Vector2D':
+        try:
+            self.x += other.x
+            self.y += other.y
+        except AttributeError:
+            raise TypeError(f'Cannot add Vector2D and {type(other)}') from None
+        return self
+
+    def __isub__(self, other: 'Vector2D') -> 'Vector2D':
+        try:
+            self.x -= other.x
+            self.y -= other.y
+        except AttributeError:
+            raise TypeError(f'Cannot subtract Vector2D and {type(other)}') from None
+        return self
+
+    def __imul__(self, scalar: float) -> 'Vector2D':
+        self.x *= scalar
+        self.y *= scalar
+        return self
+
+    def __itruediv__(self, scalar: float) -> 'Vector2D':
+        self.x /= scalar
+        self.y /= scalar
+        return self
+
     def __neg__(self) -> 'Vector2D':
         return Vector2D(-self.x, -self.y)
-    
+
     def __eq__(self, other: 'Vector2D') -> bool:
         if isinstance(other, Vector2D):
-            return abs(self.x - other.x) < self.thresh and abs(self.y - other.y) < self.thresh
+            return abs(self.x - other.x) < EQUALITY_THRESHOLD and abs(self.y - other.y) < EQUALITY_THRESHOLD
         return False
-    
+
+    # Vectors are mutable, so they cannot be hashed
+    __hash__ = None
+
     def __str__(self) -> str:
         return f'({self.x}, {self.y})'
-    
+
     def __repr__(self) -> str:
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
@@ -0,0 +1,66 @@
+'''
+Measures how many Vector2D objects the object backend allocates per simulated tick and how
+long a tick takes. Run from the repository root:
+
+    python pacman/vector_benchmark.py --population 50 --seed 7
+'''
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import random
+import time
+import timeit
+import neat
+import run
+from vector import Vector2D
+
+def count_allocations(function):
+    '''Returns the result of the function and how many Vector2D objects it created'''
+    allocations = [0]
+    initialize = Vector2D.__init__
+
+    def counting_initialize(self, x, y):
+        allocations[0] += 1
+        initialize(self, x, y)
+
+    Vector2D.__init__ = counting_initialize
+    try:
+        result = function()
+    finally:
+        Vector2D.__init__ = initialize
+    return result, allocations[0]
+
+def move_loop(num_moves: int) -> float:
+    '''Returns the seconds per move of the in-place and the allocating way to move a position'''
+    position, direction, speed, delta_time = Vector2D(0.0, 0.0), Vector2D(1, 0), 80.0, 1 / 60
+    in_place = timeit.timeit(lambda: position.add_scaled(direction, speed * delta_time), number=num_moves)
+
+    def allocating():
+        nonlocal position
+        position = position + direction * speed * delta_time
+    return in_place / num_moves, timeit.timeit(allocating, number=num_moves) / num_moves
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Vector2D allocations of the object backend')
+    parser.add_argument('--population', type=int, default=50, help='Number of agents to simulate')
+    parser.add_argument('--seed', type=int, default=7, help='Seed of the episode')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(__file__), 'config.txt'),
+                        help='The NEAT config file')
+    args = parser.parse_args()
+
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet,
+                         neat.DefaultStagnation, args.config)
+    config.pop_size = args.population
+    random.seed(args.seed)
+    genomes = list(neat.Population(config).population.items())
+
+    start_time = time.perf_counter()
+    (fitnesses, ticks), allocations = count_allocations(lambda: run.simulate_genomes(genomes, config, args.seed))
+    elapsed = time.perf_counter() - start_time
+    print(f'{ticks} ticks with {len(genomes)} agents')
+    print(f'Vector2D allocations per tick: {allocations / ticks:.1f} ({allocations / ticks / len(genomes):.2f} per agent)')
+    print(f'Milliseconds per tick: {1000 * elapsed / ticks:.3f} (includes counting overhead)')
+
+    in_place, allocating = move_loop(1000000)
+    print(f'Move in place: {in_place * 1e9:.0f} ns, move with new vectors: {allocating * 1e9:.0f} ns')
@@ -0,0 +1,138 @@
+import multiprocessing, queue, time
+from collections import namedtuple
+from constants import *
+
+# Snapshots sent to the viewer per second by default
+VIEWER_FPS = 30
+
+# What the viewer needs to draw a frame, built from plain values so it pickles small and fast.
+# agents holds (x, y, direction, animation_state, lives) and ghosts holds
+# (ghost class index, x, y, direction, phase, sprite_toggle). collected_tiles is None when
+# every item is shown
+Snapshot = namedtuple('Snapshot', ['agents', 'ghosts', 'collected_tiles', 'flashing', 'text'])
+
+class Viewer(object):
+    '''
+    Shows the training in a separate process that draws snapshots of the simulation.
+
+    The simulation sends at most fps snapshots per second and never waits for the viewer.
+    A snapshot is dropped when the viewer has not taken the previous one yet, and the
+    viewer skips to the newest snapshot when it falls behind. SPACE in the viewer window
+    toggles between the best agent and the whole population, closing it stops the viewer
+    while the training goes on.
+    '''
+    def __init__(self, fps: float = VIEWER_FPS):
+        """
+        Initialize a Viewer object.
+
+        Args:
+            fps (float, optional): The most snapshots sent per second. Defaults to VIEWER_FPS.
+        """
+        self.interval = 1 / fps
+        self.last_sent = 0
+        self.sent, self.dropped = 0, 0
+        # Spawned instead of forked, so the viewer gets its own display and not the dummy
+        # video driver of a headless simulation
+        context = multiprocessing.get_context('spawn')
+        self.snapshots = context.Queue(maxsize=1)
+        self.show_best_agent = context.Value('b', False)
+        self.process = context.Process(target=view, args=(self.snapshots, self.show_best_agent), daemon=True)
+        self.process.start()
+
+    def is_open(self) -> bool:
+        '''Returns whether the viewer window is still open'''
+        return self.process.is_alive()
+
+    def send(self, game_controller) -> None:
+        '''Sends a snapshot of the game controller unless one was sent too recently or the viewer is busy'''
+        now = time.perf_counter()
+        if now - self.last_sent < self.interval or not self.is_open():
+            return
+        self.last_sent = now
+        game_controller.show_best_agent = bool(self.show_best_agent.value)
+        snapshot = game_controller.snapshot()
+        if snapshot is None:
+            return
+        try:
+            self.snapshots.put_nowait(snapshot)
+            self.sent += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        '''Closes the viewer window'''
+        if self.is_open():
+            self.process.terminate()
+        self.process.join()
+
+def latest_snapshot(snapshots, timeout: float):
+    '''Waits for a snapshot and returns the newest one, skipping the ones the viewer fell behind on'''
+    snapshot = snapshots.get(timeout=timeout)
+    while True:
+        try:
+            snapshot = snapshots.get_nowait()
+        except queue.Empty:
+            return snapshot
+
+def view(snapshots, show_best_agent) -> None:
+    '''
+    Draws the snapshots in a window until it is closed, runs in the viewer process
+
+    Args:
+        snapshots (multiprocessing.Queue): The snapshots sent by the simulation
+        show_best_agent (multiprocessing.Value): Whether to show the best agent, toggled with SPACE
+    '''
+    import pygame
+    from pygame.locals import QUIT, KEYDOWN, K_SPACE
+    from tiles import TileCollection
+    from agent import Agent
+    from text import Text
+    from rendering import MazeLayers, DirtyRectScreen
+    from batch_simulation import GHOST_CLASSES
+
+    pygame.init()
+    pygame.display.set_caption('Pac-Man AI')
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    background = pygame.Surface(SCREEN_SIZE).convert()
+    background.fill(BLACK)
+    tiles = TileCollection()
+    maze_layers = MazeLayers(tiles, background)
+    display = DirtyRectScreen(screen)
+    text = Text('', (SCREEN_WIDTH // 2, 25), 20)
+
+    # Entities that are only moved onto the snapshot to be drawn
+    agent_sprite = Agent(tiles.pacman_spawn, None)
+    ghost_sprites = [ghost(tile) for ghost, tile in zip(GHOST_CLASSES, tiles.ghost_spawns)]
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                pygame.quit()
+                return
+            if event.type == KEYDOWN and event.key == K_SPACE:
+                show_best_agent.value = not show_best_agent.value
+        try:
+            snapshot = latest_snapshot(snapshots, 0.1)
+        except queue.Empty:
+            continue
+
+        for power_pellet in tiles.power_pellets:
+            if power_pellet.flashing != snapshot.flashing:
+                power_pellet.set_flashing(snapshot.flashing)
+        changed_rects = maze_layers.update(snapshot.collected_tiles)
+        frame = display.begin_frame(maze_layers.item_layer, changed_rects)
+        blits = []
+        for ghost_index, x, y, direction, phase, sprite_toggle in snapshot.ghosts:
+            ghost = ghost_sprites[ghost_index]
+            ghost.position.set(x, y)
+            ghost.current_direction, ghost.phase, ghost.sprite_toggle = direction, phase, sprite_toggle
+            blits.extend(ghost.get_blits())
+        for x, y, direction, animation_state, lives in snapshot.agents:
+            agent_sprite.position.set(x, y)
+            agent_sprite.current_direction, agent_sprite.animation_state = direction, animation_state
+            agent_sprite.lives = lives
+            blits.extend(agent_sprite.get_blits())
+        text.text = snapshot.text
+        blits.extend(text.get_blits())
+        frame.blits(blits)
+        display.present()